@@ -6,7 +6,19 @@ import requests
 import json
 import time
 import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import urlparse
+from instrumentation import ScanMetrics, format_summary
+from kline_archive import KlineArchive
+# BASE_URL / get_http_session 保留在本模块的导入路径下，兼容旧代码
+from market_data import BASE_URL, SOURCE_TYPES, HttpSource, create_source, get_http_session
+from request_cache import get_request_cache
+from scan_checkpoint import make_scan_key
+from enrichment import ResultEnricher
+from funding_cache import get_funding_cache
+from scoring import compute_scores, sort_results, total_score
 
 
 class BinanceAnalyzer:
@@ -21,6 +33,19 @@ class BinanceAnalyzer:
         self.config = config or self._default_config()
         self.callback = callback
         self.cache_file = "exchange_info_cache.json"
+        self.request_cache = get_request_cache()
+        self.metrics = ScanMetrics()
+        self.quote_volumes = {}  # 本次扫描各交易对的24小时成交额（带数据源前缀），用于各扫描方案的流动性过滤
+        self.worker_profiles = None  # 剖析期间的 WorkerProfiles：工作线程中的任务各自剖析，结束后合并
+        # 行情数据源：第一个为主数据源，其余数据源的交易对以 "数据源:交易对" 表示
+        self.sources = [create_source(name, self._source_options(name))
+                        for name in self.config.get("DATA_SOURCES") or ["binance_um"]]
+        self.source = self.sources[0]
+        self.sources_by_name = {source.name: source for source in self.sources}
+        self._bind_metrics()
+        # 本地K线归档（列式 + mmap），配置了目录时记录每次拉取到的K线
+        archive_dir = self.config.get("KLINE_ARCHIVE_DIR")
+        self.archive = KlineArchive(archive_dir) if archive_dir else None
         
     def _default_config(self):
         """默认配置"""
@@ -29,7 +54,20 @@ class BinanceAnalyzer:
             "LIQUIDITY_THRESHOLD_USDT": 1_000_000,
             "MAX_ANALYZE_SYMBOLS": 500,
             "CACHE_EXPIRY": 3600,
-            "REQUEST_DELAY": 0.15
+            "REQUEST_DELAY": 0.15,
+            "WATCHLIST_PROXIMITY": 0.8,
+            "REQUEST_CACHE_TTL": 5,
+            "CHECKPOINT_EVERY": 25,
+            "CHECKPOINT_MAX_AGE": 900,
+            "DATA_SOURCES": ["binance_um"],
+            "SOURCE_OPTIONS": {},
+            "KLINE_CONCURRENCY": 4,
+            "KLINE_BATCH_SIZE": 10,
+            "MARKET_DATA_PROXY": None,
+            "SCAN_PROFILES": [],
+            "SCORE_WEIGHTS": None,
+            "ENRICH_RESULTS": True,
+            "FUNDING_CACHE_TTL": 30
         }
     
     def _log(self, message, progress=None):
@@ -39,14 +77,73 @@ class BinanceAnalyzer:
         else:
             print(message)
     
-    def get_active_symbols(self):
-        """从文件或 API 获取活跃永续合约列表"""
+    def get_profiles(self):
+        """
+        扫描方案列表：[{"name", "MIN_CHANGE_PERCENT", "LIQUIDITY_THRESHOLD_USDT"}, ...]，第一个为主方案；
+        未配置 SCAN_PROFILES 时只有一个使用顶层阈值的默认方案
+        """
+        profiles = [
+            {
+                "name": p["name"],
+                "MIN_CHANGE_PERCENT": p.get("MIN_CHANGE_PERCENT", self.config["MIN_CHANGE_PERCENT"]),
+                "LIQUIDITY_THRESHOLD_USDT": p.get("LIQUIDITY_THRESHOLD_USDT", self.config["LIQUIDITY_THRESHOLD_USDT"])
+            }
+            for p in self.config.get("SCAN_PROFILES") or []
+        ]
+        return profiles or [{
+            "name": "default",
+            "MIN_CHANGE_PERCENT": self.config["MIN_CHANGE_PERCENT"],
+            "LIQUIDITY_THRESHOLD_USDT": self.config["LIQUIDITY_THRESHOLD_USDT"]
+        }]
+    
+    def _source_options(self, name):
+        """
+        数据源构造参数；未单独指定并发数时使用 KLINE_CONCURRENCY；
+        配置了 MARKET_DATA_PROXY（本地行情缓存服务）时，未单独指定 base_url 的币安数据源改为经缓存服务请求
+        """
+        options = dict((self.config.get("SOURCE_OPTIONS") or {}).get(name) or {})
+        options.setdefault("max_workers", self.config.get("KLINE_CONCURRENCY", 4))
+        proxy = self.config.get("MARKET_DATA_PROXY")
+        source_type = SOURCE_TYPES.get(options.get("type", name))
+        if proxy and "base_url" not in options and source_type and issubclass(source_type, HttpSource):
+            options["base_url"] = proxy
+        return options
+    
+    def _bind_metrics(self):
+        """让各数据源把请求统计记到本次扫描的 ScanMetrics"""
+        for source in self.sources:
+            source.metrics = self.metrics
+    
+    def _qualify(self, source, symbol):
+        return symbol if source is self.source else f"{source.name}:{symbol}"
+    
+    def _resolve(self, symbol):
+        """把 "数据源:交易对" 拆成 (数据源, 交易对)，不带前缀的属于主数据源"""
+        name, sep, raw = symbol.partition(":")
+        if sep and name in self.sources_by_name:
+            return self.sources_by_name[name], raw
+        return self.source, symbol
+    
+    def _shared(self, key, fn):
+        """
+        进程内合并相同请求：并发扫描时同一个 key 只请求一次，
+        结果在 REQUEST_CACHE_TTL 秒内复用
+        """
+        value, shared = self.request_cache.do(key, fn, self.config.get("REQUEST_CACHE_TTL", 5))
+        if shared:
+            self.metrics.count("shared_requests")
+        return value
+    
+    def get_active_symbols(self, source=None):
+        """从文件或 API 获取数据源的可交易合约列表"""
+        source = source or self.source
+        cache_file = self.cache_file if source.name == "binance_um" else f"exchange_info_cache_{source.name}.json"
         now = int(time.time())
         
         # 检查缓存文件是否存在且未过期
-        if os.path.exists(self.cache_file):
+        if os.path.exists(cache_file):
             try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                with open(cache_file, 'r', encoding='utf-8') as f:
                     cache = json.load(f)
                 if now - cache.get("timestamp", 0) < self.config["CACHE_EXPIRY"]:
                     self._log("从缓存加载exchangeInfo")
@@ -57,17 +154,10 @@ class BinanceAnalyzer:
         # 缓存不存在或已过期，重新拉取
         self._log("重新拉取exchangeInfo...")
         try:
-            resp = requests.get("https://fapi.binance.com/fapi/v1/exchangeInfo", timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            active_symbols = []
-            for sym in data['symbols']:
-                if sym['status'] == 'TRADING' and sym['contractType'] == 'PERPETUAL':
-                    active_symbols.append(sym['symbol'])
+            active_symbols = self._shared((source.name, "exchangeInfo"), source.list_symbols)
             
             # 写入缓存文件
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
+            with open(cache_file, 'w', encoding='utf-8') as f:
                 json.dump({
                     "timestamp": now,
                     "symbols": active_symbols
@@ -79,48 +169,30 @@ class BinanceAnalyzer:
         except Exception as e:
             self._log(f"拉取exchangeInfo失败: {e}")
             # 如果有旧缓存文件，即使过期也尝试使用（容错）
-            if os.path.exists(self.cache_file):
+            if os.path.exists(cache_file):
                 try:
-                    with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    with open(cache_file, 'r', encoding='utf-8') as f:
                         cache = json.load(f)
                     return set(cache.get("symbols", []))
                 except:
                     pass
             return set()
     
+    def get_funding_snapshot(self, source=None):
+        """数据源全部交易对的标记价格和资金费率（共享快照缓存，FUNDING_CACHE_TTL 秒内复用）"""
+        return get_funding_cache().get(source or self.source, self.config.get("FUNDING_CACHE_TTL", 30))
+    
     def get_klines_data(self, symbol, limit=3):
-        """获取指定交易对的K线数据"""
+        """获取指定交易对的K线数据（symbol 可带数据源前缀）"""
+        source, raw_symbol = self._resolve(symbol)
         max_retries = 2
         for attempt in range(max_retries):
             try:
-                url = "https://fapi.binance.com/fapi/v1/klines"
-                params = {
-                    "symbol": symbol,
-                    "interval": "1d",
-                    "limit": limit
-                }
-                resp = requests.get(url, params=params, timeout=10)
-                resp.raise_for_status()
-                raw = resp.json()
-                
-                # 转换为更易处理的格式
-                klines = []
-                for k in raw:
-                    klines.append({
-                        "open_time": k[0],
-                        "open": float(k[1]),
-                        "high": float(k[2]),
-                        "low": float(k[3]),
-                        "close": float(k[4]),
-                        "volume": float(k[5]),
-                        "close_time": k[6],
-                        "quote_volume": float(k[7]),
-                        "count": int(k[8])
-                    })
-                
-                return klines
+                return self._shared((source.name, "klines", raw_symbol, "1d", limit),
+                                    lambda: self._fetch_klines(source, raw_symbol, limit))
             except requests.exceptions.RequestException as e:
                 if attempt < max_retries - 1:
+                    self.metrics.count("retries")
                     time.sleep(0.5)
                     continue
                 else:
@@ -128,6 +200,51 @@ class BinanceAnalyzer:
             except Exception as e:
                 return []
     
+    def _fetch_klines(self, source, symbol, limit):
+        """从数据源获取一个交易对的日K线，主数据源的K线同时写入归档"""
+        klines = source.get_klines(symbol, "1d", limit)
+        if source is self.source:
+            self._archive_klines(symbol, klines)
+        return klines
+    
+    def _fetch_batch(self, symbols, max_workers=None):
+        """
+        获取一批交易对的K线，按输入顺序返回：按数据源分组后交给各数据源的 get_klines_batch 并发获取
+        （并发数和限速器按数据源分别控制），多个数据源的分组同时进行
+        :param max_workers: 覆盖各数据源的并发数（为1时全部在当前线程依次获取）
+        """
+        groups = {}
+        for symbol in symbols:
+            source, raw_symbol = self._resolve(symbol)
+            groups.setdefault(source.name, (source, []))[1].append(raw_symbol)
+        
+        def fetch_group(source, raw_symbols):
+            fetch = self._profiled(lambda raw: self.get_klines_data(self._qualify(source, raw), 3))
+            return source.get_klines_batch(raw_symbols, "1d", 3, fetch=fetch, max_workers=max_workers)
+        
+        if len(groups) == 1 or max_workers == 1:
+            fetched = {name: fetch_group(*group) for name, group in groups.items()}
+        else:
+            with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+                futures = {name: pool.submit(fetch_group, *group) for name, group in groups.items()}
+                fetched = {name: future.result() for name, future in futures.items()}
+        return [fetched[source.name][raw_symbol] for source, raw_symbol in map(self._resolve, symbols)]
+    
+    def _profiled(self, func):
+        """剖析期间包装交给工作线程执行的函数，使其调用出现在剖析结果中"""
+        return self.worker_profiles.wrap(func) if self.worker_profiles else func
+    
+    def _archive_klines(self, symbol, klines):
+        """写入本地K线归档，失败不影响分析"""
+        if not self.archive or not klines:
+            return
+        try:
+            with self.metrics.span("archive_write"):
+                self.archive.write(symbol, klines)
+        except Exception as e:
+            self.metrics.count("archive_errors")
+            self._log(f"K线归档写入失败 {symbol}: {e}")
+    
     def calculate_gains(self, klines):
         """计算各种涨幅"""
         if len(klines) < 3:
@@ -152,13 +269,15 @@ class BinanceAnalyzer:
             "gain_3d": gain_3d
         }
     
-    def check_conditions(self, gains):
-        """检查满足的条件"""
+    def check_conditions(self, gains, min_change_percent=None):
+        """检查满足的条件（min_change_percent 为 None 时使用配置的阈值）"""
         if not gains:
             return []
         
         conditions = []
-        min_change = self.config["MIN_CHANGE_PERCENT"] / 100
+        if min_change_percent is None:
+            min_change_percent = self.config["MIN_CHANGE_PERCENT"]
+        min_change = min_change_percent / 100
         
         if gains["gain_1d"] >= min_change:
             conditions.append("A")
@@ -171,9 +290,21 @@ class BinanceAnalyzer:
         
         return conditions
     
-    def get_liquid_symbols(self):
-        """获取符合流动性条件的活跃永续合约"""
-        active_symbols = self.get_active_symbols()
+    def is_near_threshold(self, gains, min_change_percent=None):
+        """判断涨幅是否已接近筛选阈值（用于观察名单）"""
+        if not gains:
+            return False
+        
+        if min_change_percent is None:
+            min_change_percent = self.config["MIN_CHANGE_PERCENT"]
+        proximity = self.config.get("WATCHLIST_PROXIMITY", 0.8)
+        near_change = min_change_percent / 100 * proximity
+        return max(gains["gain_1d"], gains["gain_2d"], gains["gain_3d"]) >= near_change
+    
+    def get_liquid_symbols(self, source=None):
+        """获取数据源中符合流动性条件的活跃合约"""
+        source = source or self.source
+        active_symbols = set(self.get_active_symbols(source))
         if not active_symbols:
             self._log("?? 无活跃合约列表，跳过")
             return []
@@ -181,66 +312,174 @@ class BinanceAnalyzer:
         self._log("获取24小时行情数据，过滤低流动性币种...")
         
         max_retries = 3
-        tickers = None
+        # 多个扫描方案共用一次获取：按最低的流动性阈值筛选，各方案再按自己的阈值过滤
+        threshold = min(p["LIQUIDITY_THRESHOLD_USDT"] for p in self.get_profiles())
+        liquid_symbols = []
+        ticker_count = 0
         for attempt in range(max_retries):
             try:
                 self._log(f"尝试获取24小时行情数据 (第 {attempt + 1}/{max_retries} 次)...")
-                resp = requests.get("https://fapi.binance.com/fapi/v1/ticker/24hr", timeout=15)
-                resp.raise_for_status()
-                tickers = resp.json()
+                # 数据源返回紧凑的 (交易对, 成交额) 列表；并发扫描共享同一次请求
+                liquid_symbols = []
+                ticker_count = 0
+                volumes = self._shared((source.name, "ticker/24hr"), source.get_quote_volumes)
+                for symbol, quote_vol in volumes:
+                    ticker_count += 1
+                    if symbol in active_symbols and quote_vol >= threshold:
+                        liquid_symbols.append(symbol)
+                        self.quote_volumes[self._qualify(source, symbol)] = quote_vol
                 break
-            except requests.exceptions.RequestException as e:
+            except (requests.exceptions.RequestException, ValueError) as e:
                 self._log(f"? 获取 ticker 失败 (第 {attempt + 1} 次): {e}")
                 if attempt < max_retries - 1:
+                    self.metrics.count("retries")
                     self._log("等待 5 秒后重试...")
                     time.sleep(5)
                 else:
                     self._log("? 所有重试均失败，跳过流动性过滤")
                     return list(active_symbols)[:self.config["MAX_ANALYZE_SYMBOLS"]]
         
-        if not tickers:
+        if ticker_count == 0:
             self._log("? 未能获取到行情数据")
             return []
         
-        liquid_symbols = []
-        for t in tickers:
-            symbol = t.get('symbol')
-            if not symbol or symbol not in active_symbols:
-                continue
-            
-            try:
-                quote_vol = float(t['quoteVolume'])
-            except (ValueError, KeyError):
-                continue
-            
-            if quote_vol >= self.config["LIQUIDITY_THRESHOLD_USDT"]:
-                liquid_symbols.append(symbol)
-        
         self._log(f"? 找到 {len(liquid_symbols)} 个符合流动性条件的币种")
         return liquid_symbols
     
-    def analyze(self):
-        """执行完整分析流程"""
+    def discover_symbols(self):
+        """获取所有数据源中符合流动性条件的交易对（多个数据源并行获取合约列表和24小时行情）"""
+        if len(self.sources) == 1:
+            return [symbol for source in self.sources for symbol in self._discover_symbols(source)]
+        with ThreadPoolExecutor(max_workers=len(self.sources)) as pool:
+            return [symbol for symbols_of_source in pool.map(self._profiled(self._discover_symbols), self.sources)
+                    for symbol in symbols_of_source]
+    
+    def _discover_symbols(self, source):
+        """获取一个数据源中符合流动性条件的交易对（带数据源前缀）"""
+        with self.metrics.span("exchange_info"):
+            active_symbols = self.get_active_symbols(source)
+        if not active_symbols:
+            self._log(f"警告: {source.name} 无活跃合约列表，跳过")
+            return []
+        
+        # 获取24小时行情数据，过滤低流动性币种
+        with self.metrics.span("ticker"):
+            liquid_symbols = self.get_liquid_symbols(source)
+        return [self._qualify(source, symbol) for symbol in liquid_symbols]
+    
+    def warm_up(self):
+        """
+        预热：解析DNS、建立并保持TLS连接、刷新exchangeInfo缓存，
+        使首次定时分析以稳定状态的速度运行
+        :return: 各阶段耗时报告（秒）
+        """
+        report = {}
+        total_start = time.time()
+        host = urlparse(getattr(self.source, "base_url", "")).hostname
+        
+        # DNS解析
+        if host:
+            stage_start = time.time()
+            try:
+                socket.getaddrinfo(host, 443)
+                report["dns"] = time.time() - stage_start
+            except Exception as e:
+                report["dns_error"] = str(e)
+        
+        # 建立连接（TCP + TLS握手），连接保留在会话连接池中
+        stage_start = time.time()
+        try:
+            self.source.ping()
+            report["connect"] = time.time() - stage_start
+        except Exception as e:
+            report["connect_error"] = str(e)
+        
+        # exchangeInfo（缓存有效时直接读取缓存文件）
+        stage_start = time.time()
+        active_symbols = self.get_active_symbols()
+        report["exchange_info"] = time.time() - stage_start
+        report["active_symbols"] = len(active_symbols)
+        
+        # 本地K线归档（扫描目录和列文件，预热文件系统缓存）
+        if self.archive:
+            stage_start = time.time()
+            try:
+                archive_stats = self.archive.stats()
+                report["kline_archive"] = time.time() - stage_start
+                report["archived_symbols"] = archive_stats["symbols"]
+            except Exception as e:
+                report["kline_archive_error"] = str(e)
+        
+        report["total"] = time.time() - total_start
+        return report
+    
+    def analyze(self, symbols=None, profile=False, profile_dir=".", cancel_event=None, checkpoint=None,
+                quote_volumes=None):
+        """
+        执行完整分析流程
+        :param symbols: 指定分析的交易对列表（如观察名单），为None时扫描全部高流动性合约
+        :param quote_volumes: 指定交易对的24小时成交额 {symbol: quote_volume}（观察名单模式下用于各方案的流动性过滤）
+        :param profile: 为True时用 cProfile + tracemalloc 剖析本次运行，报告写入 profile_dir；
+                        按正常并发运行，工作线程中的K线请求、JSON解码和K线解析各自剖析后合并到同一份报告
+        :param cancel_event: threading.Event，置位后在下一个币种之前停止，返回结果带 "cancelled": True
+        :param checkpoint: ScanCheckpoint，每 CHECKPOINT_EVERY 个币种保存断点，未过期的断点会被继续扫描
+        """
+        if profile:
+            from profiler import run_profiled, WorkerProfiles
+            self.worker_profiles = WorkerProfiles()
+            try:
+                analysis_data, report = run_profiled(
+                    lambda: self._analyze(symbols, cancel_event, checkpoint, quote_volumes), profile_dir, "scan",
+                    workers=self.worker_profiles
+                )
+            finally:
+                self.worker_profiles = None
+            analysis_data["profile"] = report
+            self._log(f"性能剖析已保存: {report['pstats']}（内存峰值 {report['peak_memory'] / 1024 / 1024:.1f} MB）")
+            return analysis_data
+        return self._analyze(symbols, cancel_event, checkpoint, quote_volumes)
+    
+    def _analyze(self, symbols=None, cancel_event=None, checkpoint=None, quote_volumes=None):
         try:
             # 记录分析开始时间
             start_time = datetime.now()
             start_timestamp = start_time.isoformat()
+            self.metrics = ScanMetrics()
+            self.quote_volumes = dict(quote_volumes or {}) if symbols is not None else {}
+            self._bind_metrics()
+            profiles = self.get_profiles()
+            multi_profile = bool(self.config.get("SCAN_PROFILES"))
             
-            # 获取活跃合约列表
-            active_symbols = self.get_active_symbols()
-            if not active_symbols:
-                self._log("警告: 无活跃合约列表，跳过")
-                return {"results": [], "start_time": start_timestamp, "end_time": start_timestamp, "duration": 0}
+            # 查找未过期的断点
+            scan_key = None
+            saved = None
+            checkpoint_every = self.config.get("CHECKPOINT_EVERY", 25)
+            if checkpoint is not None and checkpoint_every > 0:
+                scan_key = make_scan_key(self.config, list(symbols) if symbols is not None else None)
+                saved = checkpoint.load(scan_key, self.config.get("CHECKPOINT_MAX_AGE", 900))
             
-            # 获取24小时行情数据，过滤低流动性币种
-            liquid_symbols = self.get_liquid_symbols()
+            if saved:
+                # 从断点恢复：沿用上次的交易对列表，跳过exchangeInfo和24小时行情
+                liquid_symbols = saved["symbols"]
+                self._log(f"从断点恢复扫描：已完成 {saved['processed']}/{len(liquid_symbols)}")
+            elif symbols is not None:
+                # 观察名单模式：只重新拉取指定币种的K线，跳过exchangeInfo和24小时行情
+                liquid_symbols = list(symbols)
+            else:
+                liquid_symbols = self.discover_symbols()
             if not liquid_symbols:
                 self._log("警告: 无符合条件的活跃合约列表")
-                return {"results": [], "start_time": start_timestamp, "end_time": start_timestamp, "duration": 0}
+                return {"results": [], "near_symbols": [], "start_time": start_timestamp, "end_time": start_timestamp, "duration": 0,
+                        "metrics": self.metrics.to_dict()}
             
             # 开始分析
             self._log("=== 开始币安合约三日涨幅分析 ===")
-            self._log(f"筛选条件：涨幅 >= {self.config['MIN_CHANGE_PERCENT']}%")
+            if multi_profile:
+                for p in profiles:
+                    self._log(f"扫描方案 {p['name']}：涨幅 >= {p['MIN_CHANGE_PERCENT']}%，"
+                              f"成交额 >= {p['LIQUIDITY_THRESHOLD_USDT']:,.0f} USDT")
+            else:
+                self._log(f"筛选条件：涨幅 >= {self.config['MIN_CHANGE_PERCENT']}%")
             self._log(f"分析开始时间：{start_time.strftime('%Y-%m-%d %H:%M:%S')}")
                 
                 # 限制分析数量
@@ -251,15 +490,69 @@ class BinanceAnalyzer:
             
             self._log(f"开始分析所有 {len(liquid_symbols)} 个高流动性永续合约")
             
-            results = []
+            # 各扫描方案的命中结果和观察名单候选
+            profile_results = {p["name"]: [] for p in profiles}
+            profile_near = {p["name"]: [] for p in profiles}
+            if saved:
+                # 断点恢复时跳过了24小时行情，流动性过滤使用断点中保存的成交额
+                self.quote_volumes.update(saved["quote_volumes"])
+            if saved and multi_profile:
+                profile_results.update(saved["results"]["profiles"])
+                profile_near.update(saved["results"]["near"])
+            elif saved:
+                profile_results[profiles[0]["name"]] = saved["results"]
+                profile_near[profiles[0]["name"]] = saved["near_symbols"]
+            results = profile_results[profiles[0]["name"]]
+            near_symbols = profile_near[profiles[0]["name"]]
+            # 所有算出涨幅的币种（不只是命中的），紧凑格式 [symbol, gain_1d, gain_2d, gain_3d]，用于涨幅历史
+            evaluated = list(saved["evaluated"]) if saved else []
+            
+            def save_checkpoint():
+                # 多方案时把各方案结果一并写入断点
+                saved_results = results
+                if multi_profile:
+                    saved_results = {"profiles": profile_results, "near": profile_near}
+                checkpoint.save(scan_key, start_timestamp, liquid_symbols, processed, saved_results, near_symbols,
+                                evaluated, self.quote_volumes)
+            
+            resume_from = saved["processed"] if saved else 0
             total = len(liquid_symbols)
             process_start_time = time.time()
+            cancelled = False
+            missing_volume = 0
             
-            for i, symbol in enumerate(liquid_symbols, 1):
+            concurrency = self.config.get("KLINE_CONCURRENCY", 4)
+            batch_size = max(1, self.config.get("KLINE_BATCH_SIZE", 10))
+            processed = resume_from
+            last_saved = resume_from
+            for batch_start in range(resume_from, total, batch_size):
+                # 协作式取消：在批次之间检查
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    self._log(f"分析已取消（已完成 {processed}/{total}）")
+                    if scan_key:
+                        save_checkpoint()
+                    break
+                
+                # 每处理 N 个币种保存一次断点
+                if scan_key and processed - last_saved >= checkpoint_every:
+                    with self.metrics.span("checkpoint"):
+                        save_checkpoint()
+                    last_saved = processed
+                
+                # 并发获取本批K线数据
+                batch = liquid_symbols[batch_start:batch_start + batch_size]
+                with self.metrics.span("klines"):
+                    batch_klines = self._fetch_batch(batch)
+                
+                for symbol, klines in zip(batch, batch_klines):
+                    processed += 1
+                    i = processed
+                    
                     # 计算预计剩余时间
-                    if i > 1:
+                    if i > resume_from + 1:
                         elapsed = time.time() - process_start_time
-                        avg_per_symbol = elapsed / (i - 1)
+                        avg_per_symbol = elapsed / (i - resume_from)
                         remaining = (total - i) * avg_per_symbol
                         eta = f" (预计剩余 {remaining:.0f} 秒)"
                     else:
@@ -269,46 +562,111 @@ class BinanceAnalyzer:
                     progress = int((i / total) * 100)
                     self._log(f"[{i}/{total}] 正在分析 {symbol}...{eta}", progress)
                     
-                    # 获取K线数据
-                    klines = self.get_klines_data(symbol, 3)
                     if not klines or len(klines) < 3:
                         continue
                     
-                    # 计算涨幅
-                    gains = self.calculate_gains(klines)
-                    if not gains:
-                        continue
-                    
-                    # 检查条件
-                    conditions = self.check_conditions(gains)
-                    if not conditions:
-                        continue
-                    
-                    # 添加到结果
-                    result = {
-                        "symbol": symbol,
-                        "gain_1d": gains["gain_1d"],
-                        "gain_2d": gains["gain_2d"],
-                        "gain_3d": gains["gain_3d"],
-                        "changes": gains
-                    }
-                    results.append(result)
-                
+                    with self.metrics.span("compute"):
+                        # 计算涨幅（所有扫描方案共用）
+                        gains = self.calculate_gains(klines)
+                        if not gains:
+                            continue
+                        evaluated.append([symbol, gains["gain_1d"], gains["gain_2d"], gains["gain_3d"]])
+                        
+                        result = None
+                        quote_volume = self.quote_volumes.get(symbol)
+                        if quote_volume is None and symbols is not None:
+                            # 观察名单模式未提供24小时成交额时，使用今日K线的成交额
+                            quote_volume = klines[-1].get("quote_volume")
+                        if quote_volume is None:
+                            missing_volume += 1
+                        for p in profiles:
+                            # 成交额未知时无法判断流动性，跳过该方案
+                            if quote_volume is None or quote_volume < p["LIQUIDITY_THRESHOLD_USDT"]:
+                                continue
+                            
+                            # 检查条件
+                            if not self.check_conditions(gains, p["MIN_CHANGE_PERCENT"]):
+                                # 未达标但已接近阈值，加入观察名单候选
+                                if self.is_near_threshold(gains, p["MIN_CHANGE_PERCENT"]):
+                                    profile_near[p["name"]].append(symbol)
+                                continue
+                            
+                            # 添加到结果（各方案共用同一个结果对象）
+                            if result is None:
+                                scores = compute_scores(gains, quote_volume)
+                                result = {
+                                    "symbol": symbol,
+                                    "source": self._resolve(symbol)[0].name,
+                                    "gain_1d": gains["gain_1d"],
+                                    "gain_2d": gains["gain_2d"],
+                                    "gain_3d": gains["gain_3d"],
+                                    "changes": gains,
+                                    "quote_volume": quote_volume,
+                                    "scores": scores,
+                                    "score": total_score(scores, self.config.get("SCORE_WEIGHTS"))
+                                }
+                            profile_results[p["name"]].append(result)
+            
+            if missing_volume:
+                self._log(f"警告: {missing_volume} 个币种缺少24小时成交额，未参与筛选")
+            
+            # 结果按综合评分从高到低排列
+            for profile_hits in profile_results.values():
+                sort_results(profile_hits)
+            
+            # 只对命中币种补充资金费率、持仓量变化、量比和ATR
+            if not cancelled and self.config.get("ENRICH_RESULTS", True):
+                all_hits = [r for profile_hits in profile_results.values() for r in profile_hits]
+                if all_hits:
+                    self._log(f"补充 {len(set(r['symbol'] for r in all_hits))} 个命中币种的扩展指标...")
+                    with self.metrics.span("enrich"):
+                        ResultEnricher(self, max_workers=concurrency).enrich(all_hits)
+            
                 # 记录分析结束时间
             end_time = datetime.now()
             end_timestamp = end_time.isoformat()
             duration = (end_time - start_time).total_seconds()
             
-            self._log(f"分析完成！找到 {len(results)} 个符合条件的交易对", 100)
+            if not cancelled:
+                if scan_key:
+                    checkpoint.clear(scan_key)
+                self._log(f"分析完成！找到 {len(results)} 个符合条件的交易对", 100)
             self._log(f"分析结束时间：{end_time.strftime('%Y-%m-%d %H:%M:%S')}")
             self._log(f"分析耗时：{duration:.1f} 秒")
             
-            return {
+            self.metrics.gauges["symbols_scanned"] = total
+            self.metrics.gauges["hits"] = len(results)
+            watch_symbols = {r["symbol"] for hits in profile_results.values() for r in hits}
+            watch_symbols.update(s for near in profile_near.values() for s in near)
+            metrics = self.metrics.to_dict()
+            self._log(f"耗时分布：{format_summary(metrics)}")
+            
+            analysis_data = {
                 "results": results,
+                "near_symbols": near_symbols,
+                "evaluated": evaluated,
+                # 命中和观察名单候选币种的24小时成交额，随观察名单保存供下次重扫使用
+                "quote_volumes": {s: self.quote_volumes[s] for s in watch_symbols if s in self.quote_volumes},
                 "start_time": start_timestamp,
                 "end_time": end_timestamp,
-                "duration": duration
+                "duration": duration,
+                "metrics": metrics
             }
+            if multi_profile:
+                analysis_data["profiles"] = {
+                    p["name"]: {
+                        "results": profile_results[p["name"]],
+                        "near_symbols": profile_near[p["name"]],
+                        "min_change_percent": p["MIN_CHANGE_PERCENT"],
+                        "liquidity_threshold_usdt": p["LIQUIDITY_THRESHOLD_USDT"]
+                    }
+                    for p in profiles
+                }
+            if cancelled:
+                analysis_data["cancelled"] = True
+            if saved:
+                analysis_data["resumed_from"] = resume_from
+            return analysis_data
             
         except Exception as e:
             end_time = datetime.now()
@@ -318,8 +676,10 @@ class BinanceAnalyzer:
             self._log(f"分析出错: {str(e)}")
             return {
                 "results": [],
+                "near_symbols": [],
                 "start_time": start_timestamp if 'start_timestamp' in locals() else end_timestamp,
                 "end_time": end_timestamp,
                 "duration": duration,
-                "error": str(e)
+                "error": str(e),
+                "metrics": self.metrics.to_dict()
             }
@@ -0,0 +1,227 @@
+"""
+K线历史回填模块
+把币安公开数据（data.binance.vision）格式的K线文件批量导入本地K线归档，
+不消耗 /fapi/v1/klines 的请求权重，适合一次性补齐多年历史。
+- 支持月度/日度的 .zip 与 .csv 文件，文件名格式: <SYMBOL>-<interval>-<YYYY-MM[-DD]>.zip
+- ZIP 内的 CSV 流式解压、逐行解析，不整体载入内存
+- 同一交易对的多个文件攒成批次后一次写入归档
+- 已导入的文件记录在归档目录下的台账中（按大小和修改时间判断），中断后重新运行会跳过已完成的文件；
+  重复导入同一文件也只会按 open_time 去重覆盖，结果不变
+
+用法:
+    python backfill.py ./data/futures/um/monthly/klines --archive kline_archive --interval 1d
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import time
+import zipfile
+from collections import defaultdict
+from datetime import datetime
+
+from kline_archive import FIELDS, KlineArchive
+
+FILE_PATTERN = re.compile(
+    r"^(?P<symbol>[A-Z0-9]+)-(?P<interval>[0-9]+(?:mo|[smhdwM]))-(?P<period>\d{4}-\d{2}(?:-\d{2})?)\.(?P<ext>zip|csv)$"
+)
+LEDGER_FILE = "backfill_ledger.json"
+
+
+def normalize_interval(interval):
+    """月线在 API 中写作 1M，在数据下载站的文件名中写作 1mo，统一为 1mo"""
+    return interval[:-1] + "mo" if interval.endswith("M") else interval
+
+
+def find_kline_files(source_dir, interval="1d", symbols=None):
+    """
+    递归查找K线文件
+    :return: {交易对: [(周期字符串, 路径), ...]}，每个交易对内按时间排序（同一月份的月度文件排在日度文件前）
+    """
+    wanted = set(symbols) if symbols else None
+    interval = normalize_interval(interval)
+    found = defaultdict(list)
+    for dirpath, _, filenames in os.walk(source_dir):
+        for filename in filenames:
+            match = FILE_PATTERN.match(filename)
+            if not match or normalize_interval(match.group("interval")) != interval:
+                continue
+            symbol = match.group("symbol")
+            if wanted is not None and symbol not in wanted:
+                continue
+            found[symbol].append((match.group("period"), os.path.join(dirpath, filename)))
+    for files in found.values():
+        files.sort()
+    return dict(sorted(found.items()))
+
+
+def _open_text(path):
+    """返回CSV文本流的迭代器（ZIP 内的第一个 .csv 成员流式解压）"""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            members = [name for name in zf.namelist() if name.endswith(".csv")]
+            for name in members[:1]:
+                with zf.open(name) as raw:
+                    yield from io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            yield from f
+
+
+def _to_millis(value):
+    # 部分新文件的时间戳为微秒
+    value = int(value)
+    return value // 1000 if value > 10 ** 14 else value
+
+
+def parse_kline_file(path):
+    """逐行解析一个K线文件，产出归档使用的K线字典（自动跳过表头）"""
+    for row in csv.reader(_open_text(path)):
+        if not row or not row[0].strip().isdigit():
+            continue
+        kline = {}
+        for i, (field, code) in enumerate(FIELDS):
+            if code == "q":
+                kline[field] = _to_millis(row[i]) if field.endswith("_time") else int(row[i])
+            else:
+                kline[field] = float(row[i])
+        yield kline
+
+
+class BackfillLedger:
+    """已导入文件台账（JSON），每完成一批就落盘"""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.files = json.load(f).get("files", {})
+            except Exception as e:
+                print(f"读取回填台账失败，将重新导入: {e}")
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+    def is_done(self, key, path):
+        entry = self.files.get(key)
+        if not entry:
+            return False
+        signature = self._signature(path)
+        return entry.get("size") == signature["size"] and entry.get("mtime") == signature["mtime"]
+
+    def mark_done(self, key, path, rows):
+        entry = self._signature(path)
+        entry["rows"] = rows
+        entry["done_at"] = datetime.now().isoformat()
+        self.files[key] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def _flush(archive, ledger, symbol, batch, pending):
+    """把一个交易对攒下的K线写入归档，成功后再登记对应文件"""
+    if batch:
+        batch.sort(key=lambda k: k["open_time"])
+        last_old = archive.last_open_time(symbol)
+        if last_old is None or batch[0]["open_time"] > last_old:
+            # 纯追加
+            archive.write(symbol, batch)
+        else:
+            archive.merge(symbol, batch)
+    for key, path, rows in pending:
+        ledger.mark_done(key, path, rows)
+    ledger.save()
+
+
+def backfill(source_dir, archive=None, archive_dir="kline_archive", interval="1d",
+             symbols=None, batch_rows=50000, resume=True, progress=None):
+    """
+    从本地目录导入K线文件
+    :param batch_rows: 每个交易对累计多少行写一次归档
+    :param resume: 是否跳过台账中已完成的文件
+    :param progress: 可选回调 progress(symbol, files_done, files_total)
+    :return: 统计字典
+    """
+    archive = archive or KlineArchive(archive_dir, normalize_interval(interval))
+    ledger = BackfillLedger(os.path.join(archive.root_dir, LEDGER_FILE))
+    files_by_symbol = find_kline_files(source_dir, interval, symbols)
+    total_files = sum(len(files) for files in files_by_symbol.values())
+
+    stats = {"symbols": 0, "files": 0, "skipped": 0, "failed": 0, "rows": 0}
+    start = time.time()
+    done = 0
+
+    for symbol, files in files_by_symbol.items():
+        batch = []
+        pending = []
+        for _, path in files:
+            done += 1
+            key = os.path.relpath(path, source_dir)
+            if resume and ledger.is_done(key, path):
+                stats["skipped"] += 1
+                continue
+            try:
+                klines = list(parse_kline_file(path))
+            except (OSError, ValueError, IndexError, zipfile.BadZipFile, csv.Error) as e:
+                print(f"解析文件失败 {path}: {e}")
+                stats["failed"] += 1
+                continue
+
+            batch.extend(klines)
+            pending.append((key, path, len(klines)))
+            stats["files"] += 1
+            stats["rows"] += len(klines)
+
+            if len(batch) >= batch_rows:
+                _flush(archive, ledger, symbol, batch, pending)
+                batch, pending = [], []
+
+        if pending:
+            _flush(archive, ledger, symbol, batch, pending)
+            stats["symbols"] += 1
+        if progress:
+            progress(symbol, done, total_files)
+
+    stats["duration"] = time.time() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从 data.binance.vision 格式的本地文件回填K线归档")
+    parser.add_argument("source", help="K线文件所在目录（递归查找 .zip/.csv）")
+    parser.add_argument("--archive", default="kline_archive", help="K线归档目录")
+    parser.add_argument("--interval", default="1d", help="K线周期")
+    parser.add_argument("--symbols", default="", help="只导入指定交易对，逗号分隔")
+    parser.add_argument("--batch-rows", type=int, default=50000, help="每批写入的行数")
+    parser.add_argument("--no-resume", action="store_true", help="忽略台账，重新导入全部文件")
+    args = parser.parse_args()
+
+    def progress(symbol, files_done, files_total):
+        print(f"[{files_done}/{files_total}] {symbol}")
+
+    stats = backfill(
+        args.source,
+        archive_dir=args.archive,
+        interval=args.interval,
+        symbols=[s for s in args.symbols.split(",") if s] or None,
+        batch_rows=args.batch_rows,
+        resume=not args.no_resume,
+        progress=progress
+    )
+    print(f"导入完成: {stats['symbols']} 个交易对，{stats['files']} 个文件，{stats['rows']} 行，"
+          f"跳过 {stats['skipped']} 个，失败 {stats['failed']} 个，耗时 {stats['duration']:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
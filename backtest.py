@@ -0,0 +1,260 @@
+"""
+离线回测模块 - 评估 A/B/C 暴涨条件（涨幅达标后做空）的历史表现
+读取本地K线归档（kline_archive），按与 BinanceAnalyzer.calculate_gains / check_conditions
+相同的口径逐日计算涨幅和信号，在信号当日收盘价模拟开空，统计不同持有天数后的收益。
+全部计算基于 NumPy 向量化，阈值 × 币种 × 两年的参数扫描可在数秒内完成。
+
+用法:
+    python backtest.py --thresholds 50,100,200 --liquidity 1000000 --horizons 1,3,7,14
+"""
+import argparse
+import math
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from kline_archive import KlineArchive
+
+DEFAULT_HORIZONS = (1, 3, 7, 14)
+DAY_MS = 86_400_000
+
+
+def load_panel(archive, symbols=None, start=None, end=None):
+    """
+    把归档中各交易对的日K线拼接成一个面板（各交易对首尾相接的连续数组）
+    :return: {"symbols": [...], "offsets": 每个交易对的起始下标（长度 n+1）, "open_time", "open", "close", "quote_volume"}
+    """
+    symbols = list(symbols) if symbols is not None else archive.symbols()
+    columns = {"open_time": [], "open": [], "close": [], "quote_volume": []}
+    kept = []
+    offsets = [0]
+    for symbol in symbols:
+        data = archive.read(symbol, start, end, fields=list(columns.keys()))
+        count = len(data["open_time"])
+        if count == 0:
+            continue
+        kept.append(symbol)
+        offsets.append(offsets[-1] + count)
+        for field in columns:
+            columns[field].append(np.asarray(data[field]))
+
+    panel = {"symbols": kept, "offsets": np.asarray(offsets, dtype=np.int64)}
+    for field, parts in columns.items():
+        dtype = np.int64 if field == "open_time" else np.float64
+        panel[field] = np.concatenate(parts).astype(dtype, copy=False) if parts else np.empty(0, dtype=dtype)
+    return panel
+
+
+def _lag(values, n, pos):
+    """同一交易对内向前取第 n 根的值，越界处为 NaN"""
+    out = np.full(values.shape, np.nan)
+    if n < len(values):
+        out[n:] = values[:-n]
+    out[pos < n] = np.nan
+    return out
+
+
+def _lead_by_time(values, open_time, offsets, delta):
+    """同一交易对内取 open_time 晚 delta 毫秒的那根K线的值，该时间没有K线（缺口或越界）时为 NaN"""
+    out = np.full(values.shape, np.nan)
+    for lo, hi in zip(offsets[:-1], offsets[1:]):
+        times = open_time[lo:hi]
+        target = times + delta
+        idx = np.searchsorted(times, target)
+        found = idx < len(times)
+        found[found] = times[idx[found]] == target[found]
+        out[lo:hi][found] = values[lo:hi][idx[found]]
+    return out
+
+
+def compute_features(panel, horizons=DEFAULT_HORIZONS):
+    """
+    逐行计算涨幅（与 calculate_gains 口径一致）和做空的前瞻收益
+    gain_1d = 当日收盘 / 当日开盘 - 1
+    gain_2d = 当日收盘 / 前1日开盘 - 1
+    gain_3d = 当日收盘 / 前2日开盘 - 1
+    short_ret[h] = 1 - h日后收盘 / 当日收盘（按 open_time 取 h 天后的K线，该日缺失时为 NaN）
+    """
+    offsets = panel["offsets"]
+    total = int(offsets[-1]) if len(offsets) else 0
+    seg_len = np.diff(offsets)
+    seg_id = np.repeat(np.arange(len(seg_len)), seg_len)
+    pos = np.arange(total) - offsets[:-1][seg_id]
+
+    open_ = panel["open"]
+    close = panel["close"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features = {
+            "seg_id": seg_id,
+            "pos": pos,
+            "gain_1d": close / open_ - 1,
+            "gain_2d": close / _lag(open_, 1, pos) - 1,
+            "gain_3d": close / _lag(open_, 2, pos) - 1,
+            "quote_volume": panel["quote_volume"],
+            "short_returns": {h: 1 - _lead_by_time(close, panel["open_time"], offsets, h * DAY_MS) / close
+                              for h in horizons},
+        }
+    # calculate_gains 需要至少3根K线
+    for key in ("gain_1d", "gain_2d", "gain_3d"):
+        features[key][pos < 2] = np.nan
+    features["max_gain"] = np.fmax(np.fmax(features["gain_1d"], features["gain_2d"]), features["gain_3d"])
+    return features
+
+
+def signal_mask(features, min_change_percent, liquidity_threshold=0, new_signals_only=True):
+    """check_conditions 的向量化版本：任一条件达标且满足流动性即为信号"""
+    threshold = min_change_percent / 100
+    with np.errstate(invalid="ignore"):
+        hit = features["max_gain"] >= threshold
+        mask = hit & (features["quote_volume"] >= liquidity_threshold)
+    if new_signals_only:
+        # 只在首次达标当日入场，连续达标的后续日期不重复计数
+        prev = np.zeros_like(hit)
+        prev[1:] = hit[:-1]
+        prev[features["pos"] == 0] = False
+        mask &= ~prev
+    return mask
+
+
+def _summary(returns):
+    returns = returns[~np.isnan(returns)]
+    if len(returns) == 0:
+        return {"count": 0, "mean": None, "median": None, "win_rate": None}
+    return {
+        "count": int(len(returns)),
+        "mean": float(returns.mean()),
+        "median": float(np.median(returns)),
+        "win_rate": float((returns > 0).mean())
+    }
+
+
+def evaluate(features, min_change_percent, liquidity_threshold=0, new_signals_only=True):
+    """评估一组参数：信号数量、A/B/C 条件分布和各持有期做空收益"""
+    mask = signal_mask(features, min_change_percent, liquidity_threshold, new_signals_only)
+    threshold = min_change_percent / 100
+    with np.errstate(invalid="ignore"):
+        counts = {
+            "A": int((mask & (features["gain_1d"] >= threshold)).sum()),
+            "B": int((mask & (features["gain_2d"] >= threshold)).sum()),
+            "C": int((mask & (features["gain_3d"] >= threshold)).sum()),
+        }
+    return {
+        "min_change_percent": min_change_percent,
+        "liquidity_threshold": liquidity_threshold,
+        "signals": int(mask.sum()),
+        "symbols": int(len(np.unique(features["seg_id"][mask]))),
+        "conditions": counts,
+        "horizons": {h: _summary(r[mask]) for h, r in features["short_returns"].items()},
+    }
+
+
+class BacktestEngine:
+    def __init__(self, archive=None, archive_dir="kline_archive", symbols=None,
+                 start=None, end=None, horizons=DEFAULT_HORIZONS):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("回测需要安装 NumPy: pip install numpy")
+        self.archive = archive or KlineArchive(archive_dir)
+        self.horizons = tuple(horizons)
+        self.start = start
+        self.end = end
+        self.panel = load_panel(self.archive, symbols, start, end)
+        self.features = compute_features(self.panel, self.horizons)
+
+    def run(self, min_change_percent=100.0, liquidity_threshold=0, new_signals_only=True):
+        return evaluate(self.features, min_change_percent, liquidity_threshold, new_signals_only)
+
+    def sweep(self, thresholds, liquidity_thresholds=(0,), new_signals_only=True):
+        """参数扫描：阈值 × 流动性阈值，共享同一份特征数组"""
+        return [
+            evaluate(self.features, th, liq, new_signals_only)
+            for th in thresholds
+            for liq in liquidity_thresholds
+        ]
+
+    def signals(self, min_change_percent=100.0, liquidity_threshold=0, new_signals_only=True):
+        """列出每个信号的明细（交易对、日期、涨幅、满足的条件、各持有期收益）"""
+        mask = signal_mask(self.features, min_change_percent, liquidity_threshold, new_signals_only)
+        threshold = min_change_percent / 100
+        rows = []
+        for i in np.flatnonzero(mask):
+            gains = {k: float(self.features[k][i]) for k in ("gain_1d", "gain_2d", "gain_3d")}
+            rows.append({
+                "symbol": self.panel["symbols"][self.features["seg_id"][i]],
+                "date": datetime.fromtimestamp(int(self.panel["open_time"][i]) / 1000, timezone.utc).strftime("%Y-%m-%d"),
+                **gains,
+                "conditions": [c for c, k in (("A", "gain_1d"), ("B", "gain_2d"), ("C", "gain_3d"))
+                               if gains[k] >= threshold],
+                "short_returns": {h: (None if math.isnan(r[i]) else float(r[i]))
+                                  for h, r in self.features["short_returns"].items()},
+            })
+        return rows
+
+    def verify_with_analyzer(self, analyzer, limit=None):
+        """
+        用 BinanceAnalyzer.calculate_gains / check_conditions 逐日回放，核对向量化信号
+        （不去重连续信号，阈值取 analyzer.config），返回不一致的 (交易对, open_time) 列表
+        读取与面板相同的 start/end 区间，按 open_time 对应面板中的行；面板加载后归档新增的K线不参与核对
+        """
+        mask = signal_mask(self.features, analyzer.config["MIN_CHANGE_PERCENT"], new_signals_only=False)
+        mismatches = []
+        offsets = self.panel["offsets"]
+        for seg, symbol in enumerate(self.panel["symbols"][:limit]):
+            lo, hi = int(offsets[seg]), int(offsets[seg + 1])
+            times = self.panel["open_time"][lo:hi]
+            rows = self.archive.read_rows(symbol, self.start, self.end)
+            for j in range(2, len(rows)):
+                open_time = rows[j]["open_time"]
+                i = int(np.searchsorted(times, open_time))
+                if i >= len(times) or times[i] != open_time:
+                    continue
+                conditions = analyzer.check_conditions(analyzer.calculate_gains(rows[j - 2:j + 1]))
+                if bool(conditions) != bool(mask[lo + i]):
+                    mismatches.append((symbol, open_time))
+        return mismatches
+
+
+def format_table(rows, horizons):
+    lines = []
+    header = f"{'阈值%':>8} {'流动性':>12} {'信号':>6} {'币种':>5} " + " ".join(
+        f"{f'{h}日均值':>9} {f'{h}日胜率':>8}" for h in horizons)
+    lines.append(header)
+    for row in rows:
+        parts = [f"{row['min_change_percent']:>8.0f}", f"{row['liquidity_threshold']:>12.0f}",
+                 f"{row['signals']:>6d}", f"{row['symbols']:>5d}"]
+        for h in horizons:
+            s = row["horizons"][h]
+            if s["count"]:
+                parts.append(f"{s['mean'] * 100:>8.2f}% {s['win_rate'] * 100:>7.1f}%")
+            else:
+                parts.append(f"{'-':>9} {'-':>8}")
+        lines.append(" ".join(parts))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A/B/C 暴涨做空条件离线回测")
+    parser.add_argument("--archive", default="kline_archive", help="K线归档目录")
+    parser.add_argument("--thresholds", default="50,100,150,200,300", help="涨幅阈值(%%)，逗号分隔")
+    parser.add_argument("--liquidity", default="0,1000000", help="流动性阈值(USDT)，逗号分隔")
+    parser.add_argument("--horizons", default=",".join(str(h) for h in DEFAULT_HORIZONS), help="持有天数，逗号分隔")
+    parser.add_argument("--all-signals", action="store_true", help="连续达标的每一天都计为信号")
+    args = parser.parse_args()
+
+    horizons = [int(h) for h in args.horizons.split(",")]
+    engine = BacktestEngine(archive_dir=args.archive, horizons=horizons)
+    print(f"已加载 {len(engine.panel['symbols'])} 个交易对，共 {int(engine.panel['offsets'][-1])} 根日K线")
+
+    rows = engine.sweep(
+        [float(t) for t in args.thresholds.split(",")],
+        [float(v) for v in args.liquidity.split(",")],
+        new_signals_only=not args.all_signals
+    )
+    print(format_table(rows, horizons))
+
+
+if __name__ == "__main__":
+    main()
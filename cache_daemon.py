@@ -0,0 +1,201 @@
+"""
+本地行情缓存服务
+多个使用不同阈值的分析进程各自扫描时，exchangeInfo、24小时行情和K线请求完全相同。
+本服务在本机（默认 http://127.0.0.1:9110）代理币安接口：
+- 按接口设置缓存时间（TTL），有效期内直接返回缓存的响应
+- 同一请求正在进行时，其他进程的相同请求等待并共享结果（single-flight）
+- 按路径前缀转发：/fapi、/futures → U本位合约，/dapi → 币本位合约，/api → 现货；
+  /futures/data 下按 pair 查询的请求（币本位持仓量历史）转发到币本位合约
+分析器配置 MARKET_DATA_PROXY 指向本服务后，N 个配置只产生一次上游请求。
+
+用法:
+    python cache_daemon.py --port 9110
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qsl, urlsplit, urlencode
+
+import requests
+
+from market_data import get_http_session
+from request_cache import RequestCache
+
+UPSTREAMS = {
+    "/fapi/": "https://fapi.binance.com",
+    "/futures/": "https://fapi.binance.com",
+    "/dapi/": "https://dapi.binance.com",
+    "/api/": "https://api.binance.com",
+}
+
+# 各接口的缓存秒数（按路径结尾匹配），未列出的接口使用 default
+DEFAULT_TTLS = {
+    "/exchangeInfo": 300,
+    "/ticker/24hr": 30,
+    "/klines": 60,
+    "/premiumIndex": 10,
+    "/openInterestHist": 300,
+    "/ping": 0,
+    "default": 10,
+}
+
+# U本位与币本位的 /futures/data 接口路径相同，币本位按 pair 查询、U本位按 symbol 查询
+COIN_FUTURES_DATA = ("/futures/data/", "https://dapi.binance.com")
+
+FORWARD_HEADERS = ("Content-Type", "X-MBX-USED-WEIGHT-1M")
+
+
+class UpstreamError(Exception):
+    """上游返回非2xx响应：不缓存，但同一时刻等待中的请求共享该响应"""
+
+    def __init__(self, status, headers, body):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class MarketDataCache:
+    """带TTL和请求合并的上游代理"""
+
+    def __init__(self, upstreams=None, ttls=None, max_entries=5000):
+        self.upstreams = upstreams or UPSTREAMS
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.cache = RequestCache(max_entries)
+        self.session = get_http_session()
+        self.stats = {"requests": 0, "upstream": 0, "errors": 0}
+
+    def ttl_for(self, path):
+        for suffix, ttl in self.ttls.items():
+            if suffix != "default" and path.endswith(suffix):
+                return ttl
+        return self.ttls["default"]
+
+    def upstream_for(self, path, query=""):
+        if path.startswith(COIN_FUTURES_DATA[0]) and "pair" in dict(parse_qsl(query)):
+            return COIN_FUTURES_DATA[1]
+        for prefix, base_url in self.upstreams.items():
+            if path.startswith(prefix):
+                return base_url
+        return None
+
+    @staticmethod
+    def cache_key(path, query):
+        """参数顺序不同的相同请求使用同一个缓存项"""
+        return f"{path}?{urlencode(sorted(parse_qsl(query)))}"
+
+    def _fetch(self, base_url, path, query):
+        self.stats["upstream"] += 1
+        resp = self.session.get(f"{base_url}{path}", params=parse_qsl(query), timeout=15)
+        headers = {name: resp.headers[name] for name in FORWARD_HEADERS if name in resp.headers}
+        if resp.status_code >= 300:
+            raise UpstreamError(resp.status_code, headers, resp.content)
+        return resp.status_code, headers, resp.content
+
+    def get(self, path, query=""):
+        """
+        返回 (状态码, 响应头, 响应体, 缓存状态)
+        缓存状态: MISS 实际请求了上游 / HIT 复用了缓存或并发请求的结果
+        """
+        self.stats["requests"] += 1
+        base_url = self.upstream_for(path, query)
+        if base_url is None:
+            return 404, {}, b"", "MISS"
+
+        try:
+            (status, headers, body), shared = self.cache.do(
+                self.cache_key(path, query), lambda: self._fetch(base_url, path, query), self.ttl_for(path)
+            )
+        except UpstreamError as e:
+            self.stats["errors"] += 1
+            return e.status, e.headers, e.body, "MISS"
+        except requests.exceptions.RequestException as e:
+            self.stats["errors"] += 1
+            return 502, {"Content-Type": "text/plain; charset=utf-8"}, str(e).encode("utf-8"), "MISS"
+        return status, headers, body, "HIT" if shared else "MISS"
+
+    def status(self):
+        return {**self.stats, **{f"cache_{k}": v for k, v in self.cache.stats.items()},
+                "entries": len(self.cache.memo)}
+
+
+class CacheDaemon:
+    def __init__(self, cache=None, host="127.0.0.1", port=9110):
+        self.cache = cache or MarketDataCache()
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.server.server_address[1]}" if self.server else None
+
+    def start(self):
+        if self.server is not None:
+            return False
+
+        cache = self.cache
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status, headers, body):
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/__stats":
+                    body = json.dumps(cache.status()).encode("utf-8")
+                    self._send(200, {"Content-Type": "application/json"}, body)
+                    return
+                status, headers, body, cache_state = cache.get(url.path, url.query)
+                self._send(status, {**headers, "X-Cache": cache_state}, body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"[缓存服务] 行情缓存服务已启动: {self.url}")
+        return True
+
+    def stop(self):
+        if self.server is None:
+            return False
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地行情缓存服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=9110, help="监听端口")
+    parser.add_argument("--klines-ttl", type=float, default=DEFAULT_TTLS["/klines"], help="K线缓存秒数")
+    parser.add_argument("--ticker-ttl", type=float, default=DEFAULT_TTLS["/ticker/24hr"], help="24小时行情缓存秒数")
+    args = parser.parse_args()
+
+    daemon = CacheDaemon(MarketDataCache(ttls={"/klines": args.klines_ttl, "/ticker/24hr": args.ticker_ttl}),
+                         args.host, args.port)
+    daemon.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(f"[缓存服务] {daemon.cache.status()}")
+    except KeyboardInterrupt:
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -24,8 +24,34 @@ class ConfigManager:
             "serverchan_key": "",
             "serverchan_title": "币安分析完成",
             "serverchan_content": "找到 {count} 个符合条件的交易对",
+            "serverchan_min_interval": 300,
+            "serverchan_daily_limit": 5,
+            "notify_digest_window": 5,
+            "notify_dedup_window": 21600,
             "auto_minimize": False,
-            "minimize_delay": 0.5
+            "minimize_delay": 0.5,
+            "watchlist_enabled": False,
+            "watchlist_proximity": 0.8,
+            "watchlist_interval": 60,
+            "metrics_enabled": False,
+            "metrics_port": 9108,
+            "profile_scans": False,
+            "kline_archive_enabled": True,
+            "kline_archive_dir": "kline_archive",
+            "request_cache_ttl": 5,
+            "checkpoint_every": 25,
+            "checkpoint_max_age": 900,
+            "data_sources": ["binance_um"],
+            "source_options": {},
+            "kline_concurrency": 4,
+            "kline_batch_size": 10,
+            "market_data_proxy": "",
+            "scan_profiles": [],
+            "score_weights": {},
+            "enrich_results": True,
+            "funding_cache_ttl": 30,
+            "gain_history_enabled": True,
+            "gain_history_days": 30
         }
         self.config = self.load_config()
     
@@ -76,5 +102,28 @@ class ConfigManager:
             "LIQUIDITY_THRESHOLD_USDT": self.config["LIQUIDITY_THRESHOLD_USDT"],
             "MAX_ANALYZE_SYMBOLS": self.config["MAX_ANALYZE_SYMBOLS"],
             "CACHE_EXPIRY": self.config["CACHE_EXPIRY"],
-            "REQUEST_DELAY": self.config["REQUEST_DELAY"]
+            "REQUEST_DELAY": self.config["REQUEST_DELAY"],
+            "WATCHLIST_PROXIMITY": self.config.get("watchlist_proximity", 0.8),
+            "KLINE_ARCHIVE_DIR": self.config.get("kline_archive_dir", "kline_archive")
+                                 if self.config.get("kline_archive_enabled", True) else None,
+            "REQUEST_CACHE_TTL": self.config.get("request_cache_ttl", 5),
+            "CHECKPOINT_EVERY": self.config.get("checkpoint_every", 25),
+            "CHECKPOINT_MAX_AGE": self.config.get("checkpoint_max_age", 900),
+            "DATA_SOURCES": self.config.get("data_sources") or ["binance_um"],
+            "SOURCE_OPTIONS": self.config.get("source_options") or {},
+            "KLINE_CONCURRENCY": self.config.get("kline_concurrency", 4),
+            "KLINE_BATCH_SIZE": self.config.get("kline_batch_size", 10),
+            "MARKET_DATA_PROXY": self.config.get("market_data_proxy") or None,
+            "SCAN_PROFILES": [
+                {
+                    "name": p["name"],
+                    "MIN_CHANGE_PERCENT": p.get("min_change_percent", self.config["MIN_CHANGE_PERCENT"]),
+                    "LIQUIDITY_THRESHOLD_USDT": p.get("liquidity_threshold_usdt",
+                                                      self.config["LIQUIDITY_THRESHOLD_USDT"])
+                }
+                for p in self.config.get("scan_profiles") or []
+            ],
+            "SCORE_WEIGHTS": self.config.get("score_weights") or None,
+            "ENRICH_RESULTS": self.config.get("enrich_results", True),
+            "FUNDING_CACHE_TTL": self.config.get("funding_cache_ttl", 30)
         }
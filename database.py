@@ -5,6 +5,8 @@ import sqlite3
 import json
 from datetime import datetime
 
+import fast_json
+
 class DatabaseManager:
     def __init__(self, db_file="analysis_history.db"):
         self.db_file = db_file
@@ -35,11 +37,34 @@ class DatabaseManager:
         if 'timestamp' not in columns:
             cursor.execute("ALTER TABLE analysis_history ADD COLUMN timestamp TEXT")
         
+        # 每次分析的性能统计（分阶段耗时、接口延迟等）
+        if 'metrics_json' not in columns:
+            cursor.execute("ALTER TABLE analysis_history ADD COLUMN metrics_json TEXT")
+        
+        # 扫描方案名称（多方案扫描时每个方案单独一条记录，未配置方案时为空）
+        if 'profile' not in columns:
+            cursor.execute("ALTER TABLE analysis_history ADD COLUMN profile TEXT")
+        
+        # 通知投递状态记录
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS notification_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                title TEXT,
+                created_at TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                success INTEGER NOT NULL,
+                attempts INTEGER NOT NULL,
+                latency REAL,
+                error TEXT
+            )
+        """)
+        
         conn.commit()
         conn.close()
     
-    def save_analysis(self, analysis_data, config=None):
-        """保存分析结果，支持新的时间结构"""
+    def save_analysis(self, analysis_data, config=None, profile=None):
+        """保存分析结果，支持新的时间结构；profile 为扫描方案名称"""
         try:
             conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
@@ -51,21 +76,24 @@ class DatabaseManager:
                 start_time = analysis_data.get("start_time", datetime.now().isoformat())
                 end_time = analysis_data.get("end_time", datetime.now().isoformat())
                 duration = analysis_data.get("duration", 0)
+                metrics = analysis_data.get("metrics")
             else:
                 # 旧格式：只有结果列表
                 results = analysis_data
                 now = datetime.now().isoformat()
                 start_time = end_time = now
                 duration = 0
+                metrics = None
             
             results_json = json.dumps(results, ensure_ascii=False)
             symbol_count = len(results)
             config_json = json.dumps(config, ensure_ascii=False) if config else None
+            metrics_json = json.dumps(metrics, ensure_ascii=False) if metrics else None
             
             cursor.execute("""
-                INSERT INTO analysis_history (start_time, end_time, duration, results_json, symbol_count, config_json)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (start_time, end_time, duration, results_json, symbol_count, config_json))
+                INSERT INTO analysis_history (start_time, end_time, duration, results_json, symbol_count, config_json, metrics_json, profile)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (start_time, end_time, duration, results_json, symbol_count, config_json, metrics_json, profile))
             
             conn.commit()
             record_id = cursor.lastrowid
@@ -76,7 +104,8 @@ class DatabaseManager:
             print(f"保存分析结果失败: {e}")
             return None
     
-    def get_latest_analysis(self):
+    def get_latest_analysis(self, profile=None):
+        """最近一次分析结果，指定 profile 时只查该扫描方案的记录"""
         try:
             conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
@@ -87,12 +116,21 @@ class DatabaseManager:
             
             if "start_time" in columns:
                 # 新表结构
-                cursor.execute("""
-                    SELECT id, start_time, end_time, duration, results_json, symbol_count, config_json
-                    FROM analysis_history
-                    ORDER BY id DESC
-                    LIMIT 1
-                """)
+                if profile is not None:
+                    cursor.execute("""
+                        SELECT id, start_time, end_time, duration, results_json, symbol_count, config_json, metrics_json
+                        FROM analysis_history
+                        WHERE profile = ?
+                        ORDER BY id DESC
+                        LIMIT 1
+                    """, (profile,))
+                else:
+                    cursor.execute("""
+                        SELECT id, start_time, end_time, duration, results_json, symbol_count, config_json, metrics_json
+                        FROM analysis_history
+                        ORDER BY id DESC
+                        LIMIT 1
+                    """)
                 row = cursor.fetchone()
                 conn.close()
                 
@@ -103,9 +141,10 @@ class DatabaseManager:
                         "start_time": row[1],
                         "end_time": row[2],
                         "duration": row[3],
-                        "results": json.loads(row[4]),
+                        "results": fast_json.loads(row[4]),
                         "symbol_count": row[5],
-                        "config": json.loads(row[6]) if row[6] else None
+                        "config": json.loads(row[6]) if row[6] else None,
+                        "metrics": json.loads(row[7]) if row[7] else None
                     }
             else:
                 # 旧表结构（兼容性）
@@ -125,7 +164,7 @@ class DatabaseManager:
                         "start_time": row[1],
                         "end_time": row[1],
                         "duration": 0,
-                        "results": json.loads(row[2]),
+                        "results": fast_json.loads(row[2]),
                         "symbol_count": row[3],
                         "config": json.loads(row[4]) if row[4] else None
                     }
@@ -146,7 +185,7 @@ class DatabaseManager:
             if "end_time" in columns:
                 # 新表结构
                 cursor.execute("""
-                    SELECT id, end_time, symbol_count, duration
+                    SELECT id, end_time, symbol_count, duration, profile
                     FROM analysis_history
                     ORDER BY id DESC
                     LIMIT ?
@@ -159,7 +198,8 @@ class DatabaseManager:
                         "id": r[0], 
                         "timestamp": r[1],  # 使用end_time
                         "symbol_count": r[2],
-                        "duration": r[3]
+                        "duration": r[3],
+                        "profile": r[4]
                     } 
                     for r in rows
                 ]
@@ -199,7 +239,7 @@ class DatabaseManager:
             if "start_time" in columns:
                 # 新表结构
                 cursor.execute("""
-                    SELECT id, start_time, end_time, duration, results_json, symbol_count, config_json
+                    SELECT id, start_time, end_time, duration, results_json, symbol_count, config_json, metrics_json
                     FROM analysis_history
                     WHERE id = ?
                 """, (record_id,))
@@ -213,9 +253,10 @@ class DatabaseManager:
                         "start_time": row[1],
                         "end_time": row[2],
                         "duration": row[3],
-                        "results": json.loads(row[4]),
+                        "results": fast_json.loads(row[4]),
                         "symbol_count": row[5],
-                        "config": json.loads(row[6]) if row[6] else None
+                        "config": json.loads(row[6]) if row[6] else None,
+                        "metrics": json.loads(row[7]) if row[7] else None
                     }
             else:
                 # 旧表结构（兼容性）
@@ -234,7 +275,7 @@ class DatabaseManager:
                         "start_time": row[1],
                         "end_time": row[1],
                         "duration": 0,
-                        "results": json.loads(row[2]),
+                        "results": fast_json.loads(row[2]),
                         "symbol_count": row[3],
                         "config": json.loads(row[4]) if row[4] else None
                     }
@@ -243,6 +284,35 @@ class DatabaseManager:
             print(f"获取分析记录失败: {e}")
             return None
     
+    def get_metrics_history(self, limit=20):
+        """获取最近若干次分析的性能统计，用于排查慢扫描"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, end_time, duration, symbol_count, metrics_json
+                FROM analysis_history
+                WHERE metrics_json IS NOT NULL
+                ORDER BY id DESC
+                LIMIT ?
+            """, (limit,))
+            rows = cursor.fetchall()
+            conn.close()
+            
+            return [
+                {
+                    "id": r[0],
+                    "timestamp": r[1],
+                    "duration": r[2],
+                    "symbol_count": r[3],
+                    "metrics": json.loads(r[4])
+                }
+                for r in rows
+            ]
+        except Exception as e:
+            print(f"获取性能统计失败: {e}")
+            return []
+    
     def compare_results(self, results1, results2):
         symbols1 = set([r["symbol"] for r in results1])
         symbols2 = set([r["symbol"] for r in results2])
@@ -258,6 +328,58 @@ class DatabaseManager:
             "has_changes": len(new_symbols) > 0 or len(removed_symbols) > 0
         }
     
+    def save_notification_log(self, job_id, title, created_at, channel_status):
+        """记录一条通知在各渠道的投递状态"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            
+            created = datetime.fromtimestamp(created_at).isoformat()
+            cursor.executemany("""
+                INSERT INTO notification_log (job_id, title, created_at, channel, success, attempts, latency, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (job_id, title, created, channel, 1 if s["success"] else 0, s["attempts"], s["latency"], s["error"])
+                for channel, s in channel_status.items()
+            ])
+            
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"保存通知状态失败: {e}")
+            return False
+    
+    def get_notification_log(self, limit=50):
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT job_id, title, created_at, channel, success, attempts, latency, error
+                FROM notification_log
+                ORDER BY id DESC
+                LIMIT ?
+            """, (limit,))
+            rows = cursor.fetchall()
+            conn.close()
+            
+            return [
+                {
+                    "job_id": r[0],
+                    "title": r[1],
+                    "created_at": r[2],
+                    "channel": r[3],
+                    "success": bool(r[4]),
+                    "attempts": r[5],
+                    "latency": r[6],
+                    "error": r[7]
+                }
+                for r in rows
+            ]
+        except Exception as e:
+            print(f"获取通知记录失败: {e}")
+            return []
+    
     def delete_old_records(self, keep_count=100):
         try:
             conn = sqlite3.connect(self.db_file)
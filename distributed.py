@@ -0,0 +1,708 @@
+"""
+分布式扫描模块 - 协调者 / 工作者模式
+协调者获取高流动性交易对列表，按轮询方式切分成多个分片写入 SQLite 任务队列；
+工作者领取分片并以观察名单模式（只拉K线）分析，结果写回队列；
+协调者等待全部分片完成后合并成与 analyze() 相同结构的分析结果。
+- 分片领取有租约，工作者崩溃后超时的分片会被重新放回队列
+- 失败的分片最多重试 max_attempts 次
+- 本机工作进程由协调者监视：进程退出后立即回收其分片，仍有待处理分片时补充工作进程；
+  超时后未完成的分片记为失败
+
+队列文件（SQLite WAL 模式）只放在协调者主机的本地磁盘上。其他主机上的工作者通过协调者启动的
+租约服务（HTTP，LeaseServer）领取分片和提交结果，各自使用本机的出口IP和请求限额拉取K线，
+因此扫描速度不再受单个IP的限流约束；租约、重试和超时回收逻辑与本机工作进程完全相同。
+
+用法:
+    python distributed.py run --workers 4                                  # 本机启动4个工作进程并合并结果
+    python distributed.py run --workers 0 --listen 0.0.0.0:9120 --token T  # 只由局域网内的远程工作者处理
+    python distributed.py worker --coordinator http://192.168.1.10:9120 --token T  # 在其他主机上启动常驻工作者
+    python distributed.py worker --queue scan_queue.db                     # 协调者主机上另行启动常驻工作者
+"""
+import argparse
+import hmac
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+from analysis_core import BinanceAnalyzer
+from instrumentation import format_summary, merge_metrics
+from scoring import sort_results
+
+SHARD_PENDING = "pending"
+SHARD_RUNNING = "running"
+SHARD_DONE = "done"
+SHARD_FAILED = "failed"
+
+
+class ScanQueue:
+    """基于 SQLite 的分片队列（多进程共享同一个文件）"""
+
+    def __init__(self, queue_file="scan_queue.db"):
+        self.queue_file = queue_file
+        self.init_tables()
+
+    def _connect(self):
+        return sqlite3.connect(self.queue_file, timeout=30)
+
+    def init_tables(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_run (
+                run_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                start_time TEXT NOT NULL,
+                config_json TEXT NOT NULL,
+                symbols_json TEXT NOT NULL,
+                shard_count INTEGER NOT NULL,
+                volumes_json TEXT
+            )
+        """)
+        # 兼容旧版本队列文件
+        cursor.execute("PRAGMA table_info(scan_run)")
+        if "volumes_json" not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE scan_run ADD COLUMN volumes_json TEXT")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_shard (
+                run_id TEXT NOT NULL,
+                shard_id INTEGER NOT NULL,
+                symbols_json TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                claimed_at REAL,
+                finished_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result_json TEXT,
+                error TEXT,
+                PRIMARY KEY (run_id, shard_id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_shard_status ON scan_shard(status)")
+        conn.commit()
+        conn.close()
+
+    def create_run(self, config, symbols, shard_count, quote_volumes=None):
+        """
+        创建一次扫描并切分分片（轮询分配，使各分片的流动性分布相近）
+        :param quote_volumes: 交易对的24小时成交额，工作者据此按各扫描方案的阈值做流动性过滤
+        """
+        run_id = uuid.uuid4().hex[:12]
+        shard_count = max(1, min(shard_count, len(symbols)))
+        shards = [symbols[i::shard_count] for i in range(shard_count)]
+
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO scan_run (run_id, created_at, start_time, config_json, symbols_json, shard_count, volumes_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (run_id, time.time(), datetime.now().isoformat(), json.dumps(config), json.dumps(symbols), shard_count,
+              json.dumps(quote_volumes or {})))
+        cursor.executemany("""
+            INSERT INTO scan_shard (run_id, shard_id, symbols_json, status)
+            VALUES (?, ?, ?, ?)
+        """, [(run_id, i, json.dumps(shard), SHARD_PENDING) for i, shard in enumerate(shards)])
+        conn.commit()
+        conn.close()
+        return run_id
+
+    def get_run(self, run_id):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT start_time, config_json, symbols_json, shard_count, volumes_json FROM scan_run WHERE run_id = ?
+        """, (run_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            return None
+        return {
+            "run_id": run_id,
+            "start_time": row[0],
+            "config": json.loads(row[1]),
+            "symbols": json.loads(row[2]),
+            "shard_count": row[3],
+            "quote_volumes": json.loads(row[4]) if row[4] else {}
+        }
+
+    def claim(self, worker, run_id=None):
+        """领取一个待处理分片，没有时返回 None"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            if run_id:
+                cursor.execute("""
+                    SELECT run_id, shard_id, symbols_json FROM scan_shard
+                    WHERE status = ? AND run_id = ? ORDER BY shard_id LIMIT 1
+                """, (SHARD_PENDING, run_id))
+            else:
+                cursor.execute("""
+                    SELECT run_id, shard_id, symbols_json FROM scan_shard
+                    WHERE status = ? ORDER BY rowid LIMIT 1
+                """, (SHARD_PENDING,))
+            row = cursor.fetchone()
+            if not row:
+                conn.commit()
+                return None
+            cursor.execute("""
+                UPDATE scan_shard SET status = ?, worker = ?, claimed_at = ?, attempts = attempts + 1
+                WHERE run_id = ? AND shard_id = ?
+            """, (SHARD_RUNNING, worker, time.time(), row[0], row[1]))
+            conn.commit()
+            return {"run_id": row[0], "shard_id": row[1], "symbols": json.loads(row[2])}
+        finally:
+            conn.close()
+
+    def complete(self, run_id, shard_id, analysis_data, worker):
+        """
+        写入分片结果；只有仍持有租约的工作者可以写入
+        :return: False 表示租约已失效（分片已超时放回队列或被其他工作者领取），结果被丢弃
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE scan_shard SET status = ?, finished_at = ?, result_json = ?, error = NULL
+            WHERE run_id = ? AND shard_id = ? AND worker = ? AND status = ?
+        """, (SHARD_DONE, time.time(), json.dumps(analysis_data, ensure_ascii=False), run_id, shard_id,
+              worker, SHARD_RUNNING))
+        updated = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return updated
+
+    def fail(self, run_id, shard_id, error, worker, max_attempts=3):
+        """记录分片失败，未超过重试次数时放回队列（租约已失效时忽略）"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE scan_shard
+            SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, worker = NULL, error = ?
+            WHERE run_id = ? AND shard_id = ? AND worker = ? AND status = ?
+        """, (max_attempts, SHARD_PENDING, SHARD_FAILED, str(error)[:500], run_id, shard_id, worker, SHARD_RUNNING))
+        updated = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return updated
+
+    def requeue_expired(self, run_id, lease, max_attempts=3):
+        """租约超时的分片（工作者可能已崩溃）重新放回队列"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE scan_shard
+            SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, worker = NULL, error = '租约超时'
+            WHERE run_id = ? AND status = ? AND claimed_at < ?
+        """, (max_attempts, SHARD_PENDING, SHARD_FAILED, run_id, SHARD_RUNNING, time.time() - lease))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+
+    def release_worker(self, run_id, worker, max_attempts=3):
+        """工作者已退出：把它仍持有的分片放回队列（不必等待租约超时）"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE scan_shard
+            SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, worker = NULL, error = '工作进程退出'
+            WHERE run_id = ? AND status = ? AND worker = ?
+        """, (max_attempts, SHARD_PENDING, SHARD_FAILED, run_id, SHARD_RUNNING, worker))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+
+    def abandon(self, run_id, error):
+        """把未完成的分片记为失败（如等待超时），之后迟到的结果会因租约失效被丢弃"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE scan_shard SET status = ?, worker = NULL, error = ?
+            WHERE run_id = ? AND status IN (?, ?)
+        """, (SHARD_FAILED, error, run_id, SHARD_PENDING, SHARD_RUNNING))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+
+    def progress(self, run_id):
+        """各状态的分片数量"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, COUNT(*) FROM scan_shard WHERE run_id = ? GROUP BY status", (run_id,))
+        counts = dict(cursor.fetchall())
+        conn.close()
+        return counts
+
+    def shard_results(self, run_id):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT shard_id, status, worker, attempts, result_json, error
+            FROM scan_shard WHERE run_id = ? ORDER BY shard_id
+        """, (run_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [
+            {
+                "shard_id": r[0],
+                "status": r[1],
+                "worker": r[2],
+                "attempts": r[3],
+                "result": json.loads(r[4]) if r[4] else None,
+                "error": r[5]
+            }
+            for r in rows
+        ]
+
+    def delete_run(self, run_id):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM scan_shard WHERE run_id = ?", (run_id,))
+        cursor.execute("DELETE FROM scan_run WHERE run_id = ?", (run_id,))
+        conn.commit()
+        conn.close()
+
+
+class LeaseServer:
+    """
+    租约服务：把协调者本机的 ScanQueue 通过 HTTP 提供给其他主机上的工作者
+    POST /claim {"worker", "run_id"}、POST /complete {"run_id", "shard_id", "data", "worker"}、
+    POST /fail {"run_id", "shard_id", "error", "worker", "max_attempts"}、GET /run?run_id=
+    设置 token 时请求头 X-Scan-Token 必须一致
+    """
+
+    def __init__(self, queue, host="127.0.0.1", port=9120, token=None):
+        self.queue = queue
+        self.host = host
+        self.port = port
+        self.token = token
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.server.server_address[1]}" if self.server else None
+
+    def handle(self, method, path, query, payload):
+        """处理一个请求，返回 (状态码, 响应对象)"""
+        queue = self.queue
+        if method == "GET" and path == "/run":
+            run = queue.get_run(dict(parse_qsl(query)).get("run_id"))
+            return (200, run) if run else (404, {"error": "扫描不存在"})
+        if method != "POST":
+            return 404, {"error": "未知接口"}
+        if path == "/claim":
+            return 200, {"shard": queue.claim(payload["worker"], payload.get("run_id"))}
+        if path == "/complete":
+            return 200, {"ok": queue.complete(payload["run_id"], payload["shard_id"], payload["data"],
+                                              payload["worker"])}
+        if path == "/fail":
+            return 200, {"ok": queue.fail(payload["run_id"], payload["shard_id"], payload["error"],
+                                          payload["worker"], payload.get("max_attempts", 3))}
+        return 404, {"error": "未知接口"}
+
+    def start(self):
+        if self.server is not None:
+            return False
+
+        lease_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, method):
+                url = urlsplit(self.path)
+                if lease_server.token and not hmac.compare_digest(self.headers.get("X-Scan-Token", ""),
+                                                                  lease_server.token):
+                    status, data = 403, {"error": "令牌错误"}
+                else:
+                    try:
+                        length = int(self.headers.get("Content-Length") or 0)
+                        payload = json.loads(self.rfile.read(length)) if length else {}
+                        status, data = lease_server.handle(method, url.path, url.query, payload)
+                    except (ValueError, KeyError, TypeError) as e:
+                        status, data = 400, {"error": str(e)}
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._reply("GET")
+
+            def do_POST(self):
+                self._reply("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        if self.server is None:
+            return False
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        return True
+
+
+class RemoteScanQueue:
+    """通过协调者的租约服务访问分片队列（接口与 ScanQueue 中工作者使用的部分相同）"""
+
+    def __init__(self, url, token=None, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        if token:
+            self.session.headers["X-Scan-Token"] = token
+
+    def _call(self, method, path, **kwargs):
+        resp = self.session.request(method, f"{self.url}{path}", timeout=self.timeout, **kwargs)
+        if resp.status_code == 404 and path == "/run":
+            return None
+        resp.raise_for_status()
+        return resp.json()
+
+    def get_run(self, run_id):
+        return self._call("GET", "/run", params={"run_id": run_id})
+
+    def claim(self, worker, run_id=None):
+        return self._call("POST", "/claim", json={"worker": worker, "run_id": run_id})["shard"]
+
+    def complete(self, run_id, shard_id, analysis_data, worker):
+        return self._call("POST", "/complete", json={"run_id": run_id, "shard_id": shard_id,
+                                                      "data": analysis_data, "worker": worker})["ok"]
+
+    def fail(self, run_id, shard_id, error, worker, max_attempts=3):
+        return self._call("POST", "/fail", json={"run_id": run_id, "shard_id": shard_id, "error": str(error)[:500],
+                                                  "worker": worker, "max_attempts": max_attempts})["ok"]
+
+
+def open_queue(queue, token=None):
+    """队列文件路径 → ScanQueue；http(s):// 地址 → 通过租约服务访问的 RemoteScanQueue"""
+    if queue.startswith(("http://", "https://")):
+        return RemoteScanQueue(queue, token)
+    return ScanQueue(queue)
+
+
+class ScanWorker:
+    def __init__(self, queue_file="scan_queue.db", worker_id=None, config_overrides=None,
+                 max_attempts=3, callback=None, token=None):
+        """
+        :param queue_file: 本机队列文件，或协调者租约服务地址（如 http://192.168.1.10:9120）
+        :param config_overrides: 覆盖协调者下发的分析配置（如本机的 SOURCE_OPTIONS / 限速）
+        :param token: 租约服务的访问令牌
+        """
+        self.queue = open_queue(queue_file, token)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.config_overrides = config_overrides or {}
+        self.max_attempts = max_attempts
+        self.callback = callback
+        self.runs = {}  # {run_id: (分析配置, 24小时成交额)}
+
+    def _log(self, message):
+        if self.callback:
+            self.callback(message)
+        else:
+            print(message)
+
+    def _run_info(self, run_id):
+        info = self.runs.get(run_id)
+        if info is None:
+            run = self.queue.get_run(run_id)
+            config = dict(run["config"]) if run else {}
+            config.update(self.config_overrides)
+            info = self.runs[run_id] = (config, run["quote_volumes"] if run else {})
+        return info
+
+    def run_once(self, run_id=None):
+        """领取并处理一个分片，没有待处理分片时返回 False"""
+        shard = self.queue.claim(self.worker_id, run_id)
+        if not shard:
+            return False
+
+        self._log(f"[{self.worker_id}] 处理分片 {shard['run_id']}/{shard['shard_id']}（{len(shard['symbols'])} 个币种）")
+        try:
+            config, quote_volumes = self._run_info(shard["run_id"])
+            analyzer = BinanceAnalyzer(config=config, callback=lambda m, p=None: None)
+            analysis_data = analyzer.analyze(symbols=shard["symbols"], quote_volumes=quote_volumes)
+            if analysis_data.get("error"):
+                raise RuntimeError(analysis_data["error"])
+            if not self.queue.complete(shard["run_id"], shard["shard_id"], analysis_data, self.worker_id):
+                self._log(f"[{self.worker_id}] 分片 {shard['shard_id']} 租约已失效，丢弃结果")
+        except Exception as e:
+            self._log(f"[{self.worker_id}] 分片 {shard['shard_id']} 失败: {e}")
+            self.queue.fail(shard["run_id"], shard["shard_id"], e, self.worker_id, self.max_attempts)
+        return True
+
+    def run(self, run_id=None, idle_exit=True, poll_interval=1.0, stop_event=None):
+        """
+        循环处理分片
+        :param idle_exit: 队列为空时退出（本机工作进程）；为 False 时持续等待新任务（常驻工作者）
+        连不上协调者的租约服务时等待后重试（常驻工作者）或退出
+        """
+        while stop_event is None or not stop_event.is_set():
+            try:
+                if self.run_once(run_id):
+                    continue
+            except requests.exceptions.RequestException as e:
+                self._log(f"[{self.worker_id}] 无法连接协调者: {e}")
+            if idle_exit:
+                break
+            time.sleep(poll_interval)
+
+
+def run_worker(queue_file, run_id=None, worker_id=None, config_overrides=None):
+    """工作进程入口（需可被 multiprocessing 导入）"""
+    ScanWorker(queue_file, worker_id, config_overrides).run(run_id)
+
+
+class ScanCoordinator:
+    def __init__(self, queue_file="scan_queue.db", config=None, callback=None):
+        self.queue = ScanQueue(queue_file)
+        self.callback = callback
+        self.analyzer = BinanceAnalyzer(config=config, callback=callback)
+        self.config = self.analyzer.config
+
+    def _log(self, message):
+        if self.callback:
+            self.callback(message)
+        else:
+            print(message)
+
+    def submit(self, symbols=None, shard_count=4):
+        """获取交易对列表（未指定时取全部高流动性合约）并切分入队，返回 run_id"""
+        if symbols is None:
+            symbols = self.analyzer.discover_symbols()
+            max_symbols = self.config["MAX_ANALYZE_SYMBOLS"]
+            symbols = symbols[:max_symbols]
+        if not symbols:
+            return None
+        volumes = self.analyzer.quote_volumes
+        run_id = self.queue.create_run(self.config, list(symbols), shard_count,
+                                       {s: volumes[s] for s in symbols if s in volumes})
+        self._log(f"[协调者] 扫描 {run_id}: {len(symbols)} 个币种，分为 {min(shard_count, len(symbols))} 个分片")
+        return run_id
+
+    def wait(self, run_id, timeout=None, poll_interval=0.5, lease=300, max_attempts=3, on_poll=None):
+        """
+        等待全部分片结束（完成或最终失败），超时返回 False
+        :param on_poll: 每次检查进度前调用（本机模式用于监视工作进程）
+        """
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            if on_poll:
+                on_poll()
+            self.queue.requeue_expired(run_id, lease, max_attempts)
+            counts = self.queue.progress(run_id)
+            if not counts.get(SHARD_PENDING) and not counts.get(SHARD_RUNNING):
+                return True
+            if deadline and time.time() > deadline:
+                return False
+            time.sleep(poll_interval)
+
+    def merge(self, run_id):
+        """把各分片结果合并成 analyze() 结构的分析结果（命中结果按评分排列，观察名单候选按原交易对顺序排列）"""
+        run = self.queue.get_run(run_id)
+        shards = self.queue.shard_results(run_id)
+        order = {symbol: i for i, symbol in enumerate(run["symbols"])}
+
+        results = []
+        near_symbols = []
+        evaluated = []
+        quote_volumes = {}
+        profiles = {}
+        metrics_list = []
+        failed = []
+        for shard in shards:
+            data = shard["result"]
+            if shard["status"] != SHARD_DONE or not data:
+                failed.append(shard["shard_id"])
+                continue
+            results.extend(data.get("results", []))
+            near_symbols.extend(data.get("near_symbols", []))
+            evaluated.extend(data.get("evaluated", []))
+            quote_volumes.update(data.get("quote_volumes") or {})
+            metrics_list.append(data.get("metrics"))
+            for name, profile in (data.get("profiles") or {}).items():
+                merged = profiles.setdefault(name, dict(profile, results=[], near_symbols=[]))
+                merged["results"].extend(profile["results"])
+                merged["near_symbols"].extend(profile["near_symbols"])
+
+        sort_results(results)
+        near_symbols.sort(key=lambda s: order.get(s, len(order)))
+        volumes = self.analyzer.quote_volumes
+        for profile in profiles.values():
+            # 工作者已按下发的成交额过滤；这里再按协调者的数据校验一次（兼容旧版本工作者）
+            if volumes:
+                threshold = profile["liquidity_threshold_usdt"]
+                profile["results"] = [r for r in profile["results"] if volumes.get(r["symbol"], threshold) >= threshold]
+                profile["near_symbols"] = [s for s in profile["near_symbols"] if volumes.get(s, threshold) >= threshold]
+            sort_results(profile["results"])
+            profile["near_symbols"].sort(key=lambda s: order.get(s, len(order)))
+        if profiles:
+            # 顶层结果为主方案（第一个方案）的结果
+            primary = next(iter(profiles.values()))
+            results, near_symbols = primary["results"], primary["near_symbols"]
+        metrics = merge_metrics(metrics_list)
+        metrics["gauges"]["symbols_scanned"] = len(run["symbols"])
+        metrics["gauges"]["hits"] = len(results)
+        metrics["counters"]["shards"] = len(shards)
+
+        end_time = datetime.now()
+        analysis_data = {
+            "results": results,
+            "near_symbols": near_symbols,
+            "evaluated": evaluated,
+            "quote_volumes": quote_volumes,
+            "start_time": run["start_time"],
+            "end_time": end_time.isoformat(),
+            "duration": (end_time - datetime.fromisoformat(run["start_time"])).total_seconds(),
+            "metrics": metrics,
+            "shards": [{k: s[k] for k in ("shard_id", "status", "worker", "attempts", "error")} for s in shards]
+        }
+        if profiles:
+            analysis_data["profiles"] = profiles
+        if failed:
+            analysis_data["error"] = f"{len(failed)} 个分片失败: {failed}"
+        return analysis_data
+
+    def run(self, symbols=None, workers=4, shard_count=None, timeout=None, worker_overrides=None, max_attempts=3,
+            listen=None, token=None):
+        """
+        启动 workers 个本机工作进程（可为0）处理本次扫描并返回合并结果
+        :param shard_count: 分片数，默认为工作进程数的4倍（便于负载均衡和失败重试）
+        :param timeout: 等待秒数，超时后未完成的分片记为失败，合并结果带 "error"
+        :param listen: (地址, 端口)，设置时在等待期间启动租约服务，其他主机上的工作者可以领取分片
+        :param token: 租约服务的访问令牌
+        """
+        run_id = self.submit(symbols, shard_count or max(workers, 1) * 4)
+        if not run_id:
+            return {"results": [], "near_symbols": [], "start_time": datetime.now().isoformat(),
+                    "end_time": datetime.now().isoformat(), "duration": 0, "metrics": {}}
+
+        processes = {}  # {工作者标识: 进程}
+        spawned = []
+        # 工作进程反复在领取分片前退出（如启动即出错）时不再无限补充
+        spawn_limit = workers * (max_attempts + 1)
+
+        def spawn():
+            worker_id = f"local-{len(spawned)}"
+            process = multiprocessing.Process(
+                target=run_worker, args=(self.queue.queue_file, run_id, worker_id, worker_overrides), daemon=True
+            )
+            process.start()
+            processes[worker_id] = process
+            spawned.append(worker_id)
+
+        def supervise():
+            # 回收已退出工作进程的分片（空闲退出的进程不持有分片），仍有待处理分片时补足工作进程
+            for worker_id, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                del processes[worker_id]
+                if self.queue.release_worker(run_id, worker_id, max_attempts):
+                    self._log(f"[协调者] 工作进程 {worker_id} 已退出（exitcode={process.exitcode}），分片放回队列")
+            pending = self.queue.progress(run_id).get(SHARD_PENDING, 0)
+            for _ in range(min(pending, workers - len(processes))):
+                if len(spawned) >= spawn_limit:
+                    break
+                spawn()
+            if pending and not processes and server is None:
+                self.queue.abandon(run_id, "工作进程反复退出")
+
+        server = None
+        if listen:
+            server = LeaseServer(self.queue, listen[0], listen[1], token)
+            server.start()
+            self._log(f"[协调者] 租约服务已启动: {server.url}")
+        for _ in range(workers):
+            spawn()
+        finished = False
+        try:
+            finished = self.wait(run_id, timeout, max_attempts=max_attempts, on_poll=supervise)
+        finally:
+            if not finished:
+                # 超时（或等待被中断）：停止工作进程，未完成的分片记为失败
+                for process in processes.values():
+                    process.terminate()
+                abandoned = self.queue.abandon(run_id, "等待超时")
+                self._log(f"[协调者] 扫描 {run_id} 等待超时，{abandoned} 个分片未完成")
+            for process in processes.values():
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            if server is not None:
+                server.stop()
+
+        analysis_data = self.merge(run_id)
+        self.queue.delete_run(run_id)
+        self._log(f"[协调者] 扫描完成，命中 {len(analysis_data['results'])} 个，耗时 {analysis_data['duration']:.1f} 秒")
+        self._log(f"[协调者] 耗时分布：{format_summary(analysis_data['metrics'])}")
+        return analysis_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分布式扫描（协调者/工作者）")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    run_parser = sub.add_parser("run", help="扫描并合并结果（本机工作进程和/或远程工作者）")
+    run_parser.add_argument("--queue", default="scan_queue.db", help="任务队列文件")
+    run_parser.add_argument("--workers", type=int, default=4, help="本机工作进程数")
+    run_parser.add_argument("--shards", type=int, default=None, help="分片数")
+    run_parser.add_argument("--listen", default=None, help="启动租约服务供远程工作者使用，如 0.0.0.0:9120")
+    run_parser.add_argument("--token", default=None, help="租约服务的访问令牌")
+    run_parser.add_argument("--timeout", type=float, default=None, help="等待秒数")
+    run_parser.add_argument("--save", action="store_true", help="把合并结果保存到历史记录")
+
+    worker_parser = sub.add_parser("worker", help="常驻工作者")
+    worker_parser.add_argument("--queue", default="scan_queue.db", help="本机任务队列文件")
+    worker_parser.add_argument("--coordinator", default=None, help="协调者租约服务地址，如 http://192.168.1.10:9120")
+    worker_parser.add_argument("--token", default=None, help="租约服务的访问令牌")
+    worker_parser.add_argument("--id", default=None, help="工作者标识")
+
+    args = parser.parse_args()
+    if args.mode == "worker":
+        ScanWorker(args.coordinator or args.queue, args.id, token=args.token).run(idle_exit=False)
+        return
+
+    listen = None
+    if args.listen:
+        host, _, port = args.listen.rpartition(":")
+        listen = (host or "0.0.0.0", int(port))
+    from config_manager import ConfigManager
+    config = ConfigManager().get_analyzer_config()
+    analysis_data = ScanCoordinator(args.queue, config).run(workers=args.workers, shard_count=args.shards,
+                                                           timeout=args.timeout, listen=listen, token=args.token)
+    for result in analysis_data["results"]:
+        print(f"{result['symbol']}: 1d {result['gain_1d'] * 100:.1f}% | 2d {result['gain_2d'] * 100:.1f}% | "
+              f"3d {result['gain_3d'] * 100:.1f}%")
+    if args.save:
+        from database import DatabaseManager
+        from gain_history import GainHistoryStore
+        db_manager = DatabaseManager()
+        db_manager.save_analysis(analysis_data, config)
+        GainHistoryStore(db_manager.db_file).record(analysis_data)
+
+
+if __name__ == "__main__":
+    main()
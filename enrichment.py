@@ -0,0 +1,120 @@
+"""
+命中结果扩展指标模块
+只对已满足筛选条件的币种补充做空决策需要的指标，额外请求量与命中数成正比，与扫描范围无关：
+- funding_rate / mark_price: 资金费率和标记价格（读取共享的 premiumIndex 快照缓存）
+- funding_rate_change: 快照缓存保留期内资金费率的变化
+- open_interest_change: 持仓量相对前一日的变化率
+- volume_multiple: 今日成交额 / 前7日平均成交额
+- atr / atr_percent: 14日平均真实波幅及其占收盘价的比例
+数据源不提供的指标（supports_funding / supports_open_interest 为 False）不发请求，字段为 None；
+批量资金费率、每个币种的持仓量和较长K线并发获取（max_workers 为1时依次获取）；任一指标获取失败时该字段为 None
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from funding_cache import get_funding_cache
+
+ATR_PERIOD = 14
+VOLUME_AVG_DAYS = 7
+
+
+def compute_atr(klines, period=ATR_PERIOD):
+    """
+    平均真实波幅（简单平均），K线不足 period + 1 根时使用现有数据
+    :return: (atr, atr / 最新收盘价)，数据不足时为 (None, None)
+    """
+    if len(klines) < 2:
+        return None, None
+    recent = klines[-(period + 1):]
+    true_ranges = [
+        max(k["high"] - k["low"], abs(k["high"] - prev["close"]), abs(k["low"] - prev["close"]))
+        for prev, k in zip(recent, recent[1:])
+    ]
+    atr = sum(true_ranges) / len(true_ranges)
+    close = klines[-1]["close"]
+    return atr, atr / close if close else None
+
+
+def compute_volume_multiple(klines, days=VOLUME_AVG_DAYS):
+    """今日成交额相对前 days 日平均成交额的倍数"""
+    previous = klines[-(days + 1):-1]
+    if not previous:
+        return None
+    average = sum(k["quote_volume"] for k in previous) / len(previous)
+    return klines[-1]["quote_volume"] / average if average else None
+
+
+class ResultEnricher:
+    def __init__(self, analyzer, kline_days=ATR_PERIOD + 1, max_workers=4):
+        """
+        :param analyzer: BinanceAnalyzer，复用其数据源、请求合并和请求统计
+        :param kline_days: 计算ATR和量比所需的日K线数量
+        """
+        self.analyzer = analyzer
+        self.kline_days = max(kline_days, VOLUME_AVG_DAYS + 1)
+        self.max_workers = max_workers
+
+    def _premium_index(self, source):
+        """一个数据源全部交易对的资金费率，数据源不支持或请求失败时返回空字典"""
+        if not source.supports_funding:
+            return {}
+        try:
+            return self.analyzer.get_funding_snapshot(source)
+        except Exception as e:
+            self.analyzer._log(f"获取资金费率失败 ({source.name}): {e}")
+            return {}
+
+    def _open_interest_change(self, symbol):
+        source, raw_symbol = self.analyzer._resolve(symbol)
+        if not source.supports_open_interest:
+            return None
+        try:
+            return self.analyzer._shared((source.name, "openInterestChange", raw_symbol),
+                                         lambda: source.get_open_interest_change(raw_symbol, "1d"))
+        except Exception:
+            return None
+
+    def enrich(self, results):
+        """为命中结果补充扩展指标（原地修改并返回 results）"""
+        if not results:
+            return results
+
+        symbols = list(dict.fromkeys(r["symbol"] for r in results))
+        sources = {}
+        for symbol in symbols:
+            source = self.analyzer._resolve(symbol)[0]
+            sources[source.name] = source
+
+        if self.max_workers <= 1:
+            premium = {name: self._premium_index(source) for name, source in sources.items()}
+            open_interest = {symbol: self._open_interest_change(symbol) for symbol in symbols}
+            klines = {symbol: self.analyzer.get_klines_data(symbol, self.kline_days) for symbol in symbols}
+        else:
+            # 剖析期间工作线程中的调用各自剖析
+            profiled = self.analyzer._profiled
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                premium_futures = {name: pool.submit(profiled(self._premium_index), source)
+                                   for name, source in sources.items()}
+                oi_futures = {symbol: pool.submit(profiled(self._open_interest_change), symbol) for symbol in symbols}
+                kline_futures = {symbol: pool.submit(profiled(self.analyzer.get_klines_data), symbol, self.kline_days)
+                                 for symbol in symbols}
+                premium = {name: future.result() for name, future in premium_futures.items()}
+                open_interest = {symbol: future.result() for symbol, future in oi_futures.items()}
+                klines = {symbol: future.result() for symbol, future in kline_futures.items()}
+
+        funding_cache = get_funding_cache()
+        for result in results:
+            symbol = result["symbol"]
+            source, raw_symbol = self.analyzer._resolve(symbol)
+            index = premium.get(source.name, {}).get(raw_symbol) or {}
+            trend = funding_cache.funding_trend(raw_symbol, source.name)
+            atr, atr_percent = compute_atr(klines[symbol]) if klines[symbol] else (None, None)
+            result.update({
+                "funding_rate": index.get("funding_rate"),
+                "mark_price": index.get("mark_price"),
+                "funding_rate_change": trend["change"] if trend else None,
+                "open_interest_change": open_interest[symbol],
+                "volume_multiple": compute_volume_multiple(klines[symbol]) if klines[symbol] else None,
+                "atr": atr,
+                "atr_percent": atr_percent
+            })
+        return results
@@ -0,0 +1,142 @@
+"""
+快速JSON解码模块
+优先使用 msgspec / orjson（如已安装），否则回退到标准库 json；
+对 exchangeInfo（合约、现货）大响应只解码需要的字段，
+ticker/24hr 等对象数组响应流式增量解析，不在内存中保留完整响应
+"""
+import codecs
+import json
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+if MSGSPEC_AVAILABLE:
+    # 只声明需要的字段，其余字段在解码时直接跳过，不会创建Python对象
+    class _SymbolInfo(msgspec.Struct):
+        symbol: str = ""
+        status: str = ""
+        contractType: str = ""
+
+    class _ExchangeInfo(msgspec.Struct):
+        symbols: list[_SymbolInfo] = []
+
+    class _SpotSymbolInfo(msgspec.Struct):
+        symbol: str = ""
+        status: str = ""
+        quoteAsset: str = ""
+
+    class _SpotExchangeInfo(msgspec.Struct):
+        symbols: list[_SpotSymbolInfo] = []
+
+    _json_decoder = msgspec.json.Decoder()
+    _exchange_info_decoder = msgspec.json.Decoder(_ExchangeInfo)
+    _spot_exchange_info_decoder = msgspec.json.Decoder(_SpotExchangeInfo)
+
+
+def backend_name():
+    if MSGSPEC_AVAILABLE:
+        return "msgspec"
+    if ORJSON_AVAILABLE:
+        return "orjson"
+    return "json"
+
+
+def loads(data):
+    """通用解码，接受 bytes 或 str"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    if MSGSPEC_AVAILABLE:
+        return _json_decoder.decode(data.encode("utf-8") if isinstance(data, str) else data)
+    return json.loads(data)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def decode_exchange_symbols(data):
+    """
+    解码 /fapi/v1/exchangeInfo 响应，只保留交易对、状态和合约类型
+    :return: [(symbol, status, contract_type), ...]
+    """
+    if MSGSPEC_AVAILABLE:
+        return [(s.symbol, s.status, s.contractType) for s in _exchange_info_decoder.decode(data).symbols]
+    return [
+        (s.get("symbol"), s.get("status"), s.get("contractType"))
+        for s in loads(data).get("symbols", [])
+    ]
+
+
+def decode_spot_symbols(data):
+    """
+    解码 /api/v3/exchangeInfo 响应（现货，包含大量过滤器字段），只保留交易对、状态和计价资产
+    :return: [(symbol, status, quote_asset), ...]
+    """
+    if MSGSPEC_AVAILABLE:
+        return [(s.symbol, s.status, s.quoteAsset) for s in _spot_exchange_info_decoder.decode(data).symbols]
+    return [
+        (s.get("symbol"), s.get("status"), s.get("quoteAsset"))
+        for s in loads(data).get("symbols", [])
+    ]
+
+
+def iter_array_items(chunks):
+    """
+    增量解析一个顶层为对象数组的JSON流，逐个产出数组元素
+    :param chunks: bytes 块的迭代器（如 resp.iter_content()）
+    内存中只保留当前块和未解析完的一个元素
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    started = False
+
+    for chunk in chunks:
+        buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            # 跳过空白、逗号
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("响应不是JSON数组")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # 元素尚未接收完整，等待下一块
+                break
+            yield item
+            pos = end
+
+    raise ValueError("JSON数组不完整")
+
+
+def iter_ticker_volumes(chunks):
+    """流式解码 ticker/24hr，逐个产出 (symbol, quote_volume)"""
+    for t in iter_array_items(chunks):
+        symbol = t.get("symbol")
+        quote_volume = _to_float(t.get("quoteVolume"))
+        if symbol and quote_volume is not None:
+            yield symbol, quote_volume
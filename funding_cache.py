@@ -0,0 +1,113 @@
+"""
+资金费率 / 标记价格快照缓存模块
+premiumIndex 一次请求即可返回全部交易对的标记价格和资金费率，
+分析器、扩展指标和界面都从这里读取，任何代码路径都不按交易对单独请求资金费率：
+- 每个数据源保存一份快照，短时间（ttl）内直接复用；过期后第一个调用者刷新，
+  同一数据源的并发调用等待这次刷新（single-flight）
+- 内存中按交易对保留最近若干次采样 (时间, 资金费率, 标记价格)，用于资金费率趋势分析
+"""
+import time
+from collections import deque
+from threading import Lock
+
+
+class FundingCache:
+    def __init__(self, history_size=96, history_interval=300):
+        """
+        :param history_size: 每个交易对保留的采样数
+        :param history_interval: 两次采样的最小间隔（秒），默认5分钟一次，96次约覆盖8小时
+        """
+        self.history_size = history_size
+        self.history_interval = history_interval
+        self.lock = Lock()
+        self.source_locks = {}  # {数据源: Lock}，同一数据源同时只刷新一次
+        self.snapshots = {}  # {数据源: (获取时间, {symbol: 快照})}
+        self.history = {}  # {(数据源, symbol): deque[(时间, 资金费率, 标记价格)]}
+        self.last_sample = {}  # {数据源: 最近一次采样时间}
+        self.stats = {"fetches": 0, "hits": 0}
+
+    def _source_lock(self, name):
+        with self.lock:
+            lock = self.source_locks.get(name)
+            if lock is None:
+                lock = self.source_locks[name] = Lock()
+            return lock
+
+    def get(self, source, ttl=30):
+        """
+        数据源全部交易对的快照 {symbol: {"mark_price", "index_price", "funding_rate", "next_funding_time"}}
+        :param ttl: 快照有效秒数，0 表示强制刷新
+        """
+        with self._source_lock(source.name):
+            cached = self.snapshots.get(source.name)
+            now = time.time()
+            if cached is not None and ttl > 0 and now - cached[0] < ttl:
+                self.stats["hits"] += 1
+                return cached[1]
+
+            snapshot = source.get_premium_index()
+            self.stats["fetches"] += 1
+            self.snapshots[source.name] = (now, snapshot)
+            self._record_history(source.name, now, snapshot)
+            return snapshot
+
+    def peek(self, source_name="binance_um"):
+        """不发起请求，返回最近一次快照（可能已过期），没有时返回空字典（供界面显示）"""
+        with self.lock:
+            cached = self.snapshots.get(source_name)
+        return cached[1] if cached else {}
+
+    def _record_history(self, name, timestamp, snapshot):
+        if timestamp - self.last_sample.get(name, 0) < self.history_interval:
+            return
+        with self.lock:
+            self.last_sample[name] = timestamp
+            for symbol, item in snapshot.items():
+                samples = self.history.get((name, symbol))
+                if samples is None:
+                    samples = self.history[(name, symbol)] = deque(maxlen=self.history_size)
+                samples.append((timestamp, item.get("funding_rate"), item.get("mark_price")))
+
+    def get_history(self, symbol, source_name="binance_um"):
+        """交易对的资金费率采样（按时间升序）"""
+        with self.lock:
+            samples = list(self.history.get((source_name, symbol), ()))
+        return [{"time": t, "funding_rate": rate, "mark_price": mark} for t, rate, mark in samples]
+
+    def funding_trend(self, symbol, source_name="binance_um"):
+        """
+        资金费率趋势：保留期内最早与最新采样的变化和平均值
+        :return: {"samples", "first", "last", "change", "average", "span"}，有效采样少于2次时返回 None
+        """
+        with self.lock:
+            samples = [(t, rate) for t, rate, _ in self.history.get((source_name, symbol), ()) if rate is not None]
+        if len(samples) < 2:
+            return None
+        rates = [rate for _, rate in samples]
+        return {
+            "samples": len(samples),
+            "first": rates[0],
+            "last": rates[-1],
+            "change": rates[-1] - rates[0],
+            "average": sum(rates) / len(rates),
+            "span": samples[-1][0] - samples[0][0]
+        }
+
+    def invalidate(self, source_name=None):
+        """丢弃快照（保留采样历史），source_name 为 None 时丢弃全部"""
+        with self.lock:
+            if source_name is None:
+                self.snapshots.clear()
+            else:
+                self.snapshots.pop(source_name, None)
+
+
+cache_instance = None
+_instance_lock = Lock()
+
+def get_funding_cache():
+    global cache_instance
+    with _instance_lock:
+        if cache_instance is None:
+            cache_instance = FundingCache()
+        return cache_instance
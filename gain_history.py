@@ -0,0 +1,97 @@
+"""
+币种涨幅历史模块 - 趋势图数据
+每次扫描把所有算出涨幅的币种（不只是命中的）的 1日/2日/3日涨幅追加写入紧凑的时间序列表，
+表以 (symbol, run_time) 为主键、不带 rowid，同一币种的记录在磁盘上连续存放，
+查询某个币种最近 N 天的涨幅轨迹只需一次索引范围扫描，无需重新拉取K线
+"""
+import sqlite3
+import time
+from datetime import datetime
+
+
+class GainHistoryStore:
+    def __init__(self, db_file="analysis_history.db"):
+        self.db_file = db_file
+        self.init_table()
+
+    def init_table(self):
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gain_history (
+                symbol TEXT NOT NULL,
+                run_time REAL NOT NULL,
+                gain_1d REAL NOT NULL,
+                gain_2d REAL NOT NULL,
+                gain_3d REAL NOT NULL,
+                PRIMARY KEY (symbol, run_time)
+            ) WITHOUT ROWID
+        """)
+        conn.commit()
+        conn.close()
+
+    def record(self, analysis_data):
+        """
+        追加一次扫描的涨幅（analysis_data["evaluated"]: [[symbol, gain_1d, gain_2d, gain_3d], ...]）
+        :return: 写入的记录数
+        """
+        evaluated = analysis_data.get("evaluated") or []
+        if not evaluated:
+            return 0
+
+        end_time = analysis_data.get("end_time")
+        run_time = datetime.fromisoformat(end_time).timestamp() if end_time else time.time()
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO gain_history (symbol, run_time, gain_1d, gain_2d, gain_3d)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (symbol, run_time, round(gain_1d, 6), round(gain_2d, 6), round(gain_3d, 6))
+                for symbol, gain_1d, gain_2d, gain_3d in evaluated
+            ])
+            conn.commit()
+            conn.close()
+            return len(evaluated)
+        except Exception as e:
+            print(f"保存涨幅历史失败: {e}")
+            return 0
+
+    def get_gain_trajectory(self, symbol, days=7):
+        """
+        币种最近 days 天每次扫描的涨幅（按时间升序）
+        :return: [{"time", "gain_1d", "gain_2d", "gain_3d"}, ...]
+        """
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT run_time, gain_1d, gain_2d, gain_3d
+                FROM gain_history
+                WHERE symbol = ? AND run_time >= ?
+                ORDER BY run_time
+            """, (symbol, time.time() - days * 86400))
+            rows = cursor.fetchall()
+            conn.close()
+            return [
+                {"time": r[0], "gain_1d": r[1], "gain_2d": r[2], "gain_3d": r[3]}
+                for r in rows
+            ]
+        except Exception as e:
+            print(f"获取涨幅历史失败: {e}")
+            return []
+
+    def delete_older_than(self, days=30):
+        """删除 days 天之前的记录，返回删除的记录数"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM gain_history WHERE run_time < ?", (time.time() - days * 86400,))
+            count = cursor.rowcount
+            conn.commit()
+            conn.close()
+            return count
+        except Exception as e:
+            print(f"清理涨幅历史失败: {e}")
+            return 0
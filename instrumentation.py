@@ -0,0 +1,154 @@
+"""
+扫描性能统计模块
+记录每次分析的分阶段耗时、各接口请求延迟分布、重试/错误计数和传输字节数，
+以结构化字典随分析结果一起保存，便于事后排查慢扫描
+"""
+import time
+from contextlib import contextmanager
+from threading import RLock
+
+# 请求延迟直方图分桶上限（秒），最后一个桶为 +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class ScanMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.phases = {}      # {阶段名: 累计秒数}
+        self.endpoints = {}   # {接口路径: 统计}
+        self.counters = {}    # {计数器名: 数值}
+        self.gauges = {}      # {指标名: 最近值/最大值}
+        self.lock = RLock()   # K线并发获取时多个线程同时记录
+
+    @contextmanager
+    def span(self, name):
+        """计时一个阶段，同名阶段多次进入时累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge_max(self, name, value):
+        if value is None:
+            return
+        with self.lock:
+            self.gauges[name] = max(self.gauges.get(name, value), value)
+
+    def record_request(self, endpoint, latency, nbytes=0, status=None, error=False):
+        """记录一次HTTP请求"""
+        with self.lock:
+            self._record_request(endpoint, latency, nbytes, status, error)
+
+    def _record_request(self, endpoint, latency, nbytes, status, error):
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = {
+                "count": 0, "errors": 0, "bytes": 0,
+                "latency_sum": 0.0, "latency_max": 0.0,
+                "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                "status": {}
+            }
+            self.endpoints[endpoint] = stats
+
+        stats["count"] += 1
+        stats["bytes"] += nbytes
+        stats["latency_sum"] += latency
+        stats["latency_max"] = max(stats["latency_max"], latency)
+        if error:
+            stats["errors"] += 1
+        if status is not None:
+            key = str(status)
+            stats["status"][key] = stats["status"].get(key, 0) + 1
+            if status == 429:
+                self.count("http_429")
+
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                stats["buckets"][i] += 1
+                break
+        else:
+            stats["buckets"][-1] += 1
+
+        self.count("requests")
+        self.count("bytes", nbytes)
+        self.add_phase("http_wait", latency)
+
+    def to_dict(self):
+        with self.lock:
+            return self._to_dict()
+
+    def _to_dict(self):
+        endpoints = {}
+        for endpoint, stats in self.endpoints.items():
+            item = dict(stats)
+            item["latency_avg"] = stats["latency_sum"] / stats["count"] if stats["count"] else 0.0
+            item["buckets"] = dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], stats["buckets"]))
+            endpoints[endpoint] = item
+
+        return {
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "endpoints": endpoints,
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "wall_time": round(time.time() - self.started_at, 4)
+        }
+
+
+def merge_metrics(metrics_list):
+    """
+    合并多份统计字典（如分布式扫描各分片的统计）：
+    阶段耗时、计数器和接口统计累加，指标取最大值
+    """
+    merged = {"phases": {}, "endpoints": {}, "counters": {}, "gauges": {}, "wall_time": 0.0}
+    for metrics in metrics_list:
+        if not metrics:
+            continue
+        for name, seconds in metrics.get("phases", {}).items():
+            merged["phases"][name] = round(merged["phases"].get(name, 0.0) + seconds, 4)
+        for name, value in metrics.get("counters", {}).items():
+            merged["counters"][name] = merged["counters"].get(name, 0) + value
+        for name, value in metrics.get("gauges", {}).items():
+            merged["gauges"][name] = max(merged["gauges"].get(name, value), value)
+        merged["wall_time"] = max(merged["wall_time"], metrics.get("wall_time", 0.0))
+
+        for endpoint, stats in metrics.get("endpoints", {}).items():
+            target = merged["endpoints"].get(endpoint)
+            if target is None:
+                merged["endpoints"][endpoint] = {
+                    **stats, "buckets": dict(stats.get("buckets", {})), "status": dict(stats.get("status", {}))
+                }
+                continue
+            for key in ("count", "errors", "bytes", "latency_sum"):
+                target[key] = target.get(key, 0) + stats.get(key, 0)
+            target["latency_max"] = max(target.get("latency_max", 0.0), stats.get("latency_max", 0.0))
+            for key, count in stats.get("buckets", {}).items():
+                target["buckets"][key] = target["buckets"].get(key, 0) + count
+            for key, count in stats.get("status", {}).items():
+                target["status"][key] = target["status"].get(key, 0) + count
+            target["latency_avg"] = target["latency_sum"] / target["count"] if target["count"] else 0.0
+    return merged
+
+
+def format_summary(metrics):
+    """将统计字典格式化为一行摘要，用于日志"""
+    if not metrics:
+        return ""
+    phases = metrics.get("phases", {})
+    parts = [f"{name} {seconds:.1f}s" for name, seconds in sorted(phases.items(), key=lambda x: -x[1])]
+    counters = metrics.get("counters", {})
+    parts.append(f"请求 {counters.get('requests', 0)} 次")
+    parts.append(f"{counters.get('bytes', 0) / 1024:.0f} KB")
+    if counters.get("retries"):
+        parts.append(f"重试 {counters['retries']} 次")
+    if counters.get("http_429"):
+        parts.append(f"429 {counters['http_429']} 次")
+    return " | ".join(parts)
@@ -0,0 +1,217 @@
+"""
+扫描任务管理模块
+手动分析（HomeScreen）和定时服务的扫描统一在这里调度：
+- 同一规格（分析配置 + 交易对范围）同时只有一个活动任务，重复提交直接加入该任务
+- 同时运行的任务数受限，超出的任务排队
+- 支持协作式取消：分析器在每批币种之间检查 cancel_event；
+  加入的提交者取消时只退出等待，所有提交者都取消后任务才真正取消
+- 可查询任务状态和进度
+"""
+import itertools
+import json
+import time
+import traceback
+from collections import deque
+from threading import Event, Lock, Thread
+
+
+def scan_spec(analyzer_config, symbols=None):
+    """扫描规格：相同分析配置和交易对范围的扫描视为同一任务"""
+    return (
+        json.dumps(analyzer_config, sort_keys=True, default=str),
+        tuple(symbols) if symbols is not None else None
+    )
+
+
+class ScanJob:
+    def __init__(self, job_id, spec, func, name, manager):
+        self.id = job_id
+        self.spec = spec
+        self.func = func
+        self.name = name
+        self.manager = manager
+        self.state = "queued"  # queued / running / done / cancelled / failed
+        self.progress = 0
+        self.message = ""
+        self.joined = 0  # 合并进来的重复提交次数
+        self.subscribers = 1  # 仍在等待结果的提交者数量
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.cancel_event = Event()
+        self.done_event = Event()
+        self.lock = Lock()
+        self.callbacks = []
+
+    def report(self, message, progress=None):
+        """记录任务进度（分析器回调）"""
+        self.message = message
+        if progress is not None:
+            self.progress = progress
+
+    def reporter(self, forward=None):
+        """生成分析器回调：更新任务进度后转发给原回调"""
+        def callback(message, progress=None):
+            self.report(message, progress)
+            if forward:
+                forward(message, progress)
+        return callback
+
+    def cancel(self):
+        """提交者放弃该任务，返回 True 表示已放弃（其他提交者仍在等待时任务继续运行）"""
+        return self.manager.cancel(self)
+
+    def is_done(self):
+        return self.done_event.is_set()
+
+    def wait(self, timeout=None):
+        return self.done_event.wait(timeout)
+
+    def add_done_callback(self, fn):
+        """任务结束时调用 fn(job)（在任务线程中执行）；已结束则立即调用"""
+        with self.lock:
+            if not self.done_event.is_set():
+                self.callbacks.append(fn)
+                return
+        fn(self)
+
+    def _complete(self, result=None, error=None):
+        self.finished_at = time.time()
+        self.result = result
+        self.error = error
+        if error is not None:
+            self.state = "failed"
+        elif self.cancel_event.is_set() and result is None:
+            # 取消标志置位前已完成的任务仍视为完成
+            self.state = "cancelled"
+        else:
+            self.state = "done"
+            self.progress = 100
+        with self.lock:
+            self.done_event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception as e:
+                print(f"[任务] 回调执行失败: {e}")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "progress": self.progress,
+            "message": self.message,
+            "joined": self.joined,
+            "subscribers": self.subscribers,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": str(self.error) if self.error else None
+        }
+
+
+class JobManager:
+    def __init__(self, max_concurrent=1, history_size=20):
+        self.max_concurrent = max_concurrent
+        self.lock = Lock()
+        self.active = {}  # {规格: 排队中或运行中的任务}
+        self.queue = deque()
+        self.running = 0
+        self.history = deque(maxlen=history_size)
+        self._ids = itertools.count(1)
+
+    def submit(self, spec, func, name="扫描"):
+        """
+        提交扫描任务，func(job) 在后台线程中执行，返回值作为 job.result
+        :return: (job, 是否新建)，相同规格已有活动任务时返回该任务
+        """
+        with self.lock:
+            job = self.active.get(spec)
+            if job is not None:
+                job.joined += 1
+                job.subscribers += 1
+                return job, False
+
+            job = ScanJob(next(self._ids), spec, func, name, self)
+            self.active[spec] = job
+            self.history.append(job)
+            if self.running < self.max_concurrent:
+                self._start_locked(job)
+            else:
+                self.queue.append(job)
+        return job, True
+
+    def _start_locked(self, job):
+        self.running += 1
+        job.state = "running"
+        job.started_at = time.time()
+        Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _run(self, job):
+        result = None
+        error = None
+        try:
+            result = job.func(job)
+        except Exception as e:
+            error = e
+            traceback.print_exc()
+
+        with self.lock:
+            self.running -= 1
+            if self.active.get(job.spec) is job:
+                del self.active[job.spec]
+            while self.queue and self.running < self.max_concurrent:
+                self._start_locked(self.queue.popleft())
+        job._complete(result, error)
+
+    def cancel(self, job):
+        """
+        一个提交者放弃任务；最后一个提交者放弃时取消任务：
+        排队中的直接移除，运行中的设置取消标志，由分析器在币种之间退出
+        """
+        with self.lock:
+            if job.state not in ("queued", "running"):
+                return False
+            job.subscribers = max(0, job.subscribers - 1)
+            if job.subscribers > 0:
+                return True
+            if job.state == "running":
+                job.cancel_event.set()
+                return True
+            self.queue.remove(job)
+            if self.active.get(job.spec) is job:
+                del self.active[job.spec]
+            job.cancel_event.set()
+        job._complete()
+        return True
+
+    def get_job(self, job_id):
+        with self.lock:
+            for job in self.history:
+                if job.id == job_id:
+                    return job
+        return None
+
+    def active_jobs(self):
+        with self.lock:
+            return list(self.active.values())
+
+    def status(self):
+        """所有近期任务的状态（最新在前）"""
+        with self.lock:
+            return [job.to_dict() for job in reversed(self.history)]
+
+
+manager_instance = None
+_instance_lock = Lock()
+
+def get_job_manager():
+    global manager_instance
+    with _instance_lock:
+        if manager_instance is None:
+            manager_instance = JobManager()
+        return manager_instance
@@ -0,0 +1,262 @@
+"""
+K线列式归档模块
+把分析器拉取过的每根K线按 周期/交易对/字段 存成定长二进制列文件（每个值8字节，小端），
+读取时通过 mmap 映射，不需要把历史数据全部载入内存：
+- 安装了 NumPy 时返回 numpy.memmap 数组，可直接向量化计算
+- 否则返回 memoryview（标准库 mmap），按下标访问
+目录结构: <root>/<interval>/<SYMBOL>/[g<N>/]<field>.bin，<SYMBOL>/state.json 记录当前代数和已提交行数
+列文件从不截断，读者只读取 state.json 中已提交的行，正在映射的数据不会变短（不会 SIGBUS）：
+- 常规写入（追加新K线、更新尚未收盘的最后一根）直接写入当前列文件，写完后再提交行数，开销与新K线数量成正比
+- 其他情况（补历史、有缺口、最后一根的 open_time 变化）在新一代目录中写完全部列后切换 state.json，
+  读者看到的各列总是同一代的数据；保留上一代，供切换时正在打开文件的读者使用
+同一交易对的写入在进程内按目录加锁，支持 fcntl 的平台上同时加文件锁，多个进程（如 backfill 与应用）可以同时写
+"""
+import array
+import json
+import mmap
+import os
+import sys
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from threading import Lock
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# (字段名, array类型码)  q: int64, d: float64
+FIELDS = (
+    ("open_time", "q"),
+    ("open", "d"),
+    ("high", "d"),
+    ("low", "d"),
+    ("close", "d"),
+    ("volume", "d"),
+    ("close_time", "q"),
+    ("quote_volume", "d"),
+    ("count", "q"),
+)
+FIELD_CODES = dict(FIELDS)
+ITEM_SIZE = 8
+NUMPY_DTYPES = {"q": "<i8", "d": "<f8"}
+
+_dir_locks = {}  # {交易对目录绝对路径: Lock}，同一进程内所有 KlineArchive 实例共用
+_dir_locks_lock = Lock()
+
+
+class KlineArchive:
+    def __init__(self, root_dir="kline_archive", interval="1d"):
+        self.root_dir = root_dir
+        self.interval = interval
+        if sys.byteorder != "little":
+            raise RuntimeError("K线归档只支持小端平台")
+
+    def _symbol_dir(self, symbol):
+        return os.path.join(self.root_dir, self.interval, symbol)
+
+    def _generation_dir(self, symbol, generation):
+        # 第0代的列文件直接放在交易对目录下（与旧版本布局相同）
+        directory = self._symbol_dir(symbol)
+        return directory if generation == 0 else os.path.join(directory, f"g{generation}")
+
+    def _path(self, symbol, field, generation=0):
+        return os.path.join(self._generation_dir(symbol, generation), f"{field}.bin")
+
+    def _state(self, symbol):
+        """(当前代数, 已提交行数)；没有 state.json 的旧版本归档取各列文件长度的最小值"""
+        try:
+            with open(os.path.join(self._symbol_dir(symbol), "state.json"), "r", encoding="utf-8") as f:
+                state = json.load(f)
+            return state["generation"], state["rows"]
+        except FileNotFoundError:
+            pass
+        counts = []
+        for field, _ in FIELDS:
+            path = self._path(symbol, field)
+            if not os.path.exists(path):
+                return 0, 0
+            counts.append(os.path.getsize(path) // ITEM_SIZE)
+        return 0, min(counts)
+
+    def _commit(self, symbol, generation, rows):
+        path = os.path.join(self._symbol_dir(symbol), "state.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"generation": generation, "rows": rows}, f)
+        os.replace(path + ".tmp", path)
+
+    @contextmanager
+    def _locked(self, symbol):
+        """写锁：进程内按交易对目录的线程锁 + 跨进程的文件锁"""
+        directory = self._symbol_dir(symbol)
+        os.makedirs(directory, exist_ok=True)
+        key = os.path.abspath(directory)
+        with _dir_locks_lock:
+            lock = _dir_locks.get(key)
+            if lock is None:
+                lock = _dir_locks[key] = Lock()
+        with lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            with open(os.path.join(directory, ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def symbols(self):
+        """已归档的交易对列表"""
+        base = os.path.join(self.root_dir, self.interval)
+        if not os.path.isdir(base):
+            return []
+        return sorted(name for name in os.listdir(base) if os.path.isdir(os.path.join(base, name)))
+
+    def row_count(self, symbol):
+        return self._state(symbol)[1]
+
+    def _map(self, symbol, field, rows, generation=0):
+        """只读映射一个列文件的前 rows 个值"""
+        code = FIELD_CODES[field]
+        if rows == 0:
+            return np.empty(0, dtype=NUMPY_DTYPES[code]) if NUMPY_AVAILABLE else memoryview(array.array(code))
+        path = self._path(symbol, field, generation)
+        if NUMPY_AVAILABLE:
+            return np.memmap(path, dtype=NUMPY_DTYPES[code], mode="r", shape=(rows,))
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mm).cast(code)[:rows]
+
+    def read(self, symbol, start=None, end=None, fields=None):
+        """
+        读取一个交易对的K线列
+        :param start: 起始 open_time（毫秒，含），None 表示从头
+        :param end: 结束 open_time（毫秒，含），None 表示到最新
+        :param fields: 需要的字段，默认全部
+        :return: {字段名: 数组}，数组为 mmap 视图
+        """
+        generation, rows = self._state(symbol)
+        open_time = self._map(symbol, "open_time", rows, generation)
+        lo = 0 if start is None else self._search(open_time, start, "left")
+        hi = rows if end is None else self._search(open_time, end, "right")
+
+        columns = {}
+        for field in fields or [f for f, _ in FIELDS]:
+            column = open_time if field == "open_time" else self._map(symbol, field, rows, generation)
+            columns[field] = column[lo:hi]
+        return columns
+
+    @staticmethod
+    def _search(column, value, side):
+        if NUMPY_AVAILABLE:
+            return int(np.searchsorted(column, value, side=side))
+        return bisect_left(column, value) if side == "left" else bisect_right(column, value)
+
+    def read_rows(self, symbol, start=None, end=None):
+        """以分析器使用的K线字典格式读取（用于回放 calculate_gains）"""
+        columns = self.read(symbol, start, end)
+        count = len(columns["open_time"])
+        return [
+            {field: (int(columns[field][i]) if code == "q" else float(columns[field][i]))
+             for field, code in FIELDS}
+            for i in range(count)
+        ]
+
+    def _open_time_at(self, symbol, generation, row):
+        with open(self._path(symbol, "open_time", generation), "rb") as f:
+            f.seek(row * ITEM_SIZE)
+            return array.array("q", f.read(ITEM_SIZE))[0]
+
+    def last_open_time(self, symbol):
+        generation, rows = self._state(symbol)
+        return self._open_time_at(symbol, generation, rows - 1) if rows else None
+
+    def write(self, symbol, klines):
+        """
+        写入一批按时间升序排列的K线
+        - 新K线接在最新一根之后，或从最新一根（同一 open_time，尚未收盘的当日K线）开始：原地写入
+        - 其他情况（补历史、有缺口）：与已有数据合并后写成新一代
+        :return: 写入后的总行数
+        """
+        if not klines:
+            return self.row_count(symbol)
+
+        with self._locked(symbol):
+            generation, rows = self._state(symbol)
+            first_new = klines[0]["open_time"]
+            if rows:
+                last_old = self._open_time_at(symbol, generation, rows - 1)
+                if first_new > last_old:
+                    self._write_at(symbol, generation, rows, klines)
+                    self._commit(symbol, generation, rows + len(klines))
+                    return rows + len(klines)
+                if first_new == last_old:
+                    self._write_at(symbol, generation, rows - 1, klines)
+                    self._commit(symbol, generation, rows - 1 + len(klines))
+                    return rows - 1 + len(klines)
+                return self._merge_locked(symbol, klines, generation, rows)
+
+            self._write_at(symbol, generation, 0, klines)
+            self._commit(symbol, generation, len(klines))
+            return len(klines)
+
+    def merge(self, symbol, klines):
+        """合并任意时间段的K线（按 open_time 去重，新数据优先），适合批量补历史"""
+        if not klines:
+            return self.row_count(symbol)
+        with self._locked(symbol):
+            generation, rows = self._state(symbol)
+            return self._merge_locked(symbol, klines, generation, rows)
+
+    def _merge_locked(self, symbol, klines, generation, rows):
+        merged = {k["open_time"]: k for k in self.read_rows(symbol)} if rows else {}
+        for k in klines:
+            merged[k["open_time"]] = k
+        ordered = [merged[t] for t in sorted(merged)]
+
+        new_generation = generation + 1
+        os.makedirs(self._generation_dir(symbol, new_generation), exist_ok=True)
+        self._write_at(symbol, new_generation, 0, ordered)
+        self._commit(symbol, new_generation, len(ordered))
+        if generation > 0:
+            self._remove_generation(symbol, generation - 1)
+        return len(ordered)
+
+    def _write_at(self, symbol, generation, row, klines):
+        """从第 row 行起写入各列（已提交行数之后的内容对读者不可见，不截断文件）"""
+        for field, code in FIELDS:
+            path = self._path(symbol, field, generation)
+            cast = int if code == "q" else float
+            values = array.array(code, (cast(k.get(field, 0)) for k in klines))
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.seek(row * ITEM_SIZE)
+                f.write(values.tobytes())
+
+    def _remove_generation(self, symbol, generation):
+        for field, _ in FIELDS:
+            path = self._path(symbol, field, generation)
+            if os.path.exists(path):
+                os.remove(path)
+        if generation > 0:
+            os.rmdir(self._generation_dir(symbol, generation))
+
+    def stats(self):
+        """归档概况：交易对数量、总行数、磁盘占用"""
+        symbols = self.symbols()
+        total_rows = 0
+        for symbol in symbols:
+            total_rows += self.row_count(symbol)
+        return {
+            "symbols": len(symbols),
+            "rows": total_rows,
+            "bytes": total_rows * ITEM_SIZE * len(FIELDS),
+            "backend": "numpy" if NUMPY_AVAILABLE else "mmap"
+        }
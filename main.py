@@ -20,7 +20,6 @@ from kivy.clock import Clock, mainthread
 from kivy.core.window import Window
 from kivy.core.text import LabelBase
 from kivy.metrics import dp, sp
-from threading import Thread
 import traceback
 import os
 import sys
@@ -64,6 +63,11 @@ try:
     from notification_manager import NotificationManager
     from config_manager import ConfigManager
     from service import get_service
+    from job_manager import get_job_manager, scan_spec
+    from scan_checkpoint import ScanCheckpoint
+    from scoring import sort_results
+    from funding_cache import get_funding_cache
+    from gain_history import GainHistoryStore
 except Exception as e:
     print(f"模块导入失败: {e}")
     traceback.print_exc()
@@ -121,6 +125,9 @@ class HomeScreen(Screen):
         self.config_manager = ConfigManager()
         self.db_manager = DatabaseManager()
         self.notif_manager = NotificationManager()
+        self.checkpoint = ScanCheckpoint(self.db_manager.db_file)
+        self.gain_history = GainHistoryStore(self.db_manager.db_file)
+        self.current_job = None
         
         layout = BoxLayout(orientation="vertical", padding=[dp(20), dp(15), dp(20), dp(15)], spacing=dp(12))
         
@@ -168,6 +175,14 @@ class HomeScreen(Screen):
             font_size="14sp"
         )
         btn_clear.bind(on_press=lambda x: self.clear_logs())
+        btn_cancel = create_rounded_button(
+            text="取消",
+            bg_color=WARNING_COLOR,
+            size_hint_x=0.2,
+            font_size="14sp"
+        )
+        btn_cancel.bind(on_press=self.cancel_analysis)
+        log_header.add_widget(btn_cancel)
         log_header.add_widget(btn_clear)
         layout.add_widget(log_header)
         
@@ -242,24 +257,67 @@ class HomeScreen(Screen):
                 self.status_label.text = f"最近分析: {timestamp} | 找到 {count} 个符合条件的币种"
     
     def start_analysis(self, instance):
-        self.add_log("开始分析...")
-        Thread(target=self._run_analysis, daemon=True).start()
+        # 统一由任务管理器调度：重复点击或与定时分析重叠时加入正在进行的同一扫描
+        spec = scan_spec(self.config_manager.get_analyzer_config())
+        job, created = get_job_manager().submit(spec, self._run_analysis, "手动分析")
+        if created:
+            self.add_log("开始分析...")
+        else:
+            self.add_log(f"已有相同的分析在进行中（{job.progress}%），等待其完成...")
+        self.current_job = job
+        job.add_done_callback(self._on_job_done)
     
-    def _run_analysis(self):
-        try:
-            config = self.config_manager.get_analyzer_config()
-            analyzer = BinanceAnalyzer(config=config, callback=self.analysis_callback)
-            analysis_data = analyzer.analyze()
-            results = analysis_data.get("results", [])
-            
-            self.db_manager.save_analysis(analysis_data, config)
-            
+    def cancel_analysis(self, instance):
+        job = self.current_job
+        if job and not job.is_done() and job.cancel():
+            if job.cancel_event.is_set():
+                self.add_log("正在取消分析...")
+            else:
+                # 加入的是定时分析：只停止等待，不影响定时服务自己的扫描
+                self.current_job = None
+                self.add_log("已停止等待，定时分析继续进行")
+        else:
+            self.add_log("当前没有进行中的分析")
+    
+    def _run_analysis(self, job):
+        config = self.config_manager.get_analyzer_config()
+        analyzer = BinanceAnalyzer(config=config, callback=job.reporter(self.analysis_callback))
+        analysis_data = analyzer.analyze(cancel_event=job.cancel_event, checkpoint=self.checkpoint)
+        if analysis_data.get("cancelled"):
+            return None
+        results = analysis_data.get("results", [])
+        
+        # 多方案扫描：其他方案的结果单独保存和通知，主方案最后保存
+        profiles = analysis_data.get("profiles") or {}
+        for name, profile in list(profiles.items())[1:]:
+            profile_data = dict(analysis_data, results=profile["results"], near_symbols=profile["near_symbols"])
+            profile_data.pop("profiles")
+            profile_config = dict(config, MIN_CHANGE_PERCENT=profile["min_change_percent"],
+                                  LIQUIDITY_THRESHOLD_USDT=profile["liquidity_threshold_usdt"])
+            self.db_manager.save_analysis(profile_data, profile_config, name)
+            if self.config_manager.get("notify_on_complete", True) and profile["results"]:
+                self.notif_manager.notify_analysis_complete(len(profile["results"]), profile["results"], name)
+        
+        primary = next(iter(profiles), None)
+        self.db_manager.save_analysis(analysis_data, config, primary)
+        if self.config_manager.get("gain_history_enabled", True):
+            self.gain_history.record(analysis_data)
+        
+        if self.config_manager.get("notify_on_complete", True):
+            self.notif_manager.notify_analysis_complete(len(results), results, primary)
+        return analysis_data
+    
+    def _on_job_done(self, job):
+        # 已停止等待或已被新的分析替换的任务不再显示结果
+        if job is not self.current_job:
+            return
+        if job.state == "done" and job.result is not None:
+            results = job.result.get("results", [])
             Clock.schedule_once(lambda dt: self.show_results(results), 0)
-            
-            if self.config_manager.get("notify_on_complete", True):
-                self.notif_manager.notify_analysis_complete(len(results), results)
-        except Exception as e:
-            error_msg = str(e)
+        elif job.state in ("cancelled", "done"):
+            self.add_log("分析已取消，本次结果未保存")
+        else:
+            error_msg = str(job.error)
             Clock.schedule_once(lambda dt: self.show_error(error_msg), 0)
     
     @mainthread
@@ -323,6 +381,8 @@ class ResultsScreen(Screen):
     
     def display_results(self, results):
         self.results_container.clear_widgets()
+        # 按综合评分排列（兼容没有评分的历史记录）
+        results = sort_results(list(results))
         self.results_label.text = f"找到 {len(results)} 个符合条件的币种"
         
         if not results:
@@ -335,12 +395,18 @@ class ResultsScreen(Screen):
             ))
             return
         
+        # 资金费率：优先使用结果中记录的值，其次读取内存中的快照（界面不单独请求）
+        funding_snapshot = get_funding_cache().peek()
         for i, r in enumerate(results, 1):
+            funding_rate = r.get("funding_rate")
+            if funding_rate is None:
+                funding_rate = (funding_snapshot.get(r["symbol"]) or {}).get("funding_rate")
+            
             # 外层容器带背景
             card_wrapper = BoxLayout(
                 orientation="vertical",
                 size_hint_y=None,
-                height=dp(220),
+                height=dp(220) + (dp(38) if funding_rate is not None else 0),
                 padding=0
             )
             
@@ -395,6 +461,21 @@ class ResultsScreen(Screen):
                 ))
                 card.add_widget(gain_row)
             
+            if funding_rate is not None:
+                funding_row = BoxLayout(size_hint_y=None, height=dp(38))
+                funding_row.add_widget(Label(
+                    text="费率",
+                    size_hint_x=0.25,
+                    font_size="15sp",
+                    color=TEXT_REGULAR
+                ))
+                funding_row.add_widget(Label(
+                    text=f"{funding_rate * 100:+.4f}%",
+                    font_size="15sp",
+                    color=TEXT_SECONDARY
+                ))
+                card.add_widget(funding_row)
+            
             card_wrapper.add_widget(card)
             self.results_container.add_widget(card_wrapper)
     
@@ -1551,6 +1632,9 @@ class BinanceAnalyzerApp(App):
         service.log_callback = home_screen.add_log
         service.schedule_log_callback = schedule_screen.add_schedule_log
         
+        # 后台预热连接和exchangeInfo缓存，手动分析与定时分析共用
+        service.start_warmup()
+        
         config_manager = ConfigManager()
         if config_manager.get("schedule_enabled", False):
             service.start_service()
@@ -0,0 +1,429 @@
+"""
+行情数据源模块
+把各交易所/市场的接口差异封装在 MarketDataSource 适配器中，分析器只使用统一的K线格式：
+{"open_time", "open", "high", "low", "close", "volume", "close_time", "quote_volume", "count"}
+- binance_um: 币安U本位合约（fapi）
+- binance_cm: 币安币本位合约（dapi），成交额按合约面值折算为USD
+- binance_spot: 币安现货（api/v3），按计价资产过滤交易对
+- fake: 内存数据源，用于测试
+每个数据源有独立的令牌桶限速器；批量获取K线时按数据源并发请求
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import requests
+
+import fast_json
+
+BASE_URL = "https://fapi.binance.com"
+
+_session = None
+_session_lock = Lock()
+
+
+def get_http_session():
+    """进程内共享的HTTP会话，复用TCP/TLS连接（keep-alive），手动分析与定时服务共用"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+class TokenBucket:
+    """令牌桶限速：平均每秒 rate 个请求，允许 burst 个突发"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def parse_binance_klines(raw, contract_size=None):
+    """
+    把币安K线数组转换为统一格式
+    :param contract_size: 币本位合约面值（USD），给出时 quote_volume 按 张数 × 面值 计算
+    """
+    klines = []
+    for k in raw:
+        volume = float(k[5])
+        klines.append({
+            "open_time": k[0],
+            "open": float(k[1]),
+            "high": float(k[2]),
+            "low": float(k[3]),
+            "close": float(k[4]),
+            "volume": volume,
+            "close_time": k[6],
+            "quote_volume": volume * contract_size if contract_size else float(k[7]),
+            "count": int(k[8])
+        })
+    return klines
+
+
+class MarketDataSource:
+    """行情数据源接口"""
+
+    name = "base"
+    supports_funding = False  # 是否提供资金费率和标记价格（get_premium_index）
+    supports_open_interest = False  # 是否提供持仓量历史（get_open_interest_change）
+
+    def __init__(self, name=None, rate=10.0, burst=None, max_workers=4):
+        self.name = name or self.name
+        self.limiter = TokenBucket(rate, burst)
+        self.max_workers = max_workers
+        self.metrics = None  # 分析器绑定的 ScanMetrics
+
+    def list_symbols(self):
+        """可交易的交易对列表"""
+        raise NotImplementedError
+
+    def get_quote_volumes(self):
+        """24小时成交额 [(symbol, quote_volume), ...]"""
+        raise NotImplementedError
+
+    def get_klines(self, symbol, interval="1d", limit=3):
+        """按时间升序返回统一格式的K线"""
+        raise NotImplementedError
+
+    def get_premium_index(self):
+        """
+        全部交易对的标记价格和资金费率（一次请求），返回 {symbol: {"mark_price", "index_price", "funding_rate", "next_funding_time"}}；
+        不支持的数据源（supports_funding 为 False）返回空字典
+        """
+        return {}
+
+    def get_open_interest_change(self, symbol, period="1d"):
+        """持仓量相对上一周期的变化率，数据不足或数据源不支持（supports_open_interest 为 False）时返回 None"""
+        return None
+
+    def ping(self):
+        return True
+
+    def get_klines_batch(self, symbols, interval="1d", limit=3, fetch=None, max_workers=None):
+        """
+        并发获取多个交易对的K线，返回 {symbol: klines}，失败的交易对为空列表
+        :param fetch: fetch(symbol) 代替 get_klines（如分析器带重试和请求合并的调用）
+        :param max_workers: 并发数，默认为数据源的 max_workers；为1时在当前线程依次获取
+        """
+        fetch = fetch or (lambda symbol: self.get_klines(symbol, interval, limit))
+
+        def fetch_one(symbol):
+            try:
+                return fetch(symbol)
+            except Exception:
+                return []
+
+        max_workers = max_workers or self.max_workers
+        if max_workers <= 1 or len(symbols) <= 1:
+            return {symbol: fetch_one(symbol) for symbol in symbols}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols))) as executor:
+            return dict(zip(symbols, executor.map(fetch_one, symbols)))
+
+
+class HttpSource(MarketDataSource):
+    """基于HTTP接口的数据源：限速、共享会话、记录请求统计"""
+
+    def __init__(self, base_url, name=None, rate=10.0, burst=None, max_workers=4):
+        super().__init__(name, rate, burst, max_workers)
+        self.base_url = base_url.rstrip("/")
+        self.session = get_http_session()
+
+    def _record_weight(self, resp):
+        weight = resp.headers.get("X-MBX-USED-WEIGHT-1M")
+        if self.metrics and weight and weight.isdigit():
+            self.metrics.gauge_max("used_weight_1m", int(weight))
+
+    def _request(self, path, params=None, timeout=10):
+        """发送GET请求并记录延迟、字节数、状态码和接口权重"""
+        self.limiter.acquire()
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(f"{self.base_url}{path}", params=params, timeout=timeout)
+        except requests.exceptions.RequestException:
+            if self.metrics:
+                self.metrics.record_request(path, time.perf_counter() - start, error=True)
+            raise
+
+        if self.metrics:
+            self.metrics.record_request(
+                path, time.perf_counter() - start, len(resp.content), resp.status_code,
+                error=resp.status_code >= 400
+            )
+        self._record_weight(resp)
+        resp.raise_for_status()
+        return resp
+
+    def _stream_request(self, path, params=None, timeout=10, chunk_size=16384):
+        """
+        流式GET请求，逐块产出响应体（不在内存中保留完整响应），
+        读取结束后记录延迟和字节数
+        """
+        self.limiter.acquire()
+        start = time.perf_counter()
+        nbytes = 0
+        status = None
+        error = False
+        try:
+            with self.session.get(f"{self.base_url}{path}", params=params, timeout=timeout, stream=True) as resp:
+                status = resp.status_code
+                self._record_weight(resp)
+                resp.raise_for_status()
+                for chunk in resp.iter_content(chunk_size=chunk_size):
+                    nbytes += len(chunk)
+                    yield chunk
+        except Exception:
+            error = True
+            raise
+        finally:
+            if self.metrics:
+                self.metrics.record_request(path, time.perf_counter() - start, nbytes, status, error)
+
+    def _decode_json(self, resp, decoder=fast_json.loads):
+        """解析响应JSON（可传入只解码部分字段的解码器），计入 json_decode 阶段耗时"""
+        if not self.metrics:
+            return decoder(resp.content)
+        with self.metrics.span("json_decode"):
+            return decoder(resp.content)
+
+
+class BinanceFuturesSource(HttpSource):
+    """币安U本位永续合约"""
+
+    name = "binance_um"
+    prefix = "/fapi/v1"
+    supports_funding = True
+    supports_open_interest = True
+
+    def __init__(self, base_url=BASE_URL, **kwargs):
+        super().__init__(base_url, **kwargs)
+
+    def ping(self):
+        self._request(f"{self.prefix}/ping", timeout=10)
+        return True
+
+    def list_symbols(self):
+        symbols_info = self._decode_json(
+            self._request(f"{self.prefix}/exchangeInfo", timeout=10), fast_json.decode_exchange_symbols
+        )
+        return [symbol for symbol, status, contract_type in symbols_info
+                if status == "TRADING" and contract_type == "PERPETUAL"]
+
+    def get_quote_volumes(self):
+        # 流式解析为紧凑的 (交易对, 成交额) 列表，不保留完整行情
+        return list(fast_json.iter_ticker_volumes(
+            self._stream_request(f"{self.prefix}/ticker/24hr", timeout=15)))
+
+    def get_klines(self, symbol, interval="1d", limit=3):
+        resp = self._request(f"{self.prefix}/klines",
+                             params={"symbol": symbol, "interval": interval, "limit": limit}, timeout=10)
+        return parse_binance_klines(self._decode_json(resp))
+
+    def get_premium_index(self):
+        items = self._decode_json(self._request(f"{self.prefix}/premiumIndex", timeout=10))
+        return {
+            item["symbol"]: {
+                "mark_price": float(item["markPrice"]),
+                "index_price": float(item["indexPrice"]),
+                "funding_rate": float(item["lastFundingRate"]) if item.get("lastFundingRate") not in (None, "") else None,
+                "next_funding_time": item.get("nextFundingTime")
+            }
+            for item in items
+        }
+
+    def get_open_interest_change(self, symbol, period="1d"):
+        # 持仓量历史在 /futures/data 下，不在 /fapi/v1 前缀内
+        resp = self._request("/futures/data/openInterestHist",
+                             params={"symbol": symbol, "period": period, "limit": 2}, timeout=10)
+        return self._open_interest_change(self._decode_json(resp))
+
+    @staticmethod
+    def _open_interest_change(hist):
+        if len(hist) < 2 or not float(hist[-2]["sumOpenInterest"]):
+            return None
+        return float(hist[-1]["sumOpenInterest"]) / float(hist[-2]["sumOpenInterest"]) - 1
+
+
+class BinanceCoinFuturesSource(BinanceFuturesSource):
+    """币安币本位永续合约，成交量单位为张，按合约面值折算成USD成交额"""
+
+    name = "binance_cm"
+    prefix = "/dapi/v1"
+
+    def __init__(self, base_url="https://dapi.binance.com", **kwargs):
+        super().__init__(base_url, **kwargs)
+        self.contract_sizes = {}
+        self.pairs = {}  # {symbol: (pair, contractType)}，持仓量历史按标的和合约类型查询
+        self.symbols_lock = Lock()
+
+    def list_symbols(self):
+        info = self._decode_json(self._request(f"{self.prefix}/exchangeInfo", timeout=10))
+        symbols = []
+        for s in info.get("symbols", []):
+            self.contract_sizes[s.get("symbol")] = float(s.get("contractSize") or 0)
+            self.pairs[s.get("symbol")] = (s.get("pair"), s.get("contractType"))
+            if s.get("contractStatus") == "TRADING" and s.get("contractType") == "PERPETUAL":
+                symbols.append(s["symbol"])
+        return symbols
+
+    def _ensure_symbols(self):
+        """首次需要合约面值/标的时加载 exchangeInfo；并发的工作线程等待同一次加载，不重复请求"""
+        if self.contract_sizes:
+            return
+        with self.symbols_lock:
+            if not self.contract_sizes:
+                self.list_symbols()
+
+    def _contract_size(self, symbol):
+        self._ensure_symbols()
+        return self.contract_sizes.get(symbol) or None
+
+    def get_quote_volumes(self):
+        self._ensure_symbols()
+        volumes = []
+        for t in fast_json.iter_array_items(self._stream_request(f"{self.prefix}/ticker/24hr", timeout=15)):
+            size = self.contract_sizes.get(t.get("symbol"))
+            try:
+                volume = float(t.get("volume"))
+            except (TypeError, ValueError):
+                continue
+            if size:
+                volumes.append((t["symbol"], volume * size))
+        return volumes
+
+    def get_klines(self, symbol, interval="1d", limit=3):
+        resp = self._request(f"{self.prefix}/klines",
+                             params={"symbol": symbol, "interval": interval, "limit": limit}, timeout=10)
+        return parse_binance_klines(self._decode_json(resp), self._contract_size(symbol))
+
+    def get_open_interest_change(self, symbol, period="1d"):
+        # 币本位持仓量历史按 pair + contractType 查询（如 BTCUSD_PERP → BTCUSD / PERPETUAL）
+        self._ensure_symbols()
+        pair, contract_type = self.pairs.get(symbol) or (None, None)
+        if not pair or not contract_type:
+            return None
+        resp = self._request("/futures/data/openInterestHist",
+                             params={"pair": pair, "contractType": contract_type, "period": period, "limit": 2},
+                             timeout=10)
+        return self._open_interest_change(self._decode_json(resp))
+
+
+class BinanceSpotSource(BinanceFuturesSource):
+    """币安现货，只保留指定计价资产的交易对"""
+
+    name = "binance_spot"
+    prefix = "/api/v3"
+    # 现货没有资金费率和持仓量
+    supports_funding = False
+    supports_open_interest = False
+
+    def __init__(self, base_url="https://api.binance.com", quote_asset="USDT", **kwargs):
+        super().__init__(base_url, **kwargs)
+        self.quote_asset = quote_asset
+
+    def list_symbols(self):
+        symbols_info = self._decode_json(
+            self._request(f"{self.prefix}/exchangeInfo", timeout=30), fast_json.decode_spot_symbols
+        )
+        return [symbol for symbol, status, quote_asset in symbols_info
+                if status == "TRADING" and quote_asset == self.quote_asset]
+
+    def get_premium_index(self):
+        return {}
+
+    def get_open_interest_change(self, symbol, period="1d"):
+        return None
+
+
+class FakeSource(MarketDataSource):
+    """内存数据源（测试用），记录每个接口的调用次数"""
+
+    name = "fake"
+    supports_funding = True
+    supports_open_interest = True
+
+    def __init__(self, klines=None, volumes=None, name=None, rate=0, burst=None, max_workers=4, latency=0,
+                 premium=None, open_interest=None):
+        super().__init__(name, rate, burst, max_workers)
+        self.klines = klines or {}
+        self.volumes = volumes
+        self.latency = latency
+        self.premium = premium or {}  # {symbol: premiumIndex 字段}
+        self.open_interest = open_interest or {}  # {symbol: 持仓量变化率}
+        self.calls = {"list_symbols": 0, "get_quote_volumes": 0, "get_klines": 0, "get_klines_batch": 0,
+                      "get_premium_index": 0, "get_open_interest_change": 0}
+        self.calls_lock = Lock()
+
+    def _call(self, name):
+        self.limiter.acquire()
+        with self.calls_lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def list_symbols(self):
+        self._call("list_symbols")
+        return list(self.klines)
+
+    def get_quote_volumes(self):
+        self._call("get_quote_volumes")
+        if self.volumes is not None:
+            return list(self.volumes.items())
+        return [(symbol, sum(k["quote_volume"] for k in klines[-1:])) for symbol, klines in self.klines.items()]
+
+    def get_klines(self, symbol, interval="1d", limit=3):
+        self._call("get_klines")
+        return list(self.klines.get(symbol, [])[-limit:])
+
+    def get_klines_batch(self, symbols, interval="1d", limit=3, fetch=None, max_workers=None):
+        with self.calls_lock:
+            self.calls["get_klines_batch"] += 1
+        return super().get_klines_batch(symbols, interval, limit, fetch, max_workers)
+
+    def get_premium_index(self):
+        self._call("get_premium_index")
+        return dict(self.premium)
+
+    def get_open_interest_change(self, symbol, period="1d"):
+        self._call("get_open_interest_change")
+        return self.open_interest.get(symbol)
+
+
+SOURCE_TYPES = {
+    "binance_um": BinanceFuturesSource,
+    "binance_cm": BinanceCoinFuturesSource,
+    "binance_spot": BinanceSpotSource,
+    "fake": FakeSource,
+}
+
+
+def create_source(name, options=None):
+    """
+    按名称创建数据源
+    :param options: 构造参数，可用 "type" 指定适配器类型（同一类型的多个实例用不同名称区分）
+    """
+    options = dict(options or {})
+    source_type = options.pop("type", name)
+    if source_type not in SOURCE_TYPES:
+        raise ValueError(f"未知的数据源: {source_type}")
+    return SOURCE_TYPES[source_type](name=name, **options)
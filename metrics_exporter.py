@@ -0,0 +1,162 @@
+"""
+Prometheus 指标导出模块（可选）
+在后台服务中内嵌一个HTTP端点（默认 http://0.0.0.0:9108/metrics），
+导出扫描耗时、扫描币种数、命中数、接口权重、429次数、通知延迟/失败、调度延迟和数据库写入耗时
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+from instrumentation import LATENCY_BUCKETS
+
+
+class MetricsRegistry:
+    """简单的线程安全指标注册表，支持 counter / gauge / histogram"""
+
+    def __init__(self, prefix="binance_analyzer"):
+        self.prefix = prefix
+        self.lock = Lock()
+        self.metrics = {}  # {名称: {"type", "help", "values": {标签元组: 值}}}
+
+    def _metric(self, name, metric_type, help_text):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = {"type": metric_type, "help": help_text, "values": {}}
+            self.metrics[name] = metric
+        return metric
+
+    def inc(self, name, value=1, help_text="", **labels):
+        with self.lock:
+            values = self._metric(name, "counter", help_text)["values"]
+            key = tuple(sorted(labels.items()))
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, help_text="", **labels):
+        with self.lock:
+            self._metric(name, "gauge", help_text)["values"][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, help_text="", buckets=LATENCY_BUCKETS, **labels):
+        with self.lock:
+            values = self._metric(name, "histogram", help_text)["values"]
+            key = tuple(sorted(labels.items()))
+            hist = values.get(key)
+            if hist is None:
+                hist = {"buckets": [0] * len(buckets), "bounds": buckets, "sum": 0.0, "count": 0}
+                values[key] = hist
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    @staticmethod
+    def _labels(key, extra=None):
+        items = list(key) + (extra or [])
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+    def render(self):
+        """输出 Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines = []
+        with self.lock:
+            for name, metric in sorted(self.metrics.items()):
+                full_name = f"{self.prefix}_{name}"
+                if metric["help"]:
+                    lines.append(f"# HELP {full_name} {metric['help']}")
+                lines.append(f"# TYPE {full_name} {metric['type']}")
+                for key, value in metric["values"].items():
+                    if metric["type"] == "histogram":
+                        for bound, count in zip(value["bounds"], value["buckets"]):
+                            lines.append(f"{full_name}_bucket{self._labels(key, [('le', bound)])} {count}")
+                        lines.append(f"{full_name}_bucket{self._labels(key, [('le', '+Inf')])} {value['count']}")
+                        lines.append(f"{full_name}_sum{self._labels(key)} {value['sum']}")
+                        lines.append(f"{full_name}_count{self._labels(key)} {value['count']}")
+                    else:
+                        lines.append(f"{full_name}{self._labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def record_scan(self, analysis_data):
+        """根据一次分析结果更新扫描相关指标"""
+        metrics = analysis_data.get("metrics") or {}
+        gauges = metrics.get("gauges", {})
+        counters = metrics.get("counters", {})
+
+        duration = analysis_data.get("duration", 0)
+        self.observe("scan_duration_seconds", duration, "扫描总耗时",
+                     buckets=(10, 30, 60, 90, 120, 180, 300, 600))
+        self.set("last_scan_duration_seconds", duration, "最近一次扫描耗时")
+        self.set("symbols_scanned", gauges.get("symbols_scanned", 0), "最近一次扫描的币种数")
+        self.set("hits", len(analysis_data.get("results", [])), "最近一次扫描命中的币种数")
+        self.set("api_weight_used_1m", gauges.get("used_weight_1m", 0), "币安返回的1分钟已用请求权重")
+        self.inc("scans_total", 1, "扫描次数")
+        self.inc("http_requests_total", counters.get("requests", 0), "HTTP请求数")
+        self.inc("http_429_total", counters.get("http_429", 0), "HTTP 429 次数")
+        self.inc("http_retries_total", counters.get("retries", 0), "HTTP 重试次数")
+        self.inc("http_bytes_total", counters.get("bytes", 0), "HTTP 接收字节数")
+        self.inc("shared_requests_total", counters.get("shared_requests", 0), "与并发扫描合并或命中短时缓存的请求数")
+        if analysis_data.get("error"):
+            self.inc("scan_errors_total", 1, "扫描出错次数")
+        for phase, seconds in metrics.get("phases", {}).items():
+            self.set("scan_phase_seconds", seconds, "最近一次扫描各阶段耗时", phase=phase)
+
+    def record_notification(self, channel_status, queue_delay=None):
+        """根据一条通知各渠道的投递状态更新指标"""
+        if queue_delay is not None:
+            self.observe("notification_queue_seconds", queue_delay, "通知从入队到开始发送的等待时间")
+        for channel, status in channel_status.items():
+            self.observe("notification_latency_seconds", status["latency"], "通知投递耗时", channel=channel)
+            if not status["success"]:
+                self.inc("notification_failures_total", 1, "通知投递失败次数", channel=channel)
+
+
+class MetricsExporter:
+    def __init__(self, registry, host="0.0.0.0", port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        if self.server is not None:
+            return False
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"[指标] 指标服务已启动: http://{self.host}:{self.server.server_address[1]}/metrics")
+        return True
+
+    def stop(self):
+        if self.server is None:
+            return False
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        return True
+
+
+registry_instance = None
+
+def get_registry():
+    global registry_instance
+    if registry_instance is None:
+        registry_instance = MetricsRegistry()
+    return registry_instance
@@ -0,0 +1,212 @@
+"""
+通知合并与限流模块
+- 合并窗口：窗口内的完成/变化等事件合并成一条推送
+- 内容去重：结果集未变化的完成通知等在去重窗口内不再重复推送（变化通知不去重），超出窗口的去重记录随之清理；
+  去重键在至少一个渠道发送成功后才记录，发送失败的内容下次仍可再次提交，等待发送期间的相同内容不重复入队
+- 渠道限流：按渠道限制最小间隔和每日次数，被限流的内容暂存，下次可发送时合并补发；
+  暂存内容含币种变化/清零通知时只受最小间隔限制，不受每日次数限制，避免状态变化被延迟到次日
+"""
+import hashlib
+import time
+from collections import deque
+from threading import Lock, Timer
+
+# 合并后标题取优先级最高的事件
+KIND_PRIORITY = {"error": 4, "changes": 3, "zero": 2, "complete": 1}
+
+# 状态变化类通知不受每日次数限制
+STATE_CHANGE_KINDS = ("changes", "zero")
+
+MAX_BACKLOG_SECTIONS = 10
+
+
+class RateLimiter:
+    """渠道限流：最小发送间隔 + 滑动窗口内最大次数（0表示不限制）"""
+
+    def __init__(self, min_interval=0, max_count=0, window=86400):
+        self.min_interval = min_interval
+        self.max_count = max_count
+        self.window = window
+        self.sent = deque()
+
+    def _trim(self, now):
+        while self.sent and now - self.sent[0] >= self.window:
+            self.sent.popleft()
+
+    def next_allowed(self, now=None, ignore_count=False):
+        """返回下一次允许发送的时间戳，ignore_count 为True时只看最小间隔"""
+        now = now or time.time()
+        self._trim(now)
+        allowed = now
+        if self.sent and self.min_interval:
+            allowed = max(allowed, self.sent[-1] + self.min_interval)
+        if self.max_count and len(self.sent) >= self.max_count and not ignore_count:
+            allowed = max(allowed, self.sent[-self.max_count] + self.window)
+        return allowed
+
+    def allow(self, now=None, ignore_count=False):
+        now = now or time.time()
+        return self.next_allowed(now, ignore_count) <= now
+
+    def record(self, now=None):
+        self.sent.append(now or time.time())
+
+
+class NotificationCoalescer:
+    def __init__(self, config_manager, dispatcher):
+        self.config_manager = config_manager
+        self.dispatcher = dispatcher
+        self.lock = Lock()
+        self.pending = []          # 合并窗口内的事件
+        self.backlog = {}          # {渠道名: [被限流暂存的内容段落]}
+        self.urgent = set()        # 暂存内容含状态变化通知的渠道名
+        self.known_channels = {}   # {渠道名: (发送函数, 最大尝试次数)}，用于补发暂存内容
+        self.last_keys = {}        # {去重键: 上次发送成功的时间}
+        self.inflight_keys = {}    # {去重键: 提交时间}，已提交、尚未发送完成
+        self.backlog_keys = {}     # {渠道名: 暂存内容中的去重键}
+        self.limiters = {}
+        self.timer = None
+        self.retry_timer = None
+        self.retry_at = None
+
+    def _get_limiter(self, channel):
+        if channel not in self.limiters:
+            if channel == "serverchan":
+                self.limiters[channel] = RateLimiter(
+                    self.config_manager.get("serverchan_min_interval", 300),
+                    self.config_manager.get("serverchan_daily_limit", 5)
+                )
+            else:
+                self.limiters[channel] = RateLimiter()
+        return self.limiters[channel]
+
+    def submit(self, kind, title, message, channels, timeout=10, dedup_key=None):
+        """
+        提交一个通知事件（非阻塞）
+        :param kind: complete / changes / zero / error
+        :param dedup_key: 去重键，为None时不去重
+        """
+        now = time.time()
+        with self.lock:
+            if dedup_key is not None:
+                dedup_window = self.config_manager.get("notify_dedup_window", 21600)
+                self.last_keys = {k: t for k, t in self.last_keys.items() if now - t < dedup_window}
+                self.inflight_keys = {k: t for k, t in self.inflight_keys.items() if now - t < dedup_window}
+                if (kind, dedup_key) in self.last_keys or (kind, dedup_key) in self.inflight_keys:
+                    print(f"[通知] 内容未变化，跳过重复通知: {title}")
+                    return False
+                self.inflight_keys[(kind, dedup_key)] = now
+
+            self.pending.append({
+                "kind": kind, "title": title, "message": message,
+                "channels": channels, "timeout": timeout,
+                "dedup": (kind, dedup_key) if dedup_key is not None else None
+            })
+            if self.timer is None:
+                window = self.config_manager.get("notify_digest_window", 5)
+                self.timer = Timer(window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return True
+
+    @staticmethod
+    def content_key(*parts):
+        return hashlib.sha1("\n".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+    def flush(self):
+        """合并窗口到期：合并事件并按渠道限流发送"""
+        with self.lock:
+            events, self.pending = self.pending, []
+            self.timer = None
+            if not events and not any(self.backlog.values()):
+                return
+
+            timeout = 10
+            title = None
+            if events:
+                top = max(events, key=lambda e: KIND_PRIORITY.get(e["kind"], 0))
+                title = top["title"]
+                timeout = max(e["timeout"] for e in events)
+                section = "\n\n".join(
+                    e["message"] if len(events) == 1 else f"【{e['title']}】\n{e['message']}"
+                    for e in events
+                )
+                event_channels = set()
+                urgent_channels = set()
+                for e in events:
+                    for name, send, attempts in e["channels"]:
+                        self.known_channels[name] = (send, attempts)
+                        event_channels.add(name)
+                        if e["dedup"] is not None:
+                            self.backlog_keys.setdefault(name, set()).add(e["dedup"])
+                        if e["kind"] in STATE_CHANGE_KINDS:
+                            urgent_channels.add(name)
+                for name in event_channels:
+                    self.backlog.setdefault(name, []).append(section)
+                self.urgent |= urgent_channels
+
+            # 相同内容的渠道合并成一个发送任务
+            jobs = {}
+            now = time.time()
+            next_retry = None
+            for name, sections in self.backlog.items():
+                if not sections or name not in self.known_channels:
+                    continue
+                limiter = self._get_limiter(name)
+                urgent = name in self.urgent
+                if not limiter.allow(now, urgent):
+                    allowed_at = limiter.next_allowed(now, urgent)
+                    next_retry = allowed_at if next_retry is None else min(next_retry, allowed_at)
+                    print(f"[通知] {name} 限流中，内容已暂存 ({len(sections)} 条)")
+                    continue
+
+                if len(sections) > MAX_BACKLOG_SECTIONS:
+                    skipped = len(sections) - MAX_BACKLOG_SECTIONS
+                    sections = [f"... 省略较早的 {skipped} 条"] + sections[-MAX_BACKLOG_SECTIONS:]
+                message = "\n\n".join(sections)
+                job_title = title or "通知汇总"
+                job_channels, job_keys = jobs.setdefault((job_title, message), ([], set()))
+                job_channels.append((name,) + self.known_channels[name])
+                job_keys.update(self.backlog_keys.pop(name, ()))
+                self.backlog[name] = []
+                self.urgent.discard(name)
+                limiter.record(now)
+
+            # 新暂存的状态变化通知可能比已安排的补发更早可以发送
+            if next_retry is not None and (self.retry_timer is None or next_retry < self.retry_at):
+                if self.retry_timer is not None:
+                    self.retry_timer.cancel()
+                self.retry_at = next_retry
+                self.retry_timer = Timer(max(1, next_retry - now), self._retry_backlog)
+                self.retry_timer.daemon = True
+                self.retry_timer.start()
+
+        for (job_title, message), (job_channels, job_keys) in jobs.items():
+            self.dispatcher.enqueue(job_title, message, job_channels, timeout,
+                                    on_done=lambda job, keys=job_keys: self._delivered(job, keys))
+
+    def _delivered(self, job, keys):
+        """发送任务结束：成功时记录去重键，失败时释放，相同内容可以重新提交"""
+        now = time.time()
+        with self.lock:
+            for key in keys:
+                self.inflight_keys.pop(key, None)
+                if job.success:
+                    self.last_keys[key] = now
+
+    def _retry_backlog(self):
+        with self.lock:
+            self.retry_timer = None
+            self.retry_at = None
+        self.flush()
+
+
+coalescer_instance = None
+
+def get_coalescer(config_manager=None):
+    global coalescer_instance
+    if coalescer_instance is None:
+        from config_manager import ConfigManager
+        from notification_queue import get_dispatcher
+        coalescer_instance = NotificationCoalescer(config_manager or ConfigManager(), get_dispatcher())
+    return coalescer_instance
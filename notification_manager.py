@@ -11,6 +11,8 @@ except ImportError:
     print("警告: plyer 未安装，通知功能不可用")
 
 from config_manager import ConfigManager
+from notification_coalescer import get_coalescer, NotificationCoalescer
+from scoring import top_k
 
 class NotificationManager:
     def __init__(self):
@@ -193,61 +195,83 @@ class NotificationManager:
             print(f"[通知] Server酱发送失败: {e}")
             return False
     
-    def send_notification(self, title, message, timeout=10):
-        """发送通知,同时尝试所有通知方式"""
-        print(f"[通知] 准备发送: {title} - {message}")
-        
+    def _get_channels(self):
+        """根据运行环境和配置确定可用的通知渠道 [(名称, 发送函数, 最大尝试次数), ...]"""
         import platform
         is_android = platform.system() == 'Linux' and hasattr(sys, 'getandroidapilevel')
         
-        success_count = 0
-        
-        # 尝试所有通知方式,不要提前返回
+        channels = []
         if is_android:
-            # Android环境: 尝试原生和plyer
-            if self._send_android_native(title, message):
-                success_count += 1
-            if self._send_plyer(title, message, timeout):
-                success_count += 1
-        else:
-            # Windows/桌面环境: 尝试plyer
-            if self._send_plyer(title, message, timeout):
-                success_count += 1
+            # Android环境: 原生通知
+            channels.append(("android", lambda title, message, timeout: self._send_android_native(title, message), 1))
+        if PLYER_AVAILABLE:
+            channels.append(("plyer", self._send_plyer, 1))
         
-        # 总是尝试Server酱(如果启用)
-        if self._send_serverchan(title, message):
-            success_count += 1
+        # Server酱(如果启用)是网络请求，失败时重试
+        if self.config_manager.get("serverchan_enabled", True) and self.config_manager.get("serverchan_key", ""):
+            channels.append(("serverchan", lambda title, message, timeout: self._send_serverchan(title, message), 3))
         
-        if success_count > 0:
-            print(f"[通知] 成功发送 {success_count} 种通知")
-            return True
-        else:
-            print(f"[通知] 所有通知方式均失败")
+        return channels
+    
+    def send_notification(self, title, message, timeout=10, kind="general", dedup_key=None):
+        """
+        发送通知：交给合并/限流层后立即返回，由后台队列并行发送到所有渠道
+        :param kind: 事件类型（complete / changes / zero / error），用于合并后的标题选择
+        :param dedup_key: 去重键，去重窗口内相同键的通知只发送一次
+        """
+        print(f"[通知] 准备发送: {title} - {message}")
+        
+        channels = self._get_channels()
+        if not channels:
+            print(f"[通知] 没有可用的通知方式")
             return False
+        
+        return get_coalescer(self.config_manager).submit(kind, title, message, channels, timeout, dedup_key)
     
-    def notify_analysis_complete(self, symbol_count, results=None):
-        title = self.config_manager.get("serverchan_title", "分析完成")
+    @staticmethod
+    def _profile_title(title, profile=None):
+        """多方案扫描时在标题前标注扫描方案名称"""
+        return f"[{profile}] {title}" if profile else title
+    
+    def notify_analysis_complete(self, symbol_count, results=None, profile=None):
+        title = self._profile_title(self.config_manager.get("serverchan_title", "分析完成"), profile)
         message_template = self.config_manager.get("serverchan_content", "找到 {count} 个符合条件的交易对")
         message = message_template.replace("{count}", str(symbol_count))
         
-        # 如果有结果数据,添加前10个币种的详细信息
+        # 如果有结果数据,添加评分最高的10个币种的详细信息
         if results and len(results) > 0:
             message += "\n\n【前10名币种】"
-            for i, r in enumerate(results[:10], 1):
+            for i, r in enumerate(top_k(results, 10), 1):
                 gain_1d = r.get('gain_1d', 0) * 100
                 gain_2d = r.get('gain_2d', 0) * 100
                 gain_3d = r.get('gain_3d', 0) * 100
                 message += f"\n{i}. {r['symbol']}"
                 message += f"\n   1日: {gain_1d:+.2f}% | 2日: {gain_2d:+.2f}% | 3日: {gain_3d:+.2f}%"
+                # 扩展指标（有数据时显示）
+                extras = []
+                if r.get('funding_rate') is not None:
+                    extras.append(f"费率 {r['funding_rate'] * 100:+.4f}%")
+                if r.get('open_interest_change') is not None:
+                    extras.append(f"持仓 {r['open_interest_change'] * 100:+.1f}%")
+                if r.get('volume_multiple') is not None:
+                    extras.append(f"量比 {r['volume_multiple']:.1f}x")
+                if r.get('atr_percent') is not None:
+                    extras.append(f"ATR {r['atr_percent'] * 100:.1f}%")
+                if extras:
+                    message += "\n   " + " | ".join(extras)
         
-        return self.send_notification(title, message)
+        # 命中币种集合不变时不重复推送完成通知
+        symbols = sorted(r['symbol'] for r in results) if results else []
+        key_parts = ([profile] if profile else []) + [symbol_count] + symbols
+        dedup_key = NotificationCoalescer.content_key(*key_parts)
+        return self.send_notification(title, message, kind="complete", dedup_key=dedup_key)
     
-    def notify_changes_detected(self, new_coins, removed_coins):
+    def notify_changes_detected(self, new_coins, removed_coins, profile=None):
         """检测到变化通知，显示具体币种名称和涨幅"""
         if not new_coins and not removed_coins:
             return False
         
-        title = "币种变化通知"
+        title = self._profile_title("币种变化通知", profile)
         message_parts = []
         
         # 新增币种（显示涨幅）
@@ -289,20 +313,22 @@ class NotificationManager:
             message_parts.extend(removed_lines)
         
         message = "\n".join(message_parts)
-        return self.send_notification(title, message, timeout=20)
+        return self.send_notification(title, message, timeout=20, kind="changes")
     
     def notify_zero_result(self, previous_count):
         """当从有结果变成0结果时发送通知"""
         title = "匹配结果清零"
         message = f"之前有 {previous_count} 个币种符合条件，现在已全部不符合条件"
-        return self.send_notification(title, message, timeout=15)
+        return self.send_notification(title, message, timeout=15, kind="zero")
     
     def notify_error(self, error_msg):
         title = "分析出错"
-        return self.send_notification(title, error_msg[:100])
+        message = error_msg[:100]
+        return self.send_notification(title, message, kind="error",
+                                      dedup_key=NotificationCoalescer.content_key(message))
     
-    def notify_zero_result(self, previous_count):
+    def notify_zero_result(self, previous_count, profile=None):
         """发送匹配数量变为0的通知"""
-        title = "匹配数量清零"
+        title = self._profile_title("匹配数量清零", profile)
         message = f"之前有 {previous_count} 个币种符合条件\n现在匹配数量已降为 0"
-        return self.send_notification(title, message, timeout=15)
+        return self.send_notification(title, message, timeout=15, kind="zero")
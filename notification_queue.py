@@ -0,0 +1,151 @@
+"""
+通知发送队列模块
+分析线程只负责入队（非阻塞），后台工作线程取出通知后并行发送到各个渠道，
+每个渠道独立重试（指数退避），并记录投递状态
+"""
+import queue
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from threading import Event, Lock, Thread
+
+from metrics_exporter import get_registry
+
+
+class NotificationJob:
+    """一条待发送的通知"""
+
+    def __init__(self, title, message, channels, timeout=10, on_done=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.title = title
+        self.message = message
+        self.timeout = timeout
+        # [(渠道名, 发送函数 send(title, message, timeout) -> bool, 最大尝试次数), ...]
+        self.channels = channels
+        self.created_at = time.time()
+        self.status = {}  # {渠道名: {"success", "attempts", "latency", "error"}}
+        self.done = Event()
+        self.on_done = on_done  # 发送结束后调用 on_done(job)
+
+    @property
+    def success(self):
+        return any(s.get("success") for s in self.status.values())
+
+
+class NotificationDispatcher:
+    def __init__(self, db_file="analysis_history.db", max_workers=4, backoff=2.0, history_size=200):
+        self.db_file = db_file
+        self.backoff = backoff
+        self.queue = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notify")
+        self.history = deque(maxlen=history_size)
+        self.worker = None
+        self.lock = Lock()
+        self.db_manager = None
+
+    def _ensure_worker(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = Thread(target=self._worker_loop, daemon=True)
+                self.worker.start()
+
+    def enqueue(self, title, message, channels, timeout=10, on_done=None):
+        """
+        通知入队，立即返回任务对象
+        :param on_done: 各渠道发送结束后在工作线程中调用 on_done(job)
+        """
+        job = NotificationJob(title, message, channels, timeout, on_done)
+        if not channels:
+            self._finish(job)
+            return job
+        self._ensure_worker()
+        self.queue.put(job)
+        return job
+
+    def pending_count(self):
+        return self.queue.qsize()
+
+    def get_recent_status(self, limit=20):
+        return list(self.history)[-limit:]
+
+    def _worker_loop(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self._dispatch(job)
+            except Exception as e:
+                print(f"[通知] 队列发送异常: {e}")
+            finally:
+                self._finish(job)
+                self.queue.task_done()
+
+    @staticmethod
+    def _finish(job):
+        job.done.set()
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                print(f"[通知] 发送完成回调异常: {e}")
+
+    def _dispatch(self, job):
+        """各渠道并行发送"""
+        queue_delay = time.time() - job.created_at
+        futures = {
+            self.executor.submit(self._deliver, job, name, send, max_attempts): name
+            for name, send, max_attempts in job.channels
+        }
+        wait(futures)
+        for future, name in futures.items():
+            job.status[name] = future.result()
+
+        success_count = sum(1 for s in job.status.values() if s["success"])
+        if success_count > 0:
+            print(f"[通知] 成功发送 {success_count} 种通知")
+        else:
+            print(f"[通知] 所有通知方式均失败")
+
+        self.history.append({
+            "id": job.id,
+            "title": job.title,
+            "created_at": datetime.fromtimestamp(job.created_at).isoformat(),
+            "channels": job.status
+        })
+        self._record_status(job)
+        get_registry().record_notification(job.status, queue_delay)
+
+    def _deliver(self, job, name, send, max_attempts):
+        """单个渠道的发送与重试"""
+        start = time.time()
+        error = None
+        for attempt in range(1, max_attempts + 1):
+            try:
+                if send(job.title, job.message, job.timeout):
+                    return {"success": True, "attempts": attempt, "latency": time.time() - start, "error": None}
+                error = "发送返回失败"
+            except Exception as e:
+                error = str(e)
+            if attempt < max_attempts:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+        return {"success": False, "attempts": max_attempts, "latency": time.time() - start, "error": error}
+
+    def _record_status(self, job):
+        """将投递状态写入数据库"""
+        try:
+            if self.db_manager is None:
+                from database import DatabaseManager
+                self.db_manager = DatabaseManager(self.db_file)
+            self.db_manager.save_notification_log(job.id, job.title, job.created_at, job.status)
+        except Exception as e:
+            print(f"[通知] 记录投递状态失败: {e}")
+
+
+dispatcher_instance = None
+
+def get_dispatcher():
+    global dispatcher_instance
+    if dispatcher_instance is None:
+        dispatcher_instance = NotificationDispatcher()
+    return dispatcher_instance
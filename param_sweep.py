@@ -0,0 +1,166 @@
+"""
+参数扫描模块 - 并行评估 MIN_CHANGE_PERCENT × LIQUIDITY_THRESHOLD_USDT 网格
+主进程从K线归档加载一次数据并计算特征（涨幅、前瞻收益），
+放入 multiprocessing.shared_memory，工作进程直接映射同一块内存，不复制数据；
+参数组合按块分发到 ProcessPoolExecutor，评估逻辑与 backtest.evaluate 相同。
+
+用法:
+    python param_sweep.py --thresholds 50,80,100,150,200 --liquidity 0,500000,1000000,5000000 --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import shared_memory
+
+from backtest import (DEFAULT_HORIZONS, NUMPY_AVAILABLE, compute_features, evaluate,
+                      format_table, load_panel)
+from kline_archive import KlineArchive
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+# 工作进程中映射好的特征数组
+_worker_features = None
+_worker_blocks = []
+
+
+def _flatten(features):
+    """把特征字典展开成 {名称: 数组}，前瞻收益以 short_<h> 命名"""
+    flat = {k: v for k, v in features.items() if k != "short_returns"}
+    for h, values in features["short_returns"].items():
+        flat[f"short_{h}"] = values
+    return flat
+
+
+def _unflatten(flat):
+    features = {k: v for k, v in flat.items() if not k.startswith("short_")}
+    features["short_returns"] = {int(k[len("short_"):]): v for k, v in flat.items() if k.startswith("short_")}
+    return features
+
+
+def _attach(layout):
+    """在工作进程中按布局映射共享内存"""
+    global _worker_features
+    flat = {}
+    for name, (shm_name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=shm_name)
+        _worker_blocks.append(block)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.flags.writeable = False
+        flat[name] = array
+    _worker_features = _unflatten(flat)
+
+
+def _detach():
+    """关闭工作进程中映射的共享内存（只关闭映射，由主进程负责删除）"""
+    global _worker_features
+    _worker_features = None
+    while _worker_blocks:
+        _worker_blocks.pop().close()
+
+
+def _evaluate_chunk(combos, new_signals_only):
+    return [evaluate(_worker_features, th, liq, new_signals_only) for th, liq in combos]
+
+
+class SharedFeatures:
+    """把特征数组复制到共享内存，退出时释放"""
+
+    def __init__(self, features):
+        self.blocks = []
+        self.layout = {}
+        try:
+            for name, values in _flatten(features).items():
+                values = np.ascontiguousarray(values)
+                block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                self.blocks.append(block)
+                np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+                self.layout[name] = (block.name, values.shape, values.dtype.str)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def run_sweep(grid, archive=None, archive_dir="kline_archive", symbols=None, start=None, end=None,
+              horizons=DEFAULT_HORIZONS, workers=None, new_signals_only=True):
+    """
+    并行执行参数扫描
+    :param grid: {"MIN_CHANGE_PERCENT": [...], "LIQUIDITY_THRESHOLD_USDT": [...]}
+    :param workers: 进程数，默认 CPU 核数；为 1 时在当前进程内执行
+    :return: 按 (阈值, 流动性) 排序的结果列表，每项同 backtest.evaluate 的返回值
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("参数扫描需要安装 NumPy: pip install numpy")
+
+    archive = archive or KlineArchive(archive_dir)
+    features = compute_features(load_panel(archive, symbols, start, end), horizons)
+    combos = list(product(grid.get("MIN_CHANGE_PERCENT", [100.0]),
+                          grid.get("LIQUIDITY_THRESHOLD_USDT", [0])))
+    workers = min(workers or os.cpu_count() or 1, len(combos)) or 1
+
+    if workers == 1:
+        return [evaluate(features, th, liq, new_signals_only) for th, liq in combos]
+
+    # 每个进程分到约4块，兼顾负载均衡和调度开销
+    chunk_size = max(1, len(combos) // (workers * 4))
+    results = []
+    with SharedFeatures(features) as shared:
+        del features
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(shared.layout,)) as executor:
+            futures = [executor.submit(_evaluate_chunk, chunk, new_signals_only)
+                       for chunk in _chunks(combos, chunk_size)]
+            for future in futures:
+                results.extend(future.result())
+    return results
+
+
+def _parse_list(text, cast=float):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MIN_CHANGE_PERCENT × LIQUIDITY_THRESHOLD_USDT 并行参数扫描")
+    parser.add_argument("--archive", default="kline_archive", help="K线归档目录")
+    parser.add_argument("--thresholds", default="50,80,100,120,150,200,300", help="涨幅阈值(%%)，逗号分隔")
+    parser.add_argument("--liquidity", default="0,500000,1000000,5000000,10000000", help="流动性阈值(USDT)，逗号分隔")
+    parser.add_argument("--horizons", default=",".join(str(h) for h in DEFAULT_HORIZONS), help="持有天数，逗号分隔")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认CPU核数")
+    parser.add_argument("--all-signals", action="store_true", help="连续达标的每一天都计为信号")
+    args = parser.parse_args()
+
+    horizons = _parse_list(args.horizons, int)
+    start = time.time()
+    rows = run_sweep(
+        {"MIN_CHANGE_PERCENT": _parse_list(args.thresholds),
+         "LIQUIDITY_THRESHOLD_USDT": _parse_list(args.liquidity)},
+        archive_dir=args.archive,
+        horizons=horizons,
+        workers=args.workers,
+        new_signals_only=not args.all_signals
+    )
+    print(format_table(rows, horizons))
+    print(f"共 {len(rows)} 组参数，耗时 {time.time() - start:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
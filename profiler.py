@@ -0,0 +1,103 @@
+"""
+扫描性能剖析模块
+用 cProfile + tracemalloc 包装一次运行，输出：
+- .pstats 文件（可用 snakeviz / flameprof / gprof2dot 等工具生成火焰图）
+- 文本报告（按累计耗时排序的热点函数 + 内存分配最多的代码行）
+cProfile 只记录启用它的线程，工作线程中的任务用 WorkerProfiles 包装后各自剖析，结束时合并到同一份统计
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from threading import Lock
+
+
+class WorkerProfiles:
+    """收集工作线程中各任务的剖析数据"""
+
+    def __init__(self):
+        self.profiles = []
+        self.lock = Lock()
+
+    def wrap(self, func):
+        """包装在工作线程中执行的函数；当前线程已在剖析中（如主线程）时直接执行"""
+        def profiled(*args, **kwargs):
+            if sys.getprofile() is not None:
+                return func(*args, **kwargs)
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                with self.lock:
+                    self.profiles.append(profile)
+        return profiled
+
+
+def run_profiled(func, output_dir=".", tag="scan", top_n=30, workers=None):
+    """
+    剖析一次函数调用
+    :param workers: WorkerProfiles，其中收集的工作线程剖析数据合并到结果中
+    :return: (函数返回值, 报告字典 {"pstats", "report", "peak_memory", "duration", "worker_profiles"})
+    """
+    os.makedirs(output_dir or ".", exist_ok=True)
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start(10)
+
+    profiler = cProfile.Profile()
+    start = time.time()
+    profiler.enable()
+    try:
+        result = func()
+    finally:
+        profiler.disable()
+        duration = time.time() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if not already_tracing:
+            tracemalloc.stop()
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(output_dir or ".", f"profile_{tag}_{stamp}")
+    pstats_file = base + ".pstats"
+    report_file = base + "_report.txt"
+
+    stats_stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stats_stream)
+    worker_profiles = list(workers.profiles) if workers else []
+    for worker_profile in worker_profiles:
+        stats.add(worker_profile)
+    stats.dump_stats(pstats_file)
+    stats.sort_stats("cumulative").print_stats(top_n)
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    top_allocations = snapshot.statistics("lineno")[:top_n]
+
+    with open(report_file, "w", encoding="utf-8") as f:
+        f.write(f"剖析时间: {stamp}\n")
+        f.write(f"运行耗时: {duration:.2f} 秒\n")
+        f.write(f"内存峰值: {peak / 1024 / 1024:.2f} MB\n")
+        f.write(f"合并工作线程任务: {len(worker_profiles)} 个\n\n")
+        f.write(f"===== 内存分配 Top {top_n}（按代码行）=====\n")
+        for stat in top_allocations:
+            frame = stat.traceback[0]
+            f.write(f"{stat.size / 1024:10.1f} KB  {stat.count:8d} 次  {frame.filename}:{frame.lineno}\n")
+        f.write(f"\n===== 热点函数 Top {top_n}（按累计耗时）=====\n")
+        f.write(stats_stream.getvalue())
+
+    return result, {
+        "pstats": pstats_file,
+        "report": report_file,
+        "peak_memory": peak,
+        "duration": duration,
+        "worker_profiles": len(worker_profiles)
+    }
@@ -0,0 +1,100 @@
+"""
+进程内请求合并（single-flight）与短时缓存模块
+手动分析和定时服务同时扫描时，相同的请求（exchangeInfo、24小时行情、同一交易对的K线）
+只会真正发出一次：
+- 同一个 key 正在请求中时，其他线程等待并共享这次请求的结果（或异常）
+- 请求成功后结果在 ttl 秒内直接复用
+"""
+import time
+from threading import Event, Lock
+
+
+class _Call:
+    def __init__(self):
+        self.event = Event()
+        self.value = None
+        self.error = None
+
+
+class RequestCache:
+    def __init__(self, max_entries=2000):
+        self.max_entries = max_entries
+        self.lock = Lock()
+        self.inflight = {}  # {key: _Call}
+        self.memo = {}  # {key: (过期时间, 值)}
+        self.stats = {"calls": 0, "memo_hits": 0, "shared": 0}
+
+    def do(self, key, fn, ttl=0):
+        """
+        执行 fn() 并按 key 合并/缓存
+        :param key: 可哈希的请求标识
+        :param ttl: 结果缓存秒数，0 表示只合并并发请求、不缓存
+        :return: (结果, 是否复用了其他调用的结果)
+        """
+        now = time.monotonic()
+        with self.lock:
+            cached = self.memo.get(key)
+            if cached is not None:
+                if cached[0] > now:
+                    self.stats["memo_hits"] += 1
+                    return cached[1], True
+                del self.memo[key]
+
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.inflight[key] = call
+                self.stats["calls"] += 1
+            else:
+                self.stats["shared"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+                if call.error is None and ttl > 0:
+                    self._store(key, call.value, time.monotonic() + ttl)
+            call.event.set()
+        return call.value, False
+
+    def _store(self, key, value, expires):
+        if len(self.memo) >= self.max_entries:
+            # 先清理过期项，仍然超限时丢弃最早过期的一半
+            now = time.monotonic()
+            for k in [k for k, (exp, _) in self.memo.items() if exp <= now]:
+                del self.memo[k]
+            if len(self.memo) >= self.max_entries:
+                ordered = sorted(self.memo, key=lambda k: self.memo[k][0])
+                for k in ordered[:len(ordered) // 2 + 1]:
+                    del self.memo[k]
+        self.memo[key] = (expires, value)
+
+    def invalidate(self, key=None):
+        """清除指定 key 的缓存，key 为 None 时清空全部"""
+        with self.lock:
+            if key is None:
+                self.memo.clear()
+            else:
+                self.memo.pop(key, None)
+
+
+cache_instance = None
+_instance_lock = Lock()
+
+def get_request_cache():
+    global cache_instance
+    with _instance_lock:
+        if cache_instance is None:
+            cache_instance = RequestCache()
+        return cache_instance
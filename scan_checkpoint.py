@@ -0,0 +1,126 @@
+"""
+扫描断点模块 - 可恢复的分析
+分析过程中每处理 N 个币种把待扫描列表、已处理数量和部分结果写入 SQLite，
+进程被系统杀掉后重新启动时，如果断点仍未过期，就从断点处继续同一次扫描，
+不必重新请求 exchangeInfo、24小时行情和已处理过的K线
+"""
+import hashlib
+import json
+import sqlite3
+import time
+
+
+def make_scan_key(config, symbols=None):
+    """扫描标识：分析配置和交易对范围都相同时才视为同一次扫描"""
+    payload = json.dumps([sorted(config.items()), symbols], ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ScanCheckpoint:
+    def __init__(self, db_file="analysis_history.db"):
+        self.db_file = db_file
+        self.init_table()
+
+    def init_table(self):
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_checkpoint (
+                scan_key TEXT PRIMARY KEY,
+                start_time TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                symbols_json TEXT NOT NULL,
+                processed INTEGER NOT NULL,
+                results_json TEXT NOT NULL,
+                near_json TEXT NOT NULL,
+                evaluated_json TEXT,
+                volumes_json TEXT
+            )
+        """)
+        # 已处理币种的涨幅（用于涨幅历史）和24小时成交额（用于流动性过滤），兼容旧版本
+        cursor.execute("PRAGMA table_info(scan_checkpoint)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if "evaluated_json" not in columns:
+            cursor.execute("ALTER TABLE scan_checkpoint ADD COLUMN evaluated_json TEXT")
+        if "volumes_json" not in columns:
+            cursor.execute("ALTER TABLE scan_checkpoint ADD COLUMN volumes_json TEXT")
+        conn.commit()
+        conn.close()
+
+    def save(self, scan_key, start_time, symbols, processed, results, near_symbols, evaluated=None,
+             quote_volumes=None):
+        """
+        保存断点
+        :param symbols: 本次扫描的完整交易对列表（按扫描顺序）
+        :param processed: 已处理的交易对数量
+        :param evaluated: 已处理币种的涨幅 [[symbol, gain_1d, gain_2d, gain_3d], ...]
+        :param quote_volumes: 本次扫描各交易对的24小时成交额 {symbol: quote_volume}
+        """
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO scan_checkpoint
+                (scan_key, start_time, updated_at, symbols_json, processed, results_json, near_json, evaluated_json,
+                 volumes_json)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                scan_key, start_time, time.time(),
+                json.dumps(symbols), processed,
+                json.dumps(results, ensure_ascii=False), json.dumps(near_symbols), json.dumps(evaluated or []),
+                json.dumps(quote_volumes or {})
+            ))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"保存扫描断点失败: {e}")
+            return False
+
+    def load(self, scan_key, max_age):
+        """读取未过期的断点，过期的断点直接删除"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT start_time, updated_at, symbols_json, processed, results_json, near_json, evaluated_json,
+                       volumes_json
+                FROM scan_checkpoint WHERE scan_key = ?
+            """, (scan_key,))
+            row = cursor.fetchone()
+            conn.close()
+        except Exception as e:
+            print(f"读取扫描断点失败: {e}")
+            return None
+
+        if not row:
+            return None
+        if time.time() - row[1] > max_age:
+            self.clear(scan_key)
+            return None
+        return {
+            "start_time": row[0],
+            "updated_at": row[1],
+            "symbols": json.loads(row[2]),
+            "processed": row[3],
+            "results": json.loads(row[4]),
+            "near_symbols": json.loads(row[5]),
+            "evaluated": json.loads(row[6]) if row[6] else [],
+            "quote_volumes": json.loads(row[7]) if row[7] else {}
+        }
+
+    def clear(self, scan_key=None):
+        """删除指定断点，scan_key 为 None 时删除全部"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            if scan_key is None:
+                cursor.execute("DELETE FROM scan_checkpoint")
+            else:
+                cursor.execute("DELETE FROM scan_checkpoint WHERE scan_key = ?", (scan_key,))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"删除扫描断点失败: {e}")
+            return False
@@ -0,0 +1,63 @@
+"""
+命中结果评分与排序模块
+每个命中币种计算三项指标，加权求和得到综合评分，结果按评分从高到低排列：
+- max_gain: 1日/2日/3日涨幅中的最大值
+- acceleration: 加速度，今日涨幅减去前两日的平均日涨幅（越大说明涨势越集中在最近）
+- gain_per_volume: 涨幅除以成交额的对数（成交额越小值越大，说明盘口越薄）；
+  成交额设下限并取对数，该项不超过 max_gain，不会让低流动性币种的评分压过涨幅本身
+通知只需要前K名时用堆选择（heapq.nlargest），不对全部结果排序
+"""
+import heapq
+import math
+
+DEFAULT_WEIGHTS = {
+    "max_gain": 1.0,
+    "acceleration": 0.5,
+    "gain_per_volume": 0.1,
+}
+
+# gain_per_volume 的成交额下限（USDT）：低于下限按下限计算，此时该项等于 max_gain
+VOLUME_FLOOR = 10_000
+
+
+def compute_scores(gains, quote_volume=None):
+    """
+    计算各项评分指标
+    :param gains: {"gain_1d", "gain_2d", "gain_3d"}
+    :param quote_volume: 24小时成交额（USDT），未知时 gain_per_volume 为0
+    """
+    gain_1d = gains["gain_1d"]
+    max_gain = max(gain_1d, gains["gain_2d"], gains["gain_3d"])
+    # 前两日累计涨幅：(1 + 三日涨幅) / (1 + 今日涨幅) - 1
+    previous_2d = (1 + gains["gain_3d"]) / (1 + gain_1d) - 1 if gain_1d > -1 else 0.0
+    return {
+        "max_gain": max_gain,
+        "acceleration": gain_1d - previous_2d / 2,
+        # 成交额每增加10倍分母加1：1万 → max_gain，100万 → max_gain / 3，1000万 → max_gain / 4
+        "gain_per_volume": max_gain / math.log10(max(quote_volume, VOLUME_FLOOR) / (VOLUME_FLOOR / 10))
+                           if quote_volume else 0.0,
+    }
+
+
+def total_score(scores, weights=None):
+    weights = weights or DEFAULT_WEIGHTS
+    return sum(scores.get(name, 0.0) * weight for name, weight in weights.items())
+
+
+def result_score(result):
+    """结果的综合评分；旧记录没有评分时使用最大涨幅"""
+    score = result.get("score")
+    if score is not None:
+        return score
+    return max(result.get("gain_1d") or 0, result.get("gain_2d") or 0, result.get("gain_3d") or 0)
+
+
+def sort_results(results):
+    """按评分从高到低排序（原地排序并返回）"""
+    results.sort(key=result_score, reverse=True)
+    return results
+
+
+def top_k(results, k):
+    """评分最高的前 k 个结果（堆选择，O(n log k)）"""
+    return heapq.nlargest(k, results, key=result_score)
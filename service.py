@@ -1,18 +1,40 @@
 """
 后台定时服务
 """
+import os
 import time
-from threading import Thread
+from threading import Thread, Event
 from analysis_core import BinanceAnalyzer
 from database import DatabaseManager
 from notification_manager import NotificationManager
 from config_manager import ConfigManager
+from watchlist import WatchlistManager
+from symbol_state import SymbolStateTracker
+from scan_checkpoint import ScanCheckpoint
+from metrics_exporter import MetricsExporter, get_registry
+from job_manager import get_job_manager, scan_spec
+from scoring import sort_results
+from gain_history import GainHistoryStore
 
 class AnalysisService:
-    def __init__(self):
+    def __init__(self, db_file="analysis_history.db"):
         self.config_manager = ConfigManager()
-        self.db_manager = DatabaseManager()
+        self.db_manager = DatabaseManager(db_file)
         self.notif_manager = NotificationManager()
+        self.watchlist = WatchlistManager()
+        self.last_watchlist_scan = 0
+        self.state_tracker = SymbolStateTracker(self.db_manager.db_file)
+        self.profile_trackers = {}  # 非主扫描方案的状态跟踪器 {方案名称: SymbolStateTracker}
+        self.checkpoint = ScanCheckpoint(self.db_manager.db_file)
+        self.gain_history = GainHistoryStore(self.db_manager.db_file)
+        self.last_gain_prune = 0
+        self.warmup_done = Event()
+        self.warmup_thread = None
+        self.warmup_report = None
+        self.metrics_registry = get_registry()
+        self.metrics_exporter = None
+        self.next_run_target = None
+        self.current_job = None
         self.is_running = False
         self.thread = None
         self.wake_lock = None
@@ -28,6 +50,12 @@ class AnalysisService:
         # 尝试获取WakeLock
         self._acquire_wakelock()
         
+        # 后台预热，首次定时分析前完成
+        self.start_warmup()
+        
+        # 可选：启动指标导出端点
+        self._start_metrics_exporter()
+        
         self.is_running = True
         self.thread = Thread(target=self._service_loop, daemon=True)
         self.thread.start()
@@ -39,19 +67,67 @@ class AnalysisService:
             return False
         
         self.is_running = False
+        # 放弃服务正在等待的扫描：只有服务自己在等待时才真正取消，
+        # 手动分析加入了服务的扫描、或服务加入了手动分析时，该扫描继续进行
+        if self.current_job:
+            self.current_job.cancel()
         if self.thread:
             self.thread.join(timeout=5)
         
         # 释放WakeLock
         self._release_wakelock()
         
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
+        
         print("后台服务已停止")
         return True
     
+    def _start_metrics_exporter(self):
+        if not self.config_manager.get("metrics_enabled", False) or self.metrics_exporter:
+            return
+        try:
+            self.metrics_exporter = MetricsExporter(
+                self.metrics_registry, port=self.config_manager.get("metrics_port", 9108)
+            )
+            self.metrics_exporter.start()
+        except Exception as e:
+            self.metrics_exporter = None
+            self._log(f"[定时服务] 指标服务启动失败: {str(e)[:100]}")
+    
+    def start_warmup(self):
+        """在后台线程中预热连接和缓存（重复调用时只执行一次）"""
+        if self.warmup_done.is_set() or (self.warmup_thread and self.warmup_thread.is_alive()):
+            return False
+        self.warmup_thread = Thread(target=self._warm_up, daemon=True)
+        self.warmup_thread.start()
+        return True
+    
+    def _warm_up(self):
+        try:
+            analyzer = BinanceAnalyzer(config=self.config_manager.get_analyzer_config(), callback=self._log)
+            report = analyzer.warm_up()
+            self.warmup_report = report
+            
+            parts = [f"{name} {report[name] * 1000:.0f}ms"
+                     for name in ("dns", "connect", "exchange_info", "kline_archive") if name in report]
+            self._log(f"[预热] 完成，总耗时 {report['total']:.2f} 秒 ({', '.join(parts)})")
+            for name in ("dns_error", "connect_error", "kline_archive_error"):
+                if name in report:
+                    self._log(f"[预热] {name}: {report[name][:100]}")
+        except Exception as e:
+            self._log(f"[预热] 出错: {str(e)[:100]}")
+        finally:
+            self.warmup_done.set()
+    
     def _service_loop(self):
         import datetime
         self._log("[定时服务] 已启动 - 24小时保活模式")
         
+        # 等待预热完成，避免首次分析与预热重复拉取
+        self.warmup_done.wait(timeout=60)
+        
         last_heartbeat = datetime.datetime.now()
         heartbeat_interval = 300  # 每5分钟打印一次心跳
         wakelock_interval = 300  # 每5分钟续期一次WakeLock
@@ -71,9 +147,14 @@ class AnalysisService:
                 schedule_enabled = self.config_manager.get("schedule_enabled", False)
                 
                 if schedule_enabled:
+                    # 调度延迟：实际开始时间与计划时间之差
+                    if self.next_run_target is not None:
+                        lag = max(0.0, (datetime.datetime.now() - self.next_run_target).total_seconds())
+                        self.metrics_registry.set("scheduler_lag_seconds", lag, "定时分析实际开始时间相对计划时间的延迟")
                     try:
                         self._log("[定时分析] 开始执行...")
-                        self._run_analysis()
+                        self._submit_scan(self._run_analysis, "定时分析",
+                                          on_joined=lambda data: self._handle_analysis(data, joined=True))
                         self._log("[定时分析] 执行完成")
                     except Exception as e:
                         self._log(f"[定时分析] 出错: {str(e)[:100]}")
@@ -103,9 +184,17 @@ class AnalysisService:
                 # 使用更精确的定时机制
                 start_time = datetime.datetime.now()
                 target_time = start_time + datetime.timedelta(seconds=interval)
+                self.next_run_target = target_time
                 
                 while datetime.datetime.now() < target_time and self.is_running:
                     # 每10秒检查一次
+                    remaining = (target_time - datetime.datetime.now()).total_seconds()
+                    if remaining <= 0:
+                        break
+                    
+                    # 间隔期间按分钟级频率重扫观察名单
+                    self._maybe_run_watchlist_scan()
+                    
                     remaining = (target_time - datetime.datetime.now()).total_seconds()
                     if remaining <= 0:
                         break
@@ -142,6 +231,7 @@ class AnalysisService:
             "[定时分析]" in message and ("开始执行" in message or "执行完成" in message or "出错" in message) or
             "[心跳]" in message or
             "[通知]" in message or
+            "[预热]" in message or
             message.startswith("系统就绪") or
             message.startswith("✓ 分析完成") or
             message.startswith("✗ 出错")
@@ -252,33 +342,154 @@ class AnalysisService:
                 print(f"[定时服务] WakeLock续期异常: {e}")
         return False
     
-    def _run_analysis(self):
+    def _submit_scan(self, func, name, symbols=None, on_joined=None):
+        """
+        通过任务管理器执行扫描并等待结束；已有相同规格的扫描（如手动分析）在进行时加入该扫描，
+        结束后用 on_joined(analysis_data) 对其结果执行服务自己的后续处理
+        :param func: func(job)，在任务线程中执行，返回分析结果（取消时为None）
+        """
+        spec = scan_spec(self.config_manager.get_analyzer_config(), symbols)
+        job, created = get_job_manager().submit(spec, func, name)
+        self.current_job = job
+        if not created:
+            self._log(f"[{name}] 已有相同的分析在进行中，等待其完成")
+        
+        job.wait()
+        if self.current_job is job:
+            self.current_job = None
+        if job.state == "failed":
+            raise job.error
+        # 服务已停止（已放弃等待）时不再处理加入的扫描结果
+        if not created and on_joined and self.is_running and job.state == "done" and job.result:
+            on_joined(job.result)
+        return job.result
+    
+    def _run_analysis(self, job=None):
         analyzer_config = self.config_manager.get_analyzer_config()
-        # 创建分析器并传递回调函数，以便显示详细进度
-        analyzer = BinanceAnalyzer(config=analyzer_config, callback=self._log)
+        # 创建分析器并传递回调函数，以便显示详细进度（同时更新任务进度）
+        callback = job.reporter(self._log) if job else self._log
+        analyzer = BinanceAnalyzer(config=analyzer_config, callback=callback)
         
-        analysis_data = analyzer.analyze()
+        # 可选：剖析本次扫描，报告写到数据库文件所在目录
+        analysis_data = analyzer.analyze(
+            profile=self.config_manager.get("profile_scans", False),
+            profile_dir=os.path.dirname(os.path.abspath(self.db_manager.db_file)),
+            cancel_event=job.cancel_event if job else None,
+            checkpoint=self.checkpoint
+        )
         
         # 检查分析数据是否有效
         if analysis_data is None:
             self._log("[定时分析] 分析失败：未返回有效数据")
-            return []
+            return None
+        
+        # 被取消的扫描结果不完整，不保存也不更新状态
+        if analysis_data.get("cancelled"):
+            self._log("[定时分析] 已取消，本次结果不保存")
+            return None
+        
+        if analysis_data.get("resumed_from"):
+            self._log(f"[定时分析] 从断点继续，跳过了 {analysis_data['resumed_from']} 个已完成的币种")
         
+        self._handle_analysis(analysis_data, analyzer_config)
+        return analysis_data
+    
+    def _handle_analysis(self, analysis_data, analyzer_config=None, joined=False):
+        """
+        全量扫描结果的后续处理：保存结果、更新币种状态、发送通知、记录指标和涨幅历史、重建观察名单
+        :param joined: 结果来自加入的其他扫描（如手动分析），该扫描已保存结果、记录涨幅并发送完成通知，这里不再重复
+        """
+        analyzer_config = analyzer_config or self.config_manager.get_analyzer_config()
         results = analysis_data.get("results", [])
-        current_count = len(results)
-        end_time = analysis_data.get("end_time", "")
         duration = analysis_data.get("duration", 0)
         
-        self._log(f"[定时分析] 找到 {current_count} 个币种")
+        self._log(f"[定时分析] 找到 {len(results)} 个币种")
         if duration > 0:
             self._log(f"[定时分析] 分析耗时: {duration:.1f} 秒")
         
-        # 获取上次分析结果
-        last_analysis = self.db_manager.get_latest_analysis()
-        last_count = len(last_analysis["results"]) if last_analysis else 0
+        # 多方案扫描：每个方案单独保存、跟踪状态和通知；主方案最后保存，
+        # 使 get_latest_analysis() 默认返回主方案的结果
+        split = self._split_profiles(analysis_data, analyzer_config)
+        for profile, _, _, tracker in split:
+            # 先初始化所有跟踪器，再写入本次结果
+            self._ensure_state_seeded(tracker, profile)
+        for profile, profile_data, profile_config, tracker in reversed(split):
+            self._process_results(profile_data, profile_config, profile, tracker, joined)
+        self.metrics_registry.record_scan(analysis_data)
+        self._record_gain_history(analysis_data, record=not joined)
+        
+        # 根据本次全量扫描重建观察名单
+        if self.config_manager.get("watchlist_enabled", False):
+            watch_symbols = self.watchlist.update(analysis_data)
+            self.last_watchlist_scan = time.time()
+            self._log(f"[观察名单] 已更新，共 {len(watch_symbols)} 个币种")
+    
+    def _record_gain_history(self, analysis_data, record=True):
+        """追加本次扫描所有币种的涨幅（record 为 False 时只清理），每天清理一次过期记录"""
+        if not self.config_manager.get("gain_history_enabled", True) or analysis_data.get("error"):
+            return
+        if record:
+            self.gain_history.record(analysis_data)
+        if time.time() - self.last_gain_prune > 86400:
+            self.last_gain_prune = time.time()
+            self.gain_history.delete_older_than(self.config_manager.get("gain_history_days", 30))
+    
+    def _get_state_tracker(self, profile=None):
+        """扫描方案对应的状态跟踪器，主方案使用默认跟踪器"""
+        if profile is None:
+            return self.state_tracker
+        tracker = self.profile_trackers.get(profile)
+        if tracker is None:
+            tracker = SymbolStateTracker(self.db_manager.db_file, profile)
+            self.profile_trackers[profile] = tracker
+        return tracker
+    
+    def _split_profiles(self, analysis_data, analyzer_config):
+        """
+        把分析结果拆分为各扫描方案的结果
+        :return: [(方案名称, 分析数据, 分析配置, 状态跟踪器), ...]，第一个为主方案；未配置方案时方案名称为None
+        """
+        profiles = analysis_data.get("profiles")
+        if not profiles:
+            return [(None, analysis_data, analyzer_config, self.state_tracker)]
+        
+        split = []
+        for i, (name, profile) in enumerate(profiles.items()):
+            profile_data = {k: v for k, v in analysis_data.items() if k != "profiles"}
+            profile_data["results"] = profile["results"]
+            profile_data["near_symbols"] = profile["near_symbols"]
+            profile_config = dict(analyzer_config,
+                                  MIN_CHANGE_PERCENT=profile["min_change_percent"],
+                                  LIQUIDITY_THRESHOLD_USDT=profile["liquidity_threshold_usdt"])
+            split.append((name, profile_data, profile_config, self._get_state_tracker(None if i == 0 else name)))
+        return split
+    
+    def _process_results(self, analysis_data, analyzer_config, profile, tracker, joined=False):
+        """
+        保存一个扫描方案的结果，更新其币种状态并发送通知
+        :param joined: 结果已由发起扫描的一方保存并发送过完成通知，只更新状态和发送变化通知
+        """
+        label = f"[定时分析:{profile}]" if profile else "[定时分析]"
+        results = analysis_data.get("results", [])
+        current_count = len(results)
+        end_time = analysis_data.get("end_time", "")
+        if profile:
+            self._log(f"{label} 找到 {current_count} 个币种")
+        
+        # 上次命中数量直接取自状态跟踪器，无需重新读取历史记录
+        last_count = tracker.active_count()
+        has_previous = tracker.is_initialized()
         
         # 保存本次分析结果（使用新的数据格式）
-        self.db_manager.save_analysis(analysis_data, analyzer_config)
+        if not joined:
+            db_start = time.time()
+            self.db_manager.save_analysis(analysis_data, analyzer_config, profile)
+            self.metrics_registry.observe("db_write_seconds", time.time() - db_start, "分析结果写入数据库耗时")
+        
+        # 增量更新每个币种的状态（分析出错时保留原状态）
+        transitions = None
+        if not analysis_data.get("error"):
+            transitions = tracker.update(results, end_time or None)
         
         # 通知逻辑：
         # 1. 当前结果为0 且 上次也是0 -> 不通知
@@ -304,56 +515,98 @@ class AnalysisService:
             self._log(f"[通知逻辑] 找到 {current_count} 个币种，将发送通知")
         
         # 发送通知
-        if should_notify and self.config_manager.get("notify_on_complete", True):
-            self._log("[定时分析] 准备发送完成通知...")
+        if should_notify and not joined and self.config_manager.get("notify_on_complete", True):
+            self._log(f"{label} 准备发送完成通知...")
             
             if notify_type == "zero_from_nonzero":
                 # 发送特殊的"清零"通知
-                result = self.notif_manager.notify_zero_result(last_count)
+                result = self.notif_manager.notify_zero_result(last_count, profile)
             else:
                 # 正常通知
-                result = self.notif_manager.notify_analysis_complete(current_count, results)
+                result = self.notif_manager.notify_analysis_complete(current_count, results, profile)
             
-            self._log(f"[定时分析] 通知发送{'成功' if result else '失败'}")
+            self._log(f"{label} 通知{'已加入发送队列' if result else '未发送（无可用渠道或内容未变化）'}")
         
         # 检测变化通知（仅当两次都有结果时）
-        if last_analysis and self.config_manager.get("notify_on_change", True):
-            if current_count > 0 and last_count > 0:
-                comparison = self.db_manager.compare_results(
-                    last_analysis["results"],
-                    results
-                )
-                
-                if comparison["has_changes"]:
-                    self._log(f"[定时分析] 检测到变化: +{len(comparison['new'])} -{len(comparison['removed'])}")
-                    
-                    # 准备币种详细信息
-                    new_coins = []
-                    removed_coins = []
-                    
-                    # 新增币种（包含涨幅信息）
-                    for symbol in comparison["new"]:
-                        # 从当前结果中获取涨幅信息
-                        for result in results:
-                            if result.get("symbol") == symbol:
-                                # 直接使用result中的涨幅数据
-                                new_coins.append({
-                                    "symbol": symbol,
-                                    "changes": {
-                                        "1d": result.get("gain_1d", 0) * 100 if result.get("gain_1d") is not None else 0,
-                                        "2d": result.get("gain_2d", 0) * 100 if result.get("gain_2d") is not None else 0,
-                                        "3d": result.get("gain_3d", 0) * 100 if result.get("gain_3d") is not None else 0
-                                    }
-                                })
-                                break
-                    
-                    # 移除币种
-                    for symbol in comparison["removed"]:
-                        removed_coins.append({"symbol": symbol})
-                    
-                    self.notif_manager.notify_changes_detected(new_coins, removed_coins)
+        if has_previous and transitions and self.config_manager.get("notify_on_change", True):
+            if current_count > 0 and last_count > 0 and transitions["has_changes"]:
+                self._notify_transitions(transitions, profile)
+    
+    def _maybe_run_watchlist_scan(self):
+        """到达观察名单重扫间隔时执行一次快速扫描"""
+        if not self.config_manager.get("watchlist_enabled", False):
+            return
+        
+        interval = self.config_manager.get("watchlist_interval", 60)
+        if time.time() - self.last_watchlist_scan < interval:
+            return
+        
+        self.last_watchlist_scan = time.time()
+        if not self.watchlist.get_symbols():
+            return
+        
+        try:
+            self._submit_scan(self._run_watchlist_scan, "观察名单", self.watchlist.get_symbols())
+        except Exception as e:
+            self._log(f"[观察名单] 扫描出错: {str(e)[:100]}")
+    
+    def _run_watchlist_scan(self, job=None):
+        """只重新拉取观察名单内币种的K线，发现新命中时立即通知"""
+        symbols = self.watchlist.get_symbols()
+        self._log(f"[观察名单] 开始重扫 {len(symbols)} 个币种")
+        
+        analyzer_config = self.config_manager.get_analyzer_config()
+        callback = job.reporter(self._log) if job else self._log
+        analyzer = BinanceAnalyzer(config=analyzer_config, callback=callback)
+        analysis_data = analyzer.analyze(symbols=symbols, cancel_event=job.cancel_event if job else None,
+                                         quote_volumes=self.watchlist.get_quote_volumes())
+        if analysis_data is None or analysis_data.get("error") or analysis_data.get("cancelled"):
+            return None
+        
+        results = analysis_data.get("results", [])
+        
+        # 部分扫描：只有观察名单内的币种可能被判定为退出
+        for profile, profile_data, _, tracker in self._split_profiles(analysis_data, analyzer_config):
+            self._ensure_state_seeded(tracker, profile)
+            transitions = tracker.update(profile_data["results"], analysis_data.get("end_time"), scanned_symbols=symbols)
+            if transitions["has_changes"] and self.config_manager.get("notify_on_change", True):
+                self._notify_transitions(transitions, profile)
+        self._record_gain_history(analysis_data)
+        self.watchlist.update(analysis_data)
+        self._log(f"[观察名单] 重扫完成，命中 {len(results)} 个")
+        
+        return analysis_data
+    
+    def _ensure_state_seeded(self, tracker=None, profile=None):
+        """首次启用状态跟踪时，用该方案最近一次历史结果初始化（仅执行一次）"""
+        tracker = tracker or self.state_tracker
+        if tracker.is_initialized():
+            return
+        # 主方案的跟踪器沿用最近一条记录，其他方案只取自己的记录
+        last_analysis = self.db_manager.get_latest_analysis(None if tracker is self.state_tracker else profile)
+        if last_analysis and last_analysis["results"]:
+            tracker.update(last_analysis["results"], last_analysis.get("end_time"))
+    
+    def _notify_transitions(self, transitions, profile=None):
+        """根据状态变化构建变化通知，只遍历发生变化的币种"""
+        new_results = sort_results(transitions["entered"] + transitions["reentered"])
+        label = f"[定时分析:{profile}]" if profile else "[定时分析]"
+        self._log(f"{label} 检测到变化: +{len(new_results)} -{len(transitions['exited'])}")
+        
+        new_coins = []
+        for result in new_results:
+            new_coins.append({
+                "symbol": result["symbol"],
+                "changes": {
+                    "1d": result.get("gain_1d", 0) * 100 if result.get("gain_1d") is not None else 0,
+                    "2d": result.get("gain_2d", 0) * 100 if result.get("gain_2d") is not None else 0,
+                    "3d": result.get("gain_3d", 0) * 100 if result.get("gain_3d") is not None else 0
+                }
+            })
+        
+        removed_coins = [{"symbol": state["symbol"]} for state in transitions["exited"]]
         
-        return results
+        return self.notif_manager.notify_changes_detected(new_coins, removed_coins, profile)
 
 service_instance = None
 
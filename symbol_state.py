@@ -0,0 +1,195 @@
+"""
+币种状态跟踪模块 - 增量结果对比
+为每个币种维护持久化状态（进入 / 持续 / 退出 / 再次进入），记录首次出现时间和峰值涨幅，
+每轮分析只处理发生变化的币种，无需重新读取历史记录
+"""
+import hashlib
+import sqlite3
+from datetime import datetime
+
+STATE_IN = "in"
+STATE_OUT = "out"
+
+
+class SymbolStateTracker:
+    def __init__(self, db_file="analysis_history.db", profile=None):
+        """
+        :param profile: 扫描方案名称，每个方案使用独立的状态表；为None时使用默认表（主方案）
+        """
+        self.db_file = db_file
+        self.profile = profile
+        self.table = self.table_name(profile)
+        self.active = None  # 当前处于命中状态的币种 {symbol: state}，首次使用时从数据库加载
+        self.init_table()
+
+    @staticmethod
+    def table_name(profile=None):
+        """方案名称可能包含任意字符，表名使用其哈希"""
+        if profile is None:
+            return "symbol_state"
+        return "symbol_state_" + hashlib.sha1(profile.encode("utf-8")).hexdigest()[:10]
+
+    def init_table(self):
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                symbol TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                first_seen TEXT NOT NULL,
+                last_entered TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                exited_at TEXT,
+                enter_count INTEGER NOT NULL DEFAULT 1,
+                peak_gain REAL NOT NULL DEFAULT 0,
+                gain_1d REAL,
+                gain_2d REAL,
+                gain_3d REAL
+            )
+        """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_state ON {self.table}(state)")
+        conn.commit()
+        conn.close()
+
+    def _load_active(self):
+        if self.active is not None:
+            return self.active
+
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {self.table} WHERE state = ?", (STATE_IN,))
+        self.active = {row["symbol"]: dict(row) for row in cursor.fetchall()}
+        conn.close()
+        return self.active
+
+    def is_initialized(self):
+        """是否已有任何状态记录（用于区分首次运行）"""
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT 1 FROM {self.table} LIMIT 1")
+        row = cursor.fetchone()
+        conn.close()
+        return row is not None
+
+    def active_count(self):
+        return len(self._load_active())
+
+    def active_symbols(self):
+        return set(self._load_active().keys())
+
+    def get_state(self, symbol):
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {self.table} WHERE symbol = ?", (symbol,))
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _peak(result):
+        return max(result.get("gain_1d") or 0, result.get("gain_2d") or 0, result.get("gain_3d") or 0)
+
+    def update(self, results, timestamp=None, scanned_symbols=None):
+        """
+        用本轮命中结果增量更新状态
+        :param results: 本轮命中的结果列表
+        :param timestamp: 本轮时间（ISO格式），默认当前时间
+        :param scanned_symbols: 本轮实际扫描的币种（观察名单等部分扫描），为None表示全量扫描；
+                                只有被扫描到的币种才可能被判定为退出
+        :return: {"entered": [...], "reentered": [...], "still_in": [...], "exited": [...], "has_changes": bool}
+        """
+        timestamp = timestamp or datetime.now().isoformat()
+        active = self._load_active()
+        current = {r["symbol"]: r for r in results}
+
+        entered = []
+        reentered = []
+        still_in = []
+        exited = []
+
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        for symbol, result in current.items():
+            peak = self._peak(result)
+            gains = (result.get("gain_1d"), result.get("gain_2d"), result.get("gain_3d"))
+            state = active.get(symbol)
+
+            if state is not None:
+                # 持续命中：只更新最近时间、峰值和当前涨幅
+                state["peak_gain"] = max(state["peak_gain"], peak)
+                state["last_seen"] = timestamp
+                cursor.execute(f"""
+                    UPDATE {self.table}
+                    SET last_seen = ?, peak_gain = ?, gain_1d = ?, gain_2d = ?, gain_3d = ?
+                    WHERE symbol = ?
+                """, (timestamp, state["peak_gain"]) + gains + (symbol,))
+                still_in.append(symbol)
+                continue
+
+            cursor.execute(f"SELECT * FROM {self.table} WHERE symbol = ?", (symbol,))
+            row = cursor.fetchone()
+            if row is None:
+                state = {
+                    "symbol": symbol, "state": STATE_IN, "first_seen": timestamp,
+                    "last_entered": timestamp, "last_seen": timestamp, "exited_at": None,
+                    "enter_count": 1, "peak_gain": peak
+                }
+                cursor.execute(f"""
+                    INSERT INTO {self.table} (symbol, state, first_seen, last_entered, last_seen,
+                                              enter_count, peak_gain, gain_1d, gain_2d, gain_3d)
+                    VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?)
+                """, (symbol, STATE_IN, timestamp, timestamp, timestamp, peak) + gains)
+                entered.append(result)
+            else:
+                # 曾经退出过，再次进入
+                state = dict(row)
+                state.update({
+                    "state": STATE_IN, "last_entered": timestamp, "last_seen": timestamp,
+                    "enter_count": row["enter_count"] + 1, "peak_gain": max(row["peak_gain"], peak)
+                })
+                cursor.execute(f"""
+                    UPDATE {self.table}
+                    SET state = ?, last_entered = ?, last_seen = ?, enter_count = ?, peak_gain = ?,
+                        gain_1d = ?, gain_2d = ?, gain_3d = ?
+                    WHERE symbol = ?
+                """, (STATE_IN, timestamp, timestamp, state["enter_count"], state["peak_gain"]) + gains + (symbol,))
+                reentered.append(result)
+
+            active[symbol] = state
+
+        scanned = set(scanned_symbols) if scanned_symbols is not None else None
+        for symbol in list(active.keys()):
+            if symbol in current:
+                continue
+            if scanned is not None and symbol not in scanned:
+                continue
+            state = active.pop(symbol)
+            state["state"] = STATE_OUT
+            state["exited_at"] = timestamp
+            cursor.execute(
+                f"UPDATE {self.table} SET state = ?, exited_at = ? WHERE symbol = ?",
+                (STATE_OUT, timestamp, symbol)
+            )
+            exited.append(state)
+
+        conn.commit()
+        conn.close()
+
+        return {
+            "entered": entered,
+            "reentered": reentered,
+            "still_in": still_in,
+            "exited": exited,
+            "has_changes": bool(entered or reentered or exited)
+        }
+
+    def reset(self):
+        conn = sqlite3.connect(self.db_file)
+        conn.execute(f"DELETE FROM {self.table}")
+        conn.commit()
+        conn.close()
+        self.active = {}
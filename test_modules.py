@@ -3,6 +3,7 @@
 """
 import sys
 import os
+import time
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
@@ -12,7 +13,7 @@ print("=" * 60)
 print()
 
 # 测试1: 配置管理
-print("[1/5] 测试配置管理模块...")
+print("[1/31] 测试配置管理模块...")
 try:
     from config_manager import ConfigManager
     cm = ConfigManager()
@@ -23,7 +24,7 @@ except Exception as e:
     print(f"✗ ConfigManager 测试失败: {e}")
 
 # 测试2: 数据库管理
-print("[2/5] 测试数据库管理模块...")
+print("[2/31] 测试数据库管理模块...")
 try:
     from database import DatabaseManager
     db = DatabaseManager("test_db.db")
@@ -56,7 +57,7 @@ except Exception as e:
         os.remove("test_db.db")
 
 # 测试3: 通知管理
-print("[3/5] 测试通知管理模块...")
+print("[3/31] 测试通知管理模块...")
 try:
     from notification_manager import NotificationManager
     nm = NotificationManager()
@@ -66,7 +67,7 @@ except Exception as e:
     print(f"✗ NotificationManager 测试失败: {e}")
 
 # 测试4: 分析核心
-print("[4/5] 测试分析核心模块...")
+print("[4/31] 测试分析核心模块...")
 try:
     from analysis_core import BinanceAnalyzer
     
@@ -94,7 +95,8 @@ except Exception as e:
     print(f"✗ BinanceAnalyzer 测试失败: {e}")
 
 # 测试5: 后台服务
-print("[5/5] 测试后台服务模块...")
+print("[5/31] 测试后台服务模块...")
+service_db_existed = os.path.exists("analysis_history.db")
 try:
     from service import AnalysisService, get_service
     
@@ -109,6 +111,1150 @@ try:
     print("✓ AnalysisService 测试通过")
 except Exception as e:
     print(f"✗ AnalysisService 测试失败: {e}")
+finally:
+    if not service_db_existed and os.path.exists("analysis_history.db"):
+        os.remove("analysis_history.db")
+
+# 以下测试使用内存数据源 FakeSource，不访问网络
+def make_klines(gain_1d, quote_volume, days=3):
+    """生成日K线：前几日持平，最后一日涨 gain_1d"""
+    day = 86_400_000
+    klines = []
+    for i in range(days):
+        close = 1 + gain_1d if i == days - 1 else 1.0
+        klines.append({"open_time": i * day, "open": 1.0, "high": max(1.0, close), "low": 1.0, "close": close,
+                       "volume": quote_volume, "close_time": (i + 1) * day - 1, "quote_volume": quote_volume,
+                       "count": 1})
+    return klines
+
+
+def fake_config(sources, **overrides):
+    """分析配置：sources 为 {数据源名称: FakeSource 构造参数}，关闭扩展指标和请求缓存"""
+    from analysis_core import BinanceAnalyzer
+    config = BinanceAnalyzer()._default_config()
+    config.update({
+        "DATA_SOURCES": list(sources),
+        "SOURCE_OPTIONS": {name: dict(options, type="fake") for name, options in sources.items()},
+        "REQUEST_CACHE_TTL": 0,
+        "CACHE_EXPIRY": 0,
+        "ENRICH_RESULTS": False,
+        "MIN_CHANGE_PERCENT": 100.0,
+    })
+    config.update(overrides)
+    return config
+
+
+def remove_files(*paths):
+    for path in paths:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+# 测试6: 扫描方案的流动性过滤
+print("[6/31] 测试扫描方案流动性过滤...")
+try:
+    from analysis_core import BinanceAnalyzer
+    klines = {"THINUSDT": make_klines(1.5, 10), "BIGUSDT": make_klines(1.5, 10_000_000)}
+    config = fake_config({"fake": {"klines": klines}}, SCAN_PROFILES=[
+        {"name": "strict", "LIQUIDITY_THRESHOLD_USDT": 5_000_000},
+        {"name": "loose", "LIQUIDITY_THRESHOLD_USDT": 0},
+    ])
+
+    def hits(data, profile):
+        return sorted(r["symbol"] for r in data["profiles"][profile]["results"])
+
+    # 全量扫描：按24小时成交额过滤
+    data = BinanceAnalyzer(config=config, callback=lambda m, p=None: None).analyze()
+    assert hits(data, "strict") == ["BIGUSDT"]
+    assert hits(data, "loose") == ["BIGUSDT", "THINUSDT"]
+
+    # 观察名单收录所有方案的命中和接近阈值的币种（含只有非主方案命中的低流动性币种）
+    import tempfile
+    from watchlist import WatchlistManager
+    klines["NEARUSDT"] = make_klines(0.9, 10)
+    data = BinanceAnalyzer(config=config, callback=lambda m, p=None: None).analyze()
+    assert data["profiles"]["loose"]["near_symbols"] == ["NEARUSDT"] and not data["near_symbols"]
+    watchlist_file = os.path.join(tempfile.mkdtemp(), "watchlist_cache.json")
+    watchlist = WatchlistManager(watchlist_file)
+    assert sorted(watchlist.update(data)) == ["BIGUSDT", "NEARUSDT", "THINUSDT"]
+    assert WatchlistManager(watchlist_file).get_quote_volumes() == {"BIGUSDT": 10_000_000, "NEARUSDT": 10,
+                                                                   "THINUSDT": 10}
+    remove_files(watchlist_file)
+    os.rmdir(os.path.dirname(watchlist_file))
+    del klines["NEARUSDT"]
+
+    # 观察名单模式：没有24小时成交额时按今日K线成交额过滤
+    data = BinanceAnalyzer(config=config, callback=lambda m, p=None: None).analyze(symbols=list(klines))
+    assert hits(data, "strict") == ["BIGUSDT"]
+    assert hits(data, "loose") == ["BIGUSDT", "THINUSDT"]
+
+    # 观察名单模式：使用随观察名单保存的24小时成交额
+    data = BinanceAnalyzer(config=config, callback=lambda m, p=None: None).analyze(
+        symbols=list(klines), quote_volumes={"THINUSDT": 9_000_000})
+    assert hits(data, "strict") == ["BIGUSDT", "THINUSDT"]
+    assert data["quote_volumes"] == {"THINUSDT": 9_000_000}
+
+    # 成交额未知时跳过有流动性阈值的方案
+    klines["NOVOLUSDT"] = [{k: v for k, v in c.items() if k != "quote_volume"} for c in make_klines(1.5, 0)]
+    data = BinanceAnalyzer(config=config, callback=lambda m, p=None: None).analyze(symbols=["NOVOLUSDT"])
+    assert hits(data, "strict") == [] and hits(data, "loose") == []
+
+    print("✓ 扫描方案流动性过滤 测试通过")
+except Exception as e:
+    print(f"✗ 扫描方案流动性过滤 测试失败: {e}")
+finally:
+    remove_files("exchange_info_cache_fake.json")
+
+# 测试7: 定时服务加入进行中的手动分析
+print("[7/31] 测试定时服务加入手动分析...")
+try:
+    import shutil
+    import tempfile
+    import threading
+    from job_manager import get_job_manager, scan_spec
+    from service import AnalysisService
+    service_dir = tempfile.mkdtemp()
+    svc = AnalysisService(os.path.join(service_dir, "analysis_history.db"))
+    release = threading.Event()
+    manual_data = {"results": [{"symbol": "AUSDT"}], "near_symbols": []}
+
+    def manual_scan(job):
+        release.wait(5)
+        return manual_data
+
+    spec = scan_spec(svc.config_manager.get_analyzer_config())
+    manual_job, created = get_job_manager().submit(spec, manual_scan, "手动分析")
+    assert created
+
+    handled = []
+    svc.is_running = True
+    worker = threading.Thread(target=lambda: handled.append(svc._submit_scan(
+        lambda job: None, "定时分析", on_joined=lambda data: handled.append(("joined", data)))))
+    worker.start()
+    time.sleep(0.1)
+    assert manual_job.joined == 1
+    release.set()
+    worker.join(5)
+    # 加入的扫描结束后执行服务自己的后续处理
+    assert handled == [("joined", manual_data), manual_data]
+    print("✓ 定时服务加入手动分析 测试通过")
+except Exception as e:
+    print(f"✗ 定时服务加入手动分析 测试失败: {e}")
+finally:
+    svc.is_running = False
+    shutil.rmtree(service_dir, ignore_errors=True)
+
+# 测试8: 任务合并与取消
+print("[8/31] 测试任务合并与取消...")
+try:
+    import threading
+    from job_manager import JobManager
+    manager = JobManager(max_concurrent=1)
+    started = threading.Event()
+
+    def cancellable(job):
+        started.set()
+        job.cancel_event.wait(5)
+        return None if job.cancel_event.is_set() else "done"
+
+    first, created = manager.submit(("spec", None), cancellable, "手动分析")
+    second, joined_created = manager.submit(("spec", None), cancellable, "定时分析")
+    assert created and not joined_created and first is second and first.joined == 1
+    started.wait(5)
+
+    # 加入者取消只退出等待，任务继续运行
+    assert second.cancel() and not first.cancel_event.is_set() and first.state == "running"
+    # 最后一个提交者取消时任务才真正取消
+    assert first.cancel() and first.wait(5) and first.state == "cancelled"
+    assert not first.cancel()
+
+    # 排队中的任务：全部提交者取消后从队列移除
+    blocker = threading.Event()
+    running, _ = manager.submit(("block", None), lambda job: blocker.wait(5), "占用")
+    queued, _ = manager.submit(("queued", None), lambda job: "never", "排队")
+    manager.submit(("queued", None), lambda job: "never", "排队")
+    assert queued.state == "queued"
+    assert queued.cancel() and queued.state == "queued"
+    assert queued.cancel() and queued.state == "cancelled" and not manager.queue
+    blocker.set()
+    assert running.wait(5) and running.state == "done"
+    print("✓ JobManager 测试通过")
+except Exception as e:
+    print(f"✗ JobManager 测试失败: {e}")
+
+# 测试9: 多数据源分析
+print("[9/31] 测试多数据源分析...")
+try:
+    from analysis_core import BinanceAnalyzer
+    config = fake_config({
+        "fake": {"klines": {"AUSDT": make_klines(1.5, 5_000_000), "BUSDT": make_klines(0.1, 5_000_000)}},
+        # 第二个数据源限速：每秒20个请求，不允许突发
+        "fake2": {"klines": {"AUSDT": make_klines(2.0, 5_000_000), "XUSDT": make_klines(1.2, 5_000_000),
+                             "YUSDT": make_klines(0.0, 5_000_000)}, "rate": 20, "burst": 1},
+    }, KLINE_BATCH_SIZE=2)
+    analyzer = BinanceAnalyzer(config=config, callback=lambda m, p=None: None)
+    start = time.perf_counter()
+    data = analyzer.analyze()
+    elapsed = time.perf_counter() - start
+
+    # 第二个数据源的交易对带 "数据源:" 前缀，与主数据源的同名交易对区分
+    assert sorted(r["symbol"] for r in data["results"]) == ["AUSDT", "fake2:AUSDT", "fake2:XUSDT"]
+    assert {r["symbol"]: r["source"] for r in data["results"]}["fake2:XUSDT"] == "fake2"
+    assert sorted(s for s, *_ in data["evaluated"]) == ["AUSDT", "BUSDT", "fake2:AUSDT", "fake2:XUSDT", "fake2:YUSDT"]
+
+    # K线按数据源分批获取
+    fake, fake2 = analyzer.sources_by_name["fake"], analyzer.sources_by_name["fake2"]
+    assert fake.calls["get_klines"] == 2 and fake2.calls["get_klines"] == 3
+    assert fake.calls["get_klines_batch"] >= 1 and fake2.calls["get_klines_batch"] >= 2
+    # 限速：第二个数据源的 n 次请求至少耗时 (n - 1) / 20 秒
+    fake2_calls = fake2.calls["list_symbols"] + fake2.calls["get_quote_volumes"] + fake2.calls["get_klines"]
+    assert elapsed >= (fake2_calls - 1) / 20 * 0.9
+
+    # 观察名单模式：带前缀的交易对按数据源解析
+    data = BinanceAnalyzer(config=config, callback=lambda m, p=None: None).analyze(
+        symbols=["fake2:XUSDT", "BUSDT", "AUSDT"])
+    assert [r["symbol"] for r in data["results"]] == ["AUSDT", "fake2:XUSDT"]
+    print("✓ 多数据源分析 测试通过")
+except Exception as e:
+    print(f"✗ 多数据源分析 测试失败: {e}")
+finally:
+    remove_files("exchange_info_cache_fake.json", "exchange_info_cache_fake2.json")
+
+# 测试10: 扫描剖析覆盖K线获取
+print("[10/31] 测试扫描性能剖析...")
+try:
+    import pstats
+    import shutil
+    import tempfile
+    import threading
+    from analysis_core import BinanceAnalyzer
+    profile_dir = tempfile.mkdtemp()
+    config = fake_config({"fake": {"klines": {f"S{i}USDT": make_klines(1.5, 5_000_000) for i in range(8)}}},
+                         KLINE_BATCH_SIZE=4, KLINE_CONCURRENCY=4)
+    analyzer = BinanceAnalyzer(config=config, callback=lambda m, p=None: None)
+    main_thread_calls = []
+    source = analyzer.source
+    get_klines = source.get_klines
+    source.get_klines = lambda *args, **kwargs: (
+        main_thread_calls.append(threading.current_thread() is threading.main_thread()), get_klines(*args, **kwargs))[1]
+    data = analyzer.analyze(profile=True, profile_dir=profile_dir)
+    assert len(data["results"]) == 8 and analyzer.worker_profiles is None
+    # 剖析时按正常并发在工作线程中获取K线，各线程的统计合并后 get_klines 全部出现在报告中
+    assert main_thread_calls == [False] * 8 and data["profile"]["worker_profiles"] == 8
+    stats = pstats.Stats(data["profile"]["pstats"])
+    calls = {func[2]: stat[1] for func, stat in stats.stats.items()}
+    assert calls.get("get_klines") == 8 and calls.get("calculate_gains") == 8
+    print("✓ 扫描性能剖析 测试通过")
+except Exception as e:
+    print(f"✗ 扫描性能剖析 测试失败: {e}")
+finally:
+    remove_files("exchange_info_cache_fake.json")
+    shutil.rmtree(profile_dir, ignore_errors=True)
+
+# 测试11: 命中结果扩展指标
+print("[11/31] 测试命中结果扩展指标...")
+try:
+    from analysis_core import BinanceAnalyzer
+    from funding_cache import get_funding_cache
+    get_funding_cache().invalidate()
+    config = fake_config({
+        "fake": {"klines": {"AUSDT": make_klines(1.5, 5_000_000, days=15), "BUSDT": make_klines(0.1, 5_000_000)},
+                 "premium": {"AUSDT": {"mark_price": 2.5, "funding_rate": -0.001}}, "open_interest": {"AUSDT": 0.3}},
+        "fake2": {"klines": {"XUSDT": make_klines(1.5, 5_000_000)}, "open_interest": {"XUSDT": 0.5}},
+    }, ENRICH_RESULTS=True)
+    analyzer = BinanceAnalyzer(config=config, callback=lambda m, p=None: None)
+    # 第二个数据源没有资金费率和持仓量（如现货）：不发请求，字段为 None
+    fake2 = analyzer.sources_by_name["fake2"]
+    fake2.supports_funding = fake2.supports_open_interest = False
+    results = {r["symbol"]: r for r in analyzer.analyze()["results"]}
+
+    assert results["AUSDT"]["funding_rate"] == -0.001 and results["AUSDT"]["open_interest_change"] == 0.3
+    assert results["AUSDT"]["volume_multiple"] == 1.0 and results["AUSDT"]["atr"] is not None
+    assert results["fake2:XUSDT"]["funding_rate"] is None and results["fake2:XUSDT"]["open_interest_change"] is None
+    assert fake2.calls["get_premium_index"] == 0 and fake2.calls["get_open_interest_change"] == 0
+    # 只对命中币种补充指标
+    assert analyzer.sources_by_name["fake"].calls["get_open_interest_change"] == 1
+    print("✓ ResultEnricher 测试通过")
+except Exception as e:
+    print(f"✗ ResultEnricher 测试失败: {e}")
+finally:
+    remove_files("exchange_info_cache_fake.json", "exchange_info_cache_fake2.json")
+
+# 测试12: 分片队列租约
+print("[12/31] 测试分片队列租约...")
+try:
+    import shutil
+    import tempfile
+    from distributed import ScanQueue
+    queue_dir = tempfile.mkdtemp()
+    queue = ScanQueue(os.path.join(queue_dir, "scan_queue.db"))
+    run_id = queue.create_run({}, ["AUSDT"], 1)
+    shard = queue.claim("w1", run_id)
+    # 租约超时后分片放回队列，被另一个工作者领取
+    assert queue.requeue_expired(run_id, lease=-1) == 1
+    assert queue.claim("w2", run_id)["shard_id"] == shard["shard_id"]
+    # 原工作者的结果和失败记录都不能覆盖新租约
+    assert not queue.complete(run_id, shard["shard_id"], {"results": ["stale"]}, "w1")
+    assert not queue.fail(run_id, shard["shard_id"], "stale", "w1")
+    assert queue.complete(run_id, shard["shard_id"], {"results": []}, "w2")
+    assert queue.progress(run_id) == {"done": 1}
+    assert queue.shard_results(run_id)[0]["result"] == {"results": []}
+    print("✓ ScanQueue 测试通过")
+except Exception as e:
+    print(f"✗ ScanQueue 测试失败: {e}")
+finally:
+    shutil.rmtree(queue_dir, ignore_errors=True)
+
+# 测试13: 多进程分布式扫描
+print("[13/31] 测试多进程/多主机分布式扫描...")
+try:
+    import shutil
+    import tempfile
+    import threading
+    from analysis_core import BinanceAnalyzer
+    from distributed import ScanCoordinator
+    queue_dir = tempfile.mkdtemp()
+    queue_file = os.path.join(queue_dir, "scan_queue.db")
+    klines = {f"S{i:02d}USDT": make_klines(0.5 + i * 0.1, 2_000_000 + i * 100_000) for i in range(20)}
+    config = fake_config({"fake": {"klines": klines}}, SCAN_PROFILES=[
+        {"name": "main", "LIQUIDITY_THRESHOLD_USDT": 3_000_000},
+        {"name": "loose", "MIN_CHANGE_PERCENT": 80.0, "LIQUIDITY_THRESHOLD_USDT": 0},
+    ])
+
+    def summary(data):
+        return [(r["symbol"], r["gain_1d"], r["quote_volume"], r["score"]) for r in data["results"]]
+
+    serial = BinanceAnalyzer(config=config, callback=lambda m, p=None: None).analyze()
+    merged = ScanCoordinator(queue_file, config, callback=lambda m, p=None: None).run(workers=3)
+    assert not merged.get("error") and len(merged["shards"]) == 12
+    assert summary(merged) == summary(serial) and len(serial["results"]) == 10
+    for name in ("main", "loose"):
+        assert summary(merged["profiles"][name]) == summary(serial["profiles"][name])
+        assert merged["profiles"][name]["near_symbols"] == serial["profiles"][name]["near_symbols"]
+    assert sorted(merged["evaluated"]) == sorted(serial["evaluated"])
+
+    # 超时：未完成的分片记为失败，不会一直等待
+    slow = fake_config({"fake": {"klines": klines, "latency": 1}})
+    start = time.time()
+    merged = ScanCoordinator(queue_file, slow, callback=lambda m, p=None: None).run(
+        symbols=list(klines), workers=1, shard_count=4, timeout=0.5)
+    assert merged.get("error") and time.time() - start < 10
+    assert any(s["status"] == "failed" and s["error"] == "等待超时" for s in merged["shards"])
+
+    # 其他主机上的工作者通过租约服务领取分片和提交结果
+    import requests
+    from distributed import LeaseServer, RemoteScanQueue, ScanWorker
+    coordinator = ScanCoordinator(queue_file, config, callback=lambda m, p=None: None)
+    run_id = coordinator.submit(shard_count=4)
+    server = LeaseServer(coordinator.queue, port=0, token="secret")
+    server.start()
+    try:
+        try:
+            RemoteScanQueue(server.url, "wrong").claim("intruder", run_id)
+            assert False, "令牌错误时应拒绝"
+        except requests.exceptions.HTTPError:
+            pass
+        remote_workers = [ScanWorker(server.url, f"remote-{i}", token="secret", callback=lambda m: None)
+                          for i in range(2)]
+        threads = [threading.Thread(target=w.run, args=(run_id,)) for w in remote_workers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert coordinator.wait(run_id, timeout=5)
+        remote = coordinator.merge(run_id)
+        assert not remote.get("error") and summary(remote) == summary(serial)
+        assert {s["worker"] for s in remote["shards"]} <= {"remote-0", "remote-1"}
+        # 租约检查同样适用于远程提交
+        assert not RemoteScanQueue(server.url, "secret").complete(run_id, 0, {"results": []}, "remote-9")
+    finally:
+        server.stop()
+        coordinator.queue.delete_run(run_id)
+    print("✓ ScanCoordinator 测试通过")
+except Exception as e:
+    print(f"✗ ScanCoordinator 测试失败: {e}")
+finally:
+    shutil.rmtree(queue_dir, ignore_errors=True)
+    remove_files("exchange_info_cache_fake.json")
+
+# 测试14: 扫描断点恢复
+print("[14/31] 测试扫描断点恢复...")
+try:
+    import shutil
+    import tempfile
+    import threading
+    from analysis_core import BinanceAnalyzer
+    from scan_checkpoint import ScanCheckpoint
+    checkpoint_dir = tempfile.mkdtemp()
+    checkpoint = ScanCheckpoint(os.path.join(checkpoint_dir, "analysis_history.db"))
+    # 今日K线成交额低于流动性阈值，24小时成交额高于阈值：恢复后必须沿用断点中的24小时成交额
+    klines = {f"S{i}USDT": make_klines(1.5 if i % 2 else 0.1, 1000) for i in range(10)}
+    volumes = {symbol: 5_000_000 for symbol in klines}
+    config = fake_config({"fake": {"klines": klines, "volumes": volumes}}, KLINE_BATCH_SIZE=2, CHECKPOINT_EVERY=2)
+    fresh = BinanceAnalyzer(config=config, callback=lambda m, p=None: None).analyze()
+    assert len(fresh["results"]) == 5
+
+    # 处理到第4个币种时取消，断点保存已完成部分
+    cancel_event = threading.Event()
+    def stop_at_fourth(message, progress=None):
+        if message.startswith("[4/10]"):
+            cancel_event.set()
+    first = BinanceAnalyzer(config=config, callback=stop_at_fourth).analyze(
+        cancel_event=cancel_event, checkpoint=checkpoint)
+    assert first.get("cancelled") and len(first["evaluated"]) == 4
+
+    # 同一配置再次扫描：从断点继续，结果和涨幅历史覆盖全部币种
+    analyzer = BinanceAnalyzer(config=config, callback=lambda m, p=None: None)
+    resumed = analyzer.analyze(checkpoint=checkpoint)
+    assert resumed["resumed_from"] == 4
+    assert analyzer.sources_by_name["fake"].calls["get_klines"] == 6
+    assert sorted(s for s, *_ in resumed["evaluated"]) == sorted(klines)
+    assert len(first["results"]) == 2 and len(resumed["results"]) == len(fresh["results"])
+    assert sorted(r["symbol"] for r in resumed["results"]) == ["S1USDT", "S3USDT", "S5USDT", "S7USDT", "S9USDT"]
+    # 完成后断点被清除
+    assert BinanceAnalyzer(config=config, callback=lambda m, p=None: None).analyze(
+        checkpoint=checkpoint).get("resumed_from") is None
+    print("✓ ScanCheckpoint 测试通过")
+except Exception as e:
+    print(f"✗ ScanCheckpoint 测试失败: {e}")
+finally:
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    remove_files("exchange_info_cache_fake.json")
+
+# 测试15: 命中结果评分
+print("[15/31] 测试命中结果评分...")
+try:
+    from scoring import compute_scores, sort_results, top_k, total_score
+
+    def scored(symbol, gain, volume):
+        scores = compute_scores({"gain_1d": gain, "gain_2d": gain, "gain_3d": gain}, volume)
+        return {"symbol": symbol, "scores": scores, "score": total_score(scores)}
+
+    thin = scored("THINUSDT", 1.5, 10)
+    liquid = scored("BIGUSDT", 1.8, 10_000_000)
+    # 成交额项有上限，极低成交额不会压过涨幅
+    assert thin["scores"]["gain_per_volume"] == thin["scores"]["max_gain"]
+    assert liquid["scores"]["gain_per_volume"] < liquid["scores"]["max_gain"] / 3
+    assert [r["symbol"] for r in sort_results([thin, liquid])] == ["BIGUSDT", "THINUSDT"]
+    # 同样涨幅时成交额越小评分越高
+    assert scored("A", 1.5, 1_000_000)["score"] > scored("B", 1.5, 100_000_000)["score"]
+    # 堆选择的前K名与完整排序一致
+    many = [scored(f"S{i}USDT", (i * 37 % 101) / 50, 10 ** (4 + i % 5)) for i in range(100)]
+    assert top_k(many, 10) == sort_results(list(many))[:10]
+    print("✓ scoring 测试通过")
+except Exception as e:
+    print(f"✗ scoring 测试失败: {e}")
+
+# 测试16: K线归档写入
+print("[16/31] 测试K线归档写入...")
+try:
+    import shutil
+    import tempfile
+    import threading
+    from kline_archive import KlineArchive
+
+    archive_dir = tempfile.mkdtemp()
+    try:
+        day = 86_400_000
+        klines = make_klines(0.5, 1000, days=10)
+        writer = KlineArchive(archive_dir)
+        assert writer.write("AAAUSDT", klines) == 10
+        symbol_dir = os.path.join(archive_dir, "1d", "AAAUSDT")
+        close_inode = os.stat(os.path.join(symbol_dir, "close.bin")).st_ino
+        old_close = writer.read("AAAUSDT", fields=["close"])["close"]
+
+        # 追加新K线、更新最新一根：原地写入当前列文件
+        assert KlineArchive(archive_dir).write("AAAUSDT", [dict(klines[-1], open_time=10 * day)]) == 11
+        assert KlineArchive(archive_dir).write("AAAUSDT", [dict(klines[-1], open_time=10 * day, close=2.0)]) == 11
+        assert os.stat(os.path.join(symbol_dir, "close.bin")).st_ino == close_inode
+        assert writer._state("AAAUSDT") == (0, 11)
+        assert [r["close"] for r in writer.read_rows("AAAUSDT")][-3:] == [1.0, 1.5, 2.0]
+
+        # 补历史：写成新一代，读者映射的旧数据不变，上一代保留、更早的代被删除
+        assert writer.write("AAAUSDT", [dict(klines[0], open_time=-day)]) == 12
+        assert writer.write("AAAUSDT", [dict(klines[0], open_time=-2 * day)]) == 13
+        assert writer._state("AAAUSDT") == (2, 13)
+        assert float(old_close[-1]) == 1.5 and len(old_close) == 10
+        assert not os.path.exists(os.path.join(symbol_dir, "close.bin"))
+        assert os.path.exists(os.path.join(symbol_dir, "g1", "close.bin"))
+        rows = writer.read_rows("AAAUSDT")
+        assert [r["open_time"] for r in rows] == [t * day for t in range(-2, 11)] and rows[-1]["close"] == 2.0
+
+        # 两个实例并发写入同一交易对，结果与依次写入一致
+        batches = [[dict(k, open_time=k["open_time"] + n * day) for k in klines[-3:]] for n in range(1, 21)]
+        threads = [threading.Thread(target=KlineArchive(archive_dir).write, args=("AAAUSDT", batch))
+                   for batch in batches]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        rows = writer.read_rows("AAAUSDT")
+        open_times = [r["open_time"] for r in rows]
+        assert open_times == sorted(set(open_times)) and open_times[0] == -2 * day and open_times[-1] == 29 * day
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+    print("✓ KlineArchive 测试通过")
+except Exception as e:
+    print(f"✗ KlineArchive 测试失败: {e}")
+
+# 测试17: 回测与分析器核对
+print("[17/31] 测试回测区间与持有期...")
+try:
+    import shutil
+    import tempfile
+    from analysis_core import BinanceAnalyzer
+    from backtest import DAY_MS, BacktestEngine
+    from kline_archive import KlineArchive
+
+    archive_dir = tempfile.mkdtemp()
+    try:
+        # 第5日缺失；第3、8日暴涨（open_time 按第0日起算）
+        klines = [k for k in make_klines(0.0, 1000, days=12) if k["open_time"] != 5 * DAY_MS]
+        for k in klines:
+            if k["open_time"] in (3 * DAY_MS, 8 * DAY_MS):
+                k["close"] = k["high"] = 3.0
+        archive = KlineArchive(archive_dir)
+        archive.write("AAAUSDT", klines)
+
+        analyzer = BinanceAnalyzer()
+        analyzer.config["MIN_CHANGE_PERCENT"] = 100
+        engine = BacktestEngine(archive=archive, start=DAY_MS, horizons=(1, 2))
+        assert engine.verify_with_analyzer(analyzer) == []
+        signals = engine.signals(100)
+        assert [s["date"] for s in signals] == ["1970-01-04", "1970-01-09"]
+        # 信号日（第3日）1天后是第4日，2天后是缺失的第5日（不能顺延到第6日）
+        assert abs(signals[0]["short_returns"][1] - (1 - 1.0 / 3.0)) < 1e-9
+        assert signals[0]["short_returns"][2] is None
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+    print("✓ backtest 测试通过")
+except Exception as e:
+    print(f"✗ backtest 测试失败: {e}")
+
+# 测试18: 通知合并、去重与限流
+print("[18/31] 测试通知合并与限流...")
+try:
+    from notification_coalescer import NotificationCoalescer
+
+    class DictConfig(dict):
+        def get(self, key, default=None):
+            return super().get(key, default)
+
+    class RecordingDispatcher:
+        def __init__(self):
+            self.sent = []
+            self.succeed = True
+
+        def enqueue(self, title, message, channels, timeout=10, on_done=None):
+            self.sent.append((title, message, [c[0] for c in channels]))
+            if on_done is not None:
+                on_done(type("Job", (), {"success": self.succeed})())
+
+    dispatcher = RecordingDispatcher()
+    coalescer = NotificationCoalescer(DictConfig(serverchan_min_interval=0, serverchan_daily_limit=2,
+                                                 notify_dedup_window=3600, notify_digest_window=60),
+                                      dispatcher)
+    channels = [("serverchan", lambda title, message, timeout: True, 1)]
+
+    def submit(kind, message, dedup_key=None):
+        accepted = coalescer.submit(kind, kind, message, channels, dedup_key=dedup_key)
+        coalescer.timer.cancel()
+        coalescer.flush()
+        return accepted
+
+    # 发送失败不记录去重键，相同内容可以重新提交
+    dispatcher.succeed = False
+    assert submit("complete", "r0", dedup_key="k1")
+    assert not coalescer.last_keys and not coalescer.inflight_keys
+    dispatcher.succeed = True
+    dispatcher.sent.clear()
+    coalescer.limiters.clear()
+    assert submit("complete", "r1", dedup_key="k1")
+    assert not coalescer.submit("complete", "complete", "r1", channels, dedup_key="k1")
+    assert submit("complete", "r2", dedup_key="k2")
+    # 达到每日次数：完成通知暂存
+    assert submit("complete", "r3", dedup_key="k3") and len(dispatcher.sent) == 2
+    assert coalescer.backlog["serverchan"] == ["r3"] and coalescer.retry_timer is not None
+    # 变化通知不受每日次数限制，并带上暂存内容
+    assert submit("changes", "+AAAUSDT")
+    assert len(dispatcher.sent) == 3 and dispatcher.sent[-1][1] == "r3\n\n+AAAUSDT"
+    assert not coalescer.backlog["serverchan"]
+    coalescer.retry_timer.cancel()
+
+    # 等待发送期间的相同内容不重复入队；超出去重窗口的记录被清理
+    coalescer.last_keys = {(kind, key): t - 7200 for (kind, key), t in coalescer.last_keys.items()}
+    assert coalescer.submit("error", "error", "e1", channels, dedup_key="e1")
+    assert not coalescer.submit("error", "error", "e1", channels, dedup_key="e1")
+    coalescer.timer.cancel()
+    assert not coalescer.last_keys and list(coalescer.inflight_keys) == [("error", "e1")]
+    print("✓ NotificationCoalescer 测试通过")
+except Exception as e:
+    print(f"✗ NotificationCoalescer 测试失败: {e}")
+
+# 测试19: 回填文件匹配
+print("[19/31] 测试回填文件名匹配...")
+try:
+    import shutil
+    import tempfile
+    from backfill import find_kline_files
+
+    source_dir = tempfile.mkdtemp()
+    try:
+        for name in ("BTCUSDT-1mo-2024-01.zip", "BTCUSDT-1d-2024-01.zip", "ETHUSDT-1mo-2024-02.csv", "BTCUSDT-15m-2024-01.zip"):
+            open(os.path.join(source_dir, name), "w").close()
+        for interval in ("1mo", "1M"):
+            found = find_kline_files(source_dir, interval)
+            assert sorted(found) == ["BTCUSDT", "ETHUSDT"] and found["BTCUSDT"][0][0] == "2024-01"
+        assert [p for p, _ in find_kline_files(source_dir, "15m")["BTCUSDT"]] == ["2024-01"]
+    finally:
+        shutil.rmtree(source_dir, ignore_errors=True)
+    print("✓ backfill 测试通过")
+except Exception as e:
+    print(f"✗ backfill 测试失败: {e}")
+
+# 测试20: 币种状态跟踪
+print("[20/31] 测试币种状态变化...")
+try:
+    from symbol_state import STATE_IN, STATE_OUT, SymbolStateTracker
+
+    db_file = "test_symbol_state.db"
+    remove_files(db_file)
+    try:
+        def hit(symbol, gain):
+            return {"symbol": symbol, "gain_1d": gain, "gain_2d": gain / 2, "gain_3d": None}
+
+        tracker = SymbolStateTracker(db_file)
+        assert not tracker.is_initialized()
+        changes = tracker.update([hit("AAAUSDT", 1.2), hit("BBBUSDT", 1.0)], "2024-01-01T00:00:00")
+        assert [r["symbol"] for r in changes["entered"]] == ["AAAUSDT", "BBBUSDT"] and changes["has_changes"]
+
+        changes = tracker.update([hit("BBBUSDT", 1.5)], "2024-01-02T00:00:00")
+        assert changes["still_in"] == ["BBBUSDT"] and [s["symbol"] for s in changes["exited"]] == ["AAAUSDT"]
+        # 部分扫描只判定被扫描到的币种退出
+        changes = tracker.update([], "2024-01-03T00:00:00", scanned_symbols=["CCCUSDT"])
+        assert not changes["has_changes"] and tracker.active_symbols() == {"BBBUSDT"}
+
+        changes = tracker.update([hit("AAAUSDT", 1.1), hit("BBBUSDT", 1.3)], "2024-01-04T00:00:00")
+        assert [r["symbol"] for r in changes["reentered"]] == ["AAAUSDT"] and changes["still_in"] == ["BBBUSDT"]
+
+        # 新实例从数据库恢复状态
+        restored = SymbolStateTracker(db_file)
+        assert restored.active_symbols() == {"AAAUSDT", "BBBUSDT"}
+        state = restored.get_state("AAAUSDT")
+        assert state["state"] == STATE_IN and state["enter_count"] == 2
+        assert state["first_seen"] == "2024-01-01T00:00:00" and state["last_entered"] == "2024-01-04T00:00:00"
+        assert state["peak_gain"] == 1.2 and restored.get_state("BBBUSDT")["peak_gain"] == 1.5
+        restored.update([], "2024-01-05T00:00:00")
+        assert restored.get_state("BBBUSDT")["state"] == STATE_OUT and restored.active_count() == 0
+    finally:
+        remove_files(db_file)
+    print("✓ SymbolStateTracker 测试通过")
+except Exception as e:
+    print(f"✗ SymbolStateTracker 测试失败: {e}")
+
+# 测试21: 请求合并
+print("[21/31] 测试请求合并与短时缓存...")
+try:
+    import threading
+    from request_cache import RequestCache
+
+    cache = RequestCache()
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch():
+        calls.append(1)
+        release.wait(5)
+        return "exchange_info"
+
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(cache.do("info", slow_fetch, ttl=60)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    while cache.stats["shared"] < 7:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    # 并发的8个调用只执行一次，1个领头、7个共享
+    assert len(calls) == 1 and sorted(shared for _, shared in outcomes) == [False] + [True] * 7
+    assert {value for value, _ in outcomes} == {"exchange_info"}
+    assert cache.do("info", slow_fetch, ttl=60) == ("exchange_info", True) and len(calls) == 1
+
+    # 异常同样共享给等待者，且不缓存
+    def failing():
+        raise ValueError("boom")
+    try:
+        cache.do("bad", failing, ttl=60)
+        assert False, "应当抛出异常"
+    except ValueError:
+        pass
+    assert "bad" not in cache.memo and not cache.inflight
+    cache.invalidate("info")
+    assert cache.do("info", lambda: "fresh", ttl=0) == ("fresh", False) and "info" not in cache.memo
+    print("✓ RequestCache 测试通过")
+except Exception as e:
+    print(f"✗ RequestCache 测试失败: {e}")
+
+# 测试22: 通知发送队列重试
+print("[22/31] 测试通知队列重试...")
+try:
+    from notification_queue import NotificationDispatcher
+
+    db_file = "test_notification_queue.db"
+    remove_files(db_file)
+    try:
+        attempts = {"flaky": 0, "broken": 0}
+
+        def flaky(title, message, timeout):
+            attempts["flaky"] += 1
+            if attempts["flaky"] < 3:
+                raise ConnectionError("timeout")
+            return True
+
+        def broken(title, message, timeout):
+            attempts["broken"] += 1
+            return False
+
+        dispatcher = NotificationDispatcher(db_file, backoff=0.01)
+        job = dispatcher.enqueue("标题", "内容", [("flaky", flaky, 3), ("broken", broken, 2)])
+        assert job.done.wait(5) and job.success
+        assert job.status["flaky"]["success"] and job.status["flaky"]["attempts"] == 3
+        assert job.status["broken"] == dict(job.status["broken"], success=False, attempts=2, error="发送返回失败")
+        assert attempts == {"flaky": 3, "broken": 2}
+        assert dispatcher.get_recent_status()[-1]["id"] == job.id
+
+        failed = dispatcher.enqueue("标题", "内容", [("broken", broken, 1)])
+        assert failed.done.wait(5) and not failed.success and attempts["broken"] == 3
+        dispatcher.executor.shutdown()
+    finally:
+        remove_files(db_file)
+    print("✓ NotificationDispatcher 测试通过")
+except Exception as e:
+    print(f"✗ NotificationDispatcher 测试失败: {e}")
+
+# 测试23: 流式JSON数组解析
+print("[23/31] 测试流式JSON数组解析...")
+try:
+    import json
+    from fast_json import iter_array_items, iter_ticker_volumes
+
+    items = [{"symbol": "中文USDT", "note": "a\"]},[{", "nested": [1, 2, {"x": "]"}]},
+             {"symbol": "BUSDT", "quoteVolume": "12.5"}]
+    data = json.dumps(items, ensure_ascii=False).encode("utf-8")
+    # 按1/2/3/7字节切块：记号、字符串和多字节UTF-8字符都会被切断
+    for size in (1, 2, 3, 7):
+        chunks = [data[i:i + size] for i in range(0, len(data), size)]
+        assert list(iter_array_items(iter(chunks))) == items
+    assert list(iter_array_items(iter([b" [ ] "]))) == []
+    assert list(iter_ticker_volumes(iter([data]))) == [("BUSDT", 12.5)]
+
+    # 截断的响应：只产出完整的元素，最后抛出异常
+    for truncated, complete in ((data[:-20], items[:1]), (data[:-1], items)):
+        yielded = []
+        try:
+            for item in iter_array_items(iter([truncated[i:i + 5] for i in range(0, len(truncated), 5)])):
+                yielded.append(item)
+            assert False, "截断的响应应当抛出异常"
+        except ValueError:
+            pass
+        assert yielded == complete
+    try:
+        list(iter_array_items(iter([b'{"symbols": []}'])))
+        assert False, "非数组响应应当抛出异常"
+    except ValueError:
+        pass
+    print("✓ fast_json 流式解析 测试通过")
+except Exception as e:
+    print(f"✗ fast_json 流式解析 测试失败: {e}")
+
+# 测试24: exchangeInfo 按字段解码
+print("[24/31] 测试 exchangeInfo 按字段解码...")
+try:
+    import json
+    from fast_json import decode_exchange_symbols, decode_spot_symbols
+    from market_data import BinanceFuturesSource, BinanceSpotSource
+
+    futures_info = json.dumps({"timezone": "UTC", "symbols": [
+        {"symbol": "BTCUSDT", "status": "TRADING", "contractType": "PERPETUAL", "filters": [{"x": 1}]},
+        {"symbol": "BTCUSDT_240628", "status": "TRADING", "contractType": "CURRENT_QUARTER"},
+        {"symbol": "OLDUSDT", "status": "SETTLING", "contractType": "PERPETUAL"},
+    ]}).encode("utf-8")
+    spot_info = json.dumps({"symbols": [
+        {"symbol": "ETHUSDT", "status": "TRADING", "quoteAsset": "USDT", "filters": [], "permissions": ["SPOT"]},
+        {"symbol": "ETHBTC", "status": "TRADING", "quoteAsset": "BTC"},
+        {"symbol": "LUNAUSDT", "status": "BREAK", "quoteAsset": "USDT"},
+        {"symbol": "NOQUOTE", "status": "TRADING"},
+    ]}).encode("utf-8")
+    assert decode_exchange_symbols(futures_info)[1] == ("BTCUSDT_240628", "TRADING", "CURRENT_QUARTER")
+    assert decode_spot_symbols(spot_info)[-1] == ("NOQUOTE", "TRADING", None)
+
+    class StubResponse:
+        def __init__(self, content):
+            self.content = content
+
+    futures = BinanceFuturesSource()
+    futures._request = lambda path, **kwargs: StubResponse(futures_info)
+    assert futures.list_symbols() == ["BTCUSDT"]
+    spot = BinanceSpotSource()
+    spot._request = lambda path, **kwargs: StubResponse(spot_info)
+    assert spot.list_symbols() == ["ETHUSDT"]
+    print("✓ exchangeInfo 解码 测试通过")
+except Exception as e:
+    print(f"✗ exchangeInfo 解码 测试失败: {e}")
+
+# 测试25: 币本位合约信息并发加载
+print("[25/31] 测试币本位合约信息并发加载...")
+try:
+    import json
+    import threading
+    from market_data import BinanceCoinFuturesSource
+
+    class StubResponse:
+        def __init__(self, content):
+            self.content = content
+
+    requested = []
+    cm_info = json.dumps({"symbols": [
+        {"symbol": "BTCUSD_PERP", "pair": "BTCUSD", "contractType": "PERPETUAL", "contractStatus": "TRADING",
+         "contractSize": 100},
+    ]}).encode("utf-8")
+    cm_klines = json.dumps([[0, "1", "2", "1", "2", "50", 86_399_999, "0", 10]]).encode("utf-8")
+
+    def stub_request(path, **kwargs):
+        requested.append(path)
+        if path.endswith("/exchangeInfo"):
+            time.sleep(0.05)
+            return StubResponse(cm_info)
+        return StubResponse(cm_klines)
+
+    coin = BinanceCoinFuturesSource()
+    coin._request = stub_request
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(coin.get_klines("BTCUSD_PERP"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 8个线程并发取K线只请求一次 exchangeInfo，成交额按合约面值折算
+    assert requested.count("/dapi/v1/exchangeInfo") == 1
+    assert len(outcomes) == 8 and all(k[0]["quote_volume"] == 5000 for k in outcomes)
+    print("✓ BinanceCoinFuturesSource 测试通过")
+except Exception as e:
+    print(f"✗ BinanceCoinFuturesSource 测试失败: {e}")
+
+# 测试26: 并行参数扫描
+print("[26/31] 测试并行参数扫描...")
+try:
+    import shutil
+    import tempfile
+    from multiprocessing import shared_memory
+    import numpy as np
+    import param_sweep
+    from backtest import BacktestEngine, compute_features, load_panel
+    from kline_archive import KlineArchive
+
+    archive_dir = tempfile.mkdtemp()
+    try:
+        archive = KlineArchive(archive_dir)
+        for i in range(6):
+            klines = make_klines(0.0, 1_000_000 * (i + 1), days=40)
+            for j, k in enumerate(klines):
+                if (i + j) % 7 == 0:
+                    k["close"] = k["high"] = 1 + 0.3 * (i + 1)
+            archive.write(f"S{i}USDT", klines)
+
+        # 多进程结果与单进程 BacktestEngine.sweep 完全一致
+        grid = {"MIN_CHANGE_PERCENT": [20, 50, 100], "LIQUIDITY_THRESHOLD_USDT": [0, 3_000_000]}
+        expected = BacktestEngine(archive=archive).sweep([20, 50, 100], [0, 3_000_000])
+        assert param_sweep.run_sweep(grid, archive=archive, workers=2) == expected
+        assert param_sweep.run_sweep(grid, archive=archive, workers=1) == expected
+        assert [r["signals"] for r in expected] != [0] * 6
+
+        # 工作进程映射的数组只读、内容相同；关闭映射并删除后共享内存不再存在
+        features = compute_features(load_panel(archive))
+        with param_sweep.SharedFeatures(features) as shared:
+            param_sweep._attach(shared.layout)
+            attached = param_sweep._worker_features
+            assert not attached["max_gain"].flags.writeable
+            assert np.array_equal(attached["max_gain"], features["max_gain"], equal_nan=True)
+            assert np.array_equal(attached["short_returns"][7], features["short_returns"][7], equal_nan=True)
+            param_sweep._detach()
+            assert param_sweep._worker_features is None and not param_sweep._worker_blocks
+            names = [name for name, _, _ in shared.layout.values()]
+        for name in names:
+            try:
+                shared_memory.SharedMemory(name=name).close()
+                assert False, f"共享内存未释放: {name}"
+            except FileNotFoundError:
+                pass
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+    print("✓ param_sweep 测试通过")
+except Exception as e:
+    print(f"✗ param_sweep 测试失败: {e}")
+
+# 测试27: 本地行情缓存服务
+print("[27/31] 测试本地行情缓存服务...")
+try:
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import requests
+    from cache_daemon import DEFAULT_TTLS, CacheDaemon, MarketDataCache
+
+    upstream_hits = []
+
+    class StubUpstream(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            upstream_hits.append(self.path)
+            time.sleep(0.2 if "/klines" in self.path else 0)
+            status, body = (500, b'{"code": -1}') if "/broken" in self.path else (200, b'[1, 2, 3]')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("X-MBX-USED-WEIGHT-1M", "7")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubUpstream)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    try:
+        # 按路径结尾取缓存时间
+        cache = MarketDataCache(upstreams={"/fapi/": stub_url}, ttls={"/klines": 30})
+        assert cache.ttl_for("/fapi/v1/klines") == 30 and cache.ttl_for("/fapi/v1/ping") == 0
+        assert cache.ttl_for("/fapi/v1/exchangeInfo") == DEFAULT_TTLS["/exchangeInfo"]
+        assert cache.ttl_for("/fapi/v1/unknown") == DEFAULT_TTLS["default"]
+
+        # 按前缀和参数转发
+        routes = MarketDataCache()
+        assert routes.upstream_for("/fapi/v1/klines") == "https://fapi.binance.com"
+        assert routes.upstream_for("/dapi/v1/klines") == "https://dapi.binance.com"
+        assert routes.upstream_for("/api/v3/klines") == "https://api.binance.com"
+        assert routes.upstream_for("/futures/data/openInterestHist", "symbol=BTCUSDT") == "https://fapi.binance.com"
+        assert routes.upstream_for("/futures/data/openInterestHist", "pair=BTCUSD") == "https://dapi.binance.com"
+        assert routes.upstream_for("/other") is None and routes.get("/other")[0] == 404
+
+        # 并发的相同请求只转发一次，有效期内（参数顺序不同也）命中缓存
+        outcomes = []
+        threads = [threading.Thread(target=lambda: outcomes.append(
+            cache.get("/fapi/v1/klines", "symbol=BTCUSDT&interval=1d"))) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(upstream_hits) == 1 and sorted(o[3] for o in outcomes) == ["HIT"] * 5 + ["MISS"]
+        assert all(o[:3] == (200, {"Content-Type": "application/json", "X-MBX-USED-WEIGHT-1M": "7"}, b"[1, 2, 3]")
+                   for o in outcomes)
+        assert cache.get("/fapi/v1/klines", "interval=1d&symbol=BTCUSDT")[3] == "HIT" and len(upstream_hits) == 1
+
+        # 上游错误响应原样返回但不缓存
+        assert cache.get("/fapi/v1/broken")[0] == 500 and cache.get("/fapi/v1/broken")[0] == 500
+        assert upstream_hits.count("/fapi/v1/broken") == 2 and cache.stats["errors"] == 2
+
+        # 通过HTTP服务访问
+        daemon = CacheDaemon(cache, port=0)
+        daemon.start()
+        try:
+            resp = requests.get(f"{daemon.url}/fapi/v1/klines", params={"symbol": "BTCUSDT", "interval": "1d"},
+                                timeout=5)
+            assert resp.status_code == 200 and resp.headers["X-Cache"] == "HIT" and resp.json() == [1, 2, 3]
+            assert requests.get(f"{daemon.url}/__stats", timeout=5).json()["upstream"] == 3
+        finally:
+            daemon.stop()
+    finally:
+        stub.shutdown()
+        stub.server_close()
+    print("✓ cache_daemon 测试通过")
+except Exception as e:
+    print(f"✗ cache_daemon 测试失败: {e}")
+
+
+# 测试28: 启动预热
+print("[28/31] 测试启动预热...")
+try:
+    import shutil
+    import tempfile
+    from analysis_core import BinanceAnalyzer
+    archive_dir = tempfile.mkdtemp()
+    try:
+        klines = {"AUSDT": make_klines(1.5, 5_000_000), "BUSDT": make_klines(0.1, 5_000_000)}
+        analyzer = BinanceAnalyzer(config=fake_config({"fake": {"klines": klines}}, KLINE_ARCHIVE_DIR=archive_dir),
+                                   callback=lambda m, p=None: None)
+        analyzer.archive.write("AUSDT", klines["AUSDT"])
+        report = analyzer.warm_up()
+
+        # 各阶段耗时齐全；数据源没有 base_url 时跳过DNS解析
+        assert "dns" not in report and "dns_error" not in report
+        assert {"connect", "exchange_info", "kline_archive", "total"} <= set(report)
+        assert not any(key.endswith("_error") for key in report)
+        assert report["active_symbols"] == 2 and report["archived_symbols"] == 1
+        assert report["total"] >= report["connect"] + report["exchange_info"] + report["kline_archive"]
+        assert analyzer.source.calls["list_symbols"] == 1
+
+        # 未配置K线归档时不统计归档
+        report = BinanceAnalyzer(config=fake_config({"fake": {"klines": klines}}),
+                                 callback=lambda m, p=None: None).warm_up()
+        assert "kline_archive" not in report and "archived_symbols" not in report
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+    print("✓ 启动预热 测试通过")
+except Exception as e:
+    print(f"✗ 启动预热 测试失败: {e}")
+finally:
+    remove_files("exchange_info_cache_fake.json")
+
+
+# 测试29: 扫描性能统计与合并
+print("[29/31] 测试扫描性能统计...")
+try:
+    from instrumentation import ScanMetrics, merge_metrics, format_summary
+
+    metrics = ScanMetrics()
+    with metrics.span("klines"):
+        pass
+    metrics.add_phase("klines", 1.0)
+    metrics.record_request("/fapi/v1/klines", 0.03, nbytes=1000, status=200)
+    metrics.record_request("/fapi/v1/klines", 0.3, nbytes=500, status=429, error=True)
+    metrics.record_request("/fapi/v1/klines", 30.0, status=200)
+    metrics.gauge_max("used_weight_1m", 40)
+    metrics.gauge_max("used_weight_1m", 20)
+    metrics.gauge_max("used_weight_1m", None)
+    first = metrics.to_dict()
+
+    stats = first["endpoints"]["/fapi/v1/klines"]
+    assert stats["count"] == 3 and stats["errors"] == 1 and stats["bytes"] == 1500
+    assert stats["status"] == {"200": 2, "429": 1} and stats["latency_max"] == 30.0
+    # 延迟直方图每个请求只落入一个桶，超出最大上限的计入 +Inf
+    assert stats["buckets"]["0.05"] == 1 and stats["buckets"]["0.5"] == 1 and stats["buckets"]["+Inf"] == 1
+    assert sum(stats["buckets"].values()) == 3
+    assert first["counters"] == {"requests": 3, "bytes": 1500, "http_429": 1}
+    assert first["gauges"] == {"used_weight_1m": 40}
+    assert 1.0 <= first["phases"]["klines"] < 1.1 and first["phases"]["http_wait"] == 30.33
+
+    second = ScanMetrics()
+    second.record_request("/fapi/v1/klines", 0.2, nbytes=100, status=200)
+    second.record_request("/fapi/v1/ticker/24hr", 0.1, nbytes=50, status=200)
+    second.gauge_max("used_weight_1m", 60)
+    second.count("retries", 2)
+
+    # 合并：计数和接口统计累加，指标和总耗时取最大值，空统计跳过
+    second = second.to_dict()
+    merged = merge_metrics([first, None, second])
+    klines_stats = merged["endpoints"]["/fapi/v1/klines"]
+    assert klines_stats["count"] == 4 and klines_stats["bytes"] == 1600
+    assert klines_stats["buckets"]["0.25"] == 1 and klines_stats["status"]["200"] == 3
+    assert abs(klines_stats["latency_avg"] - 30.53 / 4) < 1e-9
+    assert merged["endpoints"]["/fapi/v1/ticker/24hr"]["count"] == 1
+    assert merged["counters"] == {"requests": 5, "bytes": 1650, "http_429": 1, "retries": 2}
+    assert merged["gauges"]["used_weight_1m"] == 60
+    assert merged["wall_time"] == max(first["wall_time"], second["wall_time"])
+    # 合并不修改输入
+    assert first["endpoints"]["/fapi/v1/klines"]["count"] == 3
+
+    summary = format_summary(merged)
+    assert "请求 5 次" in summary and "重试 2 次" in summary and "429 1 次" in summary
+    print("✓ 扫描性能统计 测试通过")
+except Exception as e:
+    print(f"✗ 扫描性能统计 测试失败: {e}")
+
+
+# 测试30: Prometheus 指标输出格式
+print("[30/31] 测试 Prometheus 指标输出...")
+try:
+    import requests
+    from metrics_exporter import MetricsRegistry, MetricsExporter
+
+    registry = MetricsRegistry(prefix="t")
+    registry.inc("scans_total", 1, "扫描次数")
+    registry.inc("scans_total", 2, "扫描次数")
+    registry.set("hits", 5)
+    registry.observe("latency_seconds", 0.3, "投递耗时", buckets=(0.1, 0.5, 1.0), channel="serverchan")
+    registry.observe("latency_seconds", 0.05, buckets=(0.1, 0.5, 1.0), channel="serverchan")
+    registry.observe("latency_seconds", 7.0, buckets=(0.1, 0.5, 1.0), channel="serverchan")
+    text = registry.render()
+    lines = text.splitlines()
+
+    # 指标按名称排序；没有说明的指标不输出 HELP 行
+    assert text.endswith("\n")
+    assert lines[:2] == ["# TYPE t_hits gauge", "t_hits 5"]
+    # 直方图分桶为累计计数，+Inf 桶等于总次数
+    assert lines[2:10] == [
+        "# HELP t_latency_seconds 投递耗时",
+        "# TYPE t_latency_seconds histogram",
+        't_latency_seconds_bucket{channel="serverchan",le="0.1"} 1',
+        't_latency_seconds_bucket{channel="serverchan",le="0.5"} 2',
+        't_latency_seconds_bucket{channel="serverchan",le="1.0"} 2',
+        't_latency_seconds_bucket{channel="serverchan",le="+Inf"} 3',
+        't_latency_seconds_sum{channel="serverchan"} 7.35',
+        't_latency_seconds_count{channel="serverchan"} 3',
+    ]
+    assert lines[10:] == ["# HELP t_scans_total 扫描次数", "# TYPE t_scans_total counter", "t_scans_total 3"]
+
+    # 通过HTTP端点访问
+    exporter = MetricsExporter(registry, host="127.0.0.1", port=0)
+    exporter.start()
+    try:
+        url = f"http://127.0.0.1:{exporter.server.server_address[1]}"
+        resp = requests.get(f"{url}/metrics", timeout=5)
+        assert resp.status_code == 200 and resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert resp.text == text
+        assert requests.get(f"{url}/other", timeout=5).status_code == 404
+    finally:
+        exporter.stop()
+    print("✓ Prometheus 指标输出 测试通过")
+except Exception as e:
+    print(f"✗ Prometheus 指标输出 测试失败: {e}")
+
+
+# 测试31: 涨幅历史轨迹
+print("[31/31] 测试涨幅历史轨迹...")
+try:
+    import shutil
+    import tempfile
+    from datetime import datetime, timedelta
+    from gain_history import GainHistoryStore
+    db_dir = tempfile.mkdtemp()
+    db_file = os.path.join(db_dir, "gain_history.db")
+    try:
+        store = GainHistoryStore(db_file)
+        now = datetime.now()
+
+        def scan(days_ago, evaluated):
+            end_time = (now - timedelta(days=days_ago)).isoformat()
+            return store.record({"end_time": end_time, "evaluated": evaluated})
+
+        assert scan(10, [["AUSDT", 0.1, 0.1, 0.1]]) == 1
+        assert scan(2, [["AUSDT", 0.2, 0.3, 0.4], ["BUSDT", 0.5, 0.5, 0.5]]) == 2
+        assert scan(1, [["AUSDT", 0.1234567, 0.2, 0.3]]) == 1
+        assert store.record({"evaluated": []}) == 0
+
+        # 只返回 days 天内的记录，按时间升序，涨幅保留6位小数
+        trajectory = store.get_gain_trajectory("AUSDT", days=7)
+        assert [round(p["gain_1d"], 6) for p in trajectory] == [0.2, 0.123457]
+        assert trajectory[0]["time"] < trajectory[1]["time"]
+        assert set(trajectory[0]) == {"time", "gain_1d", "gain_2d", "gain_3d"}
+        assert len(store.get_gain_trajectory("AUSDT", days=30)) == 3
+        assert store.get_gain_trajectory("CUSDT") == []
+
+        # 同一次扫描重复写入时覆盖
+        scan(1, [["AUSDT", 0.9, 0.9, 0.9]])
+        assert [p["gain_1d"] for p in store.get_gain_trajectory("AUSDT", days=7)] == [0.2, 0.9]
+
+        assert store.delete_older_than(days=7) == 1
+        assert len(store.get_gain_trajectory("AUSDT", days=30)) == 2
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("✓ 涨幅历史轨迹 测试通过")
+except Exception as e:
+    print(f"✗ 涨幅历史轨迹 测试失败: {e}")
 
 print()
 print("=" * 60)
@@ -0,0 +1,77 @@
+"""
+观察名单模块 - 分级扫描
+上一轮已命中或涨幅接近阈值的币种进入观察名单，按分钟级频率单独重扫；
+全市场扫描仍按原定时间隔执行
+"""
+import json
+import os
+import time
+
+
+class WatchlistManager:
+    def __init__(self, cache_file="watchlist_cache.json"):
+        self.cache_file = cache_file
+        self.symbols = []
+        self.quote_volumes = {}  # {symbol: 上次全量扫描时的24小时成交额}
+        self.updated_at = 0
+        self.load()
+
+    def load(self):
+        """从缓存文件恢复观察名单（进程重启后继续生效）"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            self.symbols = cache.get("symbols", [])
+            self.quote_volumes = cache.get("quote_volumes", {})
+            self.updated_at = cache.get("timestamp", 0)
+        except Exception as e:
+            print(f"观察名单加载失败: {e}")
+
+    def save(self):
+        try:
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump({
+                    "timestamp": self.updated_at,
+                    "symbols": self.symbols,
+                    "quote_volumes": self.quote_volumes
+                }, f, ensure_ascii=False)
+            return True
+        except Exception as e:
+            print(f"观察名单保存失败: {e}")
+            return False
+
+    def update(self, analysis_data):
+        """
+        根据一次分析结果重建观察名单：各扫描方案命中的币种 + 接近阈值的币种，
+        同时保存它们的24小时成交额，重扫时各扫描方案据此做流动性过滤
+        :return: 新的观察名单
+        """
+        profiles = list((analysis_data.get("profiles") or {}).values())
+        candidates = [r["symbol"] for r in analysis_data.get("results", [])]
+        for profile in profiles:
+            candidates.extend(r["symbol"] for r in profile.get("results", []))
+        candidates.extend(analysis_data.get("near_symbols", []))
+        for profile in profiles:
+            candidates.extend(profile.get("near_symbols", []))
+        symbols = list(dict.fromkeys(candidates))
+
+        volumes = analysis_data.get("quote_volumes") or {}
+        self.symbols = symbols
+        self.quote_volumes = {s: volumes[s] for s in symbols if s in volumes}
+        self.updated_at = int(time.time())
+        self.save()
+        return self.symbols
+
+    def get_symbols(self):
+        return list(self.symbols)
+
+    def get_quote_volumes(self):
+        return dict(self.quote_volumes)
+
+    def clear(self):
+        self.symbols = []
+        self.quote_volumes = {}
+        self.updated_at = int(time.time())
+        self.save()